@@ -0,0 +1,102 @@
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from dispatcher import UPDATE_CONCURRENCY
+
+load_dotenv()
+# Per chat: Gemini calls allowed per second on average, and how many may
+# come in a burst before that rate applies
+LLM_CHAT_RATE = float(os.getenv("LLM_CHAT_RATE", 0.2))
+LLM_CHAT_BURST = float(os.getenv("LLM_CHAT_BURST", 5))
+# Gemini calls running or waiting for a slot, across all chats. Kept below
+# UPDATE_CONCURRENCY so booking steps always find a free update slot even
+# when every Gemini call is stuck
+LLM_MAX_PENDING = int(os.getenv("LLM_MAX_PENDING", max(1, UPDATE_CONCURRENCY // 2)))
+# Per-chat buckets kept (least recently used dropped first)
+LLM_MAX_BUCKETS = int(os.getenv("LLM_MAX_BUCKETS", 100_000))
+
+SHED_RATE_LIMITED = "rate_limited"
+SHED_OVERLOADED = "overloaded"
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, rate, burst, now):
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class AdmissionController:
+    """
+    Decides whether a message may go to Gemini.
+
+        reason = admission.check(chat_id)
+        if reason is None:
+            with admission.pending():
+                ... call Gemini ...
+
+    check() refuses a chat that has used up its token bucket
+    (SHED_RATE_LIMITED) and refuses everyone once max_pending calls are
+    already running or queued (SHED_OVERLOADED); callers then answer from
+    cache or with a canned reply. Only the LLM path goes through here, so
+    booking steps are never held back by it. Everything runs on the event
+    loop, so no locking is needed.
+    """
+
+    def __init__(self, rate=LLM_CHAT_RATE, burst=LLM_CHAT_BURST, max_pending=LLM_MAX_PENDING,
+                 max_buckets=LLM_MAX_BUCKETS, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_pending = max_pending
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self.in_flight = 0
+        self._buckets = OrderedDict()
+
+    def check(self, chat_id):
+        """
+        None if the call may go ahead, otherwise why it was shed.
+        """
+        if self.in_flight >= self.max_pending:
+            return SHED_OVERLOADED
+        now = self.clock()
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.burst, now)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(chat_id)
+        if not bucket.take(self.rate, self.burst, now):
+            return SHED_RATE_LIMITED
+        return None
+
+    def pending(self):
+        return _Pending(self)
+
+    def stats(self):
+        return {"in_flight": self.in_flight, "max_pending": self.max_pending, "chats": len(self._buckets)}
+
+
+class _Pending:
+    __slots__ = ("controller",)
+
+    def __init__(self, controller):
+        self.controller = controller
+
+    def __enter__(self):
+        self.controller.in_flight += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        self.controller.in_flight -= 1
+        return False
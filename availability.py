@@ -0,0 +1,149 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+import db
+from metrics import track
+
+load_dotenv()
+# Grid used when suggesting alternative times
+SLOT_MINUTES = int(os.getenv("SLOT_MINUTES", 30))
+CLINIC_OPEN = os.getenv("CLINIC_OPEN", "09:00")
+CLINIC_CLOSE = os.getenv("CLINIC_CLOSE", "17:00")
+# Seconds a loaded day is trusted before re-reading it (other workers book too)
+AVAILABILITY_TTL = float(os.getenv("AVAILABILITY_TTL", 60))
+# How many doctor-days to keep loaded at once
+AVAILABILITY_CACHE_DAYS = int(os.getenv("AVAILABILITY_CACHE_DAYS", 5000))
+
+# Minutes a booking occupies, as a bitmap run starting at its start minute
+SLOT_MASK = (1 << SLOT_MINUTES) - 1
+
+TIME_PATTERN = re.compile(r"\b(\d{1,2}):(\d{2})(?::(\d{2}))?\b")
+
+
+def to_minute(value):
+    """
+    Minute of the day for a "HH:MM[:SS]" string or datetime.time.
+    """
+    if isinstance(value, str):
+        hours, minutes = value.split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    return value.hour * 60 + value.minute
+
+
+def to_time_string(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}:00"
+
+
+def extract_times(text: str):
+    """
+    Every valid time mentioned in `text`, as "HH:MM:SS", in order.
+    "10:00 or 14:30:00" -> ["10:00:00", "14:30:00"]
+    """
+    times = []
+    for hours, minutes, seconds in TIME_PATTERN.findall(text):
+        if int(hours) < 24 and int(minutes) < 60 and int(seconds or 0) < 60:
+            times.append(f"{int(hours):02d}:{minutes}:{seconds or '00'}")
+    return times
+
+
+def fetch_booked_times(doctor_id, day, month):
+    """
+    Start times booked for the doctor on the next occurrence of day/month
+    (the same date bookings resolve to), as one range scan on
+    (doctor_id, starts_at). The bounds are stable expressions, so Postgres
+    prunes to the single monthly partition holding that day at executor start.
+    """
+    with db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT appointment_time FROM appointmentss
+            WHERE doctor_id = %(doctor_id)s
+              AND starts_at >= infer_appointment_start(%(day)s, %(month)s, '00:00', clinic_today())
+              AND starts_at < infer_appointment_start(%(day)s, %(month)s, '00:00', clinic_today()) + interval '1 day';
+        """, {"doctor_id": doctor_id, "day": day, "month": month})
+        return [row[0] for row in cur.fetchall()]
+
+
+class AvailabilityIndex:
+    """
+    Booked slots per (doctor, day, month), loaded with one query per day and
+    kept as a 1440-bit bitmap (one bit per minute), so "is this free" is a
+    single mask test and nearby free slots can be found without touching the DB.
+
+    A booking occupies SLOT_MINUTES from its start time, matching the
+    database's no-overlap constraint, so 10:15 is not free if 10:00 is booked.
+    """
+
+    def __init__(self, loader=fetch_booked_times, ttl=AVAILABILITY_TTL, max_days=AVAILABILITY_CACHE_DAYS):
+        self._loader = loader
+        self.ttl = ttl
+        self.max_days = max_days
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _bits(self, doctor_id, day, month):
+        key = (doctor_id, day, month)
+        with self._lock:
+            entry = self._days.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                self._days.move_to_end(key)
+                return entry[0]
+        bits = 0
+        with track("db_load_slots"):
+            booked_times = self._loader(doctor_id, day, month)
+        for booked in booked_times:
+            bits |= SLOT_MASK << to_minute(booked)
+        self.loads += 1
+        with self._lock:
+            self._days[key] = (bits, time.monotonic())
+            self._days.move_to_end(key)
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+        return bits
+
+    def is_free(self, doctor_id, day, month, time_):
+        return not (self._bits(doctor_id, day, month) >> to_minute(time_)) & SLOT_MASK
+
+    def first_free(self, doctor_id, day, month, times):
+        """
+        Checks several candidate times against one loaded day and returns the
+        first free one, or None.
+        """
+        bits = self._bits(doctor_id, day, month)
+        for candidate in times:
+            if not (bits >> to_minute(candidate)) & SLOT_MASK:
+                return candidate
+        return None
+
+    def suggest(self, doctor_id, day, month, time_, count=3):
+        """
+        Up to `count` free slots on the SLOT_MINUTES grid within clinic hours,
+        nearest to `time_` first.
+        """
+        bits = self._bits(doctor_id, day, month)
+        wanted = to_minute(time_)
+        open_, close = to_minute(CLINIC_OPEN), to_minute(CLINIC_CLOSE)
+        free = [m for m in range(open_, close, SLOT_MINUTES) if not (bits >> m) & SLOT_MASK]
+        free.sort(key=lambda m: (abs(m - wanted), m))
+        return [to_time_string(m) for m in free[:count]]
+
+    def mark_booked(self, doctor_id, day, month, time_):
+        """
+        Records a booking made by this process so the cached day stays current.
+        """
+        key = (doctor_id, day, month)
+        with self._lock:
+            entry = self._days.get(key)
+            if entry is not None:
+                self._days[key] = (entry[0] | SLOT_MASK << to_minute(time_), entry[1])
+
+    def forget(self, doctor_id, day, month):
+        with self._lock:
+            self._days.pop((doctor_id, day, month), None)
+
+
+availability = AvailabilityIndex()
@@ -0,0 +1,80 @@
+import asyncio
+import statistics
+import time
+import psycopg2
+import db
+
+# How many simulated chat messages to push through each mode
+MESSAGES = 200
+CONCURRENT_CHATS = 20
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(label, samples):
+    print(
+        f"{label:<28} p50={percentile(samples, 50) * 1000:7.2f}ms "
+        f"p95={percentile(samples, 95) * 1000:7.2f}ms "
+        f"mean={statistics.mean(samples) * 1000:7.2f}ms"
+    )
+
+
+def fresh_connection_query():
+    # What bot.py used to do for every lookup
+    conn = psycopg2.connect(db.DATABASE_URL)
+    cur = conn.cursor()
+    cur.execute("SELECT doctor_id, name, specialty FROM doctorss;")
+    cur.fetchall()
+    conn.close()
+
+
+def pooled_query():
+    with db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT doctor_id, name, specialty FROM doctorss;")
+        cur.fetchall()
+
+
+async def handle_blocking():
+    fresh_connection_query()
+
+
+async def handle_pooled():
+    await db.run(pooled_query)
+
+
+async def drive(handler):
+    """
+    Sends MESSAGES messages through `handler`, CONCURRENT_CHATS at a time,
+    and returns the per-message latency as seen by each chat.
+    """
+    latencies = []
+    for offset in range(0, MESSAGES, CONCURRENT_CHATS):
+        batch = min(CONCURRENT_CHATS, MESSAGES - offset)
+        start = time.perf_counter()
+        waits = []
+
+        async def timed():
+            # Time from the batch arriving until this chat's message finished
+            await handler()
+            waits.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(timed() for _ in range(batch)))
+        latencies.extend(waits)
+    return latencies
+
+
+if __name__ == "__main__":
+    try:
+        db.warm_pool()
+        print(f"📊 {MESSAGES} messages, {CONCURRENT_CHATS} concurrent chats\n")
+        report("before: connect per query", asyncio.run(drive(handle_blocking)))
+        report("after: pooled + threaded", asyncio.run(drive(handle_pooled)))
+    except Exception as e:
+        print("❌ Benchmark failed:")
+        print(e)
+    finally:
+        db.close_pool()
@@ -0,0 +1,51 @@
+import random
+import string
+import time
+from name_index import NameIndex
+
+SIZES = [10, 1_000, 100_000]
+QUERIES = 500
+
+random.seed(7)
+
+
+def random_word(length):
+    return "".join(random.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def make_typo(word):
+    i = random.randrange(len(word))
+    return word[:i] + random.choice(string.ascii_lowercase) + word[i + 1:]
+
+
+def synthetic_doctors(count):
+    return [
+        (i, f"Dr. {random_word(random.randint(4, 8)).title()} {random_word(random.randint(5, 10)).title()}", "General Practitioner")
+        for i in range(count)
+    ]
+
+
+def time_queries(index, queries):
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+for size in SIZES:
+    doctors = synthetic_doctors(size)
+    start = time.perf_counter()
+    index = NameIndex(doctors)
+    build = time.perf_counter() - start
+
+    sample = [random.choice(doctors)[1] for _ in range(QUERIES)]
+    exact = [name.split()[-1] for name in sample]
+    typos = [make_typo(name.split()[-1]) for name in sample]
+    misses = [random_word(7) for _ in range(QUERIES)]
+
+    print(
+        f"📊 {size:>7} doctors  build={build * 1000:8.1f}ms  "
+        f"exact={time_queries(index, exact) * 1e6:7.1f}µs  "
+        f"typo={time_queries(index, typos) * 1e6:7.1f}µs  "
+        f"miss={time_queries(index, misses) * 1e6:7.1f}µs"
+    )
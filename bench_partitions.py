@@ -0,0 +1,157 @@
+import argparse
+import random
+import time
+from datetime import date, timedelta
+import db
+from availability import fetch_booked_times
+from partitions import add_months
+
+# Grows appointmentss to ~10M synthetic rows, a year at a time, and measures
+# the bot's hot-path queries after each step. With monthly partitions the
+# slot check and the booking conflict check only ever touch the partition
+# holding the requested day, so their latency should stay flat as history
+# piles up. Run it against a scratch database:
+#   DATABASE_URL=postgresql://localhost/bot_bench python migrate.py
+#   DATABASE_URL=postgresql://localhost/bot_bench python bench_partitions.py
+# 350 doctors x 16 slots a day x 365 days = ~2M rows per year.
+SLOTS_PER_DAY = 16
+BENCH_EMAIL = "bench@example.com"
+
+
+def create_doctors(cur, count):
+    cur.execute("""
+        INSERT INTO doctorss (name, specialty)
+        SELECT 'Bench Doctor ' || n, 'General Practitioner' FROM generate_series(1, %s) n
+        RETURNING doctor_id;
+    """, (count,))
+    return [row[0] for row in cur.fetchall()]
+
+
+def load_range(conn, doctor_ids, first_day, end_day):
+    """
+    Books every doctor solid (09:00-16:30) for every day in [first_day, end_day),
+    a month per transaction.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT ensure_appointment_partitions(%s, %s);", (first_day, end_day))
+    month = first_day
+    while month < end_day:
+        next_month = min(add_months(month, 1), end_day)
+        cur.execute("""
+            INSERT INTO appointmentss (
+                patient_name, patient_email, doctor_id,
+                appointment_day, appointment_month, appointment_time, starts_at, ends_at
+            )
+            SELECT 'Bench Patient', %s, d.doctor_id,
+                   extract(day FROM day)::INTEGER, extract(month FROM day)::INTEGER,
+                   (time '09:00' + slot * interval '30 minutes'),
+                   (day + interval '9 hours' + slot * interval '30 minutes') AT TIME ZONE 'Europe/London',
+                   (day + interval '9 hours 30 minutes' + slot * interval '30 minutes') AT TIME ZONE 'Europe/London'
+            FROM generate_series(%s::DATE, %s::DATE - 1, interval '1 day') AS day,
+                 generate_series(0, %s - 1) AS slot,
+                 unnest(%s::INTEGER[]) AS d(doctor_id);
+        """, (BENCH_EMAIL, month, next_month, SLOTS_PER_DAY, doctor_ids))
+        conn.commit()
+        month = next_month
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return (
+        ordered[len(ordered) // 2] * 1000,
+        ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+    )
+
+
+def partitions_scanned(cur, doctor_id, day, month):
+    """
+    Partitions the slot check actually reads, from EXPLAIN ANALYZE.
+    """
+    cur.execute("""
+        EXPLAIN (ANALYZE, COSTS OFF)
+        SELECT appointment_time FROM appointmentss
+        WHERE doctor_id = %(doctor_id)s
+          AND starts_at >= infer_appointment_start(%(day)s, %(month)s, '00:00', clinic_today())
+          AND starts_at < infer_appointment_start(%(day)s, %(month)s, '00:00', clinic_today()) + interval '1 day';
+    """, {"doctor_id": doctor_id, "day": day, "month": month})
+    plan = [row[0] for row in cur.fetchall()]
+    return len({
+        line.split(" on ")[1].split()[0] for line in plan
+        if " on appointmentss_y" in line and "never executed" not in line
+    })
+
+
+def measure(conn, doctor_ids, samples):
+    cur = conn.cursor()
+    slot_times, booking_times, scanned = [], [], set()
+    for _ in range(samples):
+        doctor_id = random.choice(doctor_ids)
+        day = date.today() + timedelta(days=random.randint(1, 60))
+        start = time.perf_counter()
+        fetch_booked_times(doctor_id, day.day, day.month)
+        slot_times.append(time.perf_counter() - start)
+
+        # Conflict check against a booked slot, rolled back either way
+        start = time.perf_counter()
+        cur.execute("""
+            SELECT create_appointment_with_conflict_check(
+                'Bench'::TEXT, %s::TEXT, %s::INTEGER, %s::INTEGER, %s::INTEGER, %s::TIME
+            );
+        """, (BENCH_EMAIL, doctor_id, day.day, day.month, f"{9 + random.randint(0, 7):02d}:00:00"))
+        cur.fetchone()
+        booking_times.append(time.perf_counter() - start)
+        conn.rollback()
+        scanned.add(partitions_scanned(cur, doctor_id, day.day, day.month))
+        conn.rollback()
+    return percentiles(slot_times), percentiles(booking_times), max(scanned)
+
+
+def main(args):
+    with db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT EXISTS (SELECT 1 FROM appointmentss);")
+        if cur.fetchone()[0] and not args.force:
+            print("❌ appointmentss is not empty; point DATABASE_URL at a scratch database (or pass --force)")
+            return
+        doctor_ids = create_doctors(cur, args.doctors)
+        conn.commit()
+        # Warm the pool connection fetch_booked_times uses
+        db.warm_pool()
+
+        print(f"{'rows':>12}{'slot p50 ms':>14}{'slot p95 ms':>14}{'book p50 ms':>14}{'book p95 ms':>14}{'partitions':>12}")
+        this_month = date.today().replace(day=1)
+        # The coming year first (what the bot queries), then history a year at a time
+        ranges = [(this_month, add_months(this_month, 12))]
+        ranges += [(add_months(this_month, -12 * (i + 1)), add_months(this_month, -12 * i)) for i in range(args.years - 1)]
+        try:
+            for first_day, end_day in ranges:
+                load_range(conn, doctor_ids, first_day, end_day)
+                cur.execute("ANALYZE appointmentss;")
+                cur.execute("SELECT COUNT(*) FROM appointmentss;")
+                rows = cur.fetchone()[0]
+                conn.commit()
+                (slot50, slot95), (book50, book95), scanned = measure(conn, doctor_ids, args.samples)
+                print(f"{rows:>12,}{slot50:>14.2f}{slot95:>14.2f}{book50:>14.2f}{book95:>14.2f}{scanned:>12}")
+        finally:
+            if not args.keep:
+                conn.rollback()
+                cur.execute("DELETE FROM appointmentss WHERE patient_email = %s;", (BENCH_EMAIL,))
+                cur.execute("DELETE FROM doctorss WHERE doctor_id = ANY(%s);", (doctor_ids,))
+                conn.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctors", type=int, default=350)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="leave the synthetic rows in place")
+    parser.add_argument("--force", action="store_true", help="run even if appointmentss has rows")
+    args = parser.parse_args()
+    try:
+        main(args)
+    except Exception as e:
+        print("❌ Error benchmarking partitions:")
+        print(e)
+    finally:
+        db.close_pool()
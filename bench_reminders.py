@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import time
+from datetime import date
+import db
+import reminders
+from bench_partitions import BENCH_EMAIL, create_doctors, load_range, percentiles
+from partitions import add_months
+from send_queue import SendQueue
+
+# Cost of a reminder tick as appointmentss grows to ~1M rows. First the
+# coming months are loaded (what reminders look at), then a year of history.
+# At each size: one tick with a full day of reminders due (e.g. right after
+# a deploy), then steady-state ticks, which should stay flat because they
+# only range-scan the unreminded rows of the current partition. Telegram is
+# a stand-in that answers at once; reminder emails go into email_outbox
+# (the outbox worker isn't running). Run it against a scratch database:
+#   DATABASE_URL=postgresql://localhost/bot_bench python migrate.py
+#   DATABASE_URL=postgresql://localhost/bot_bench python bench_reminders.py
+# 120 doctors x 16 slots a day x 18 months = ~1.05M appointments.
+
+
+class Message:
+    message_id = 1
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text):
+        self.sent += 1
+        return Message()
+
+
+def due_window(lead_hours):
+    return "starts_at > now() AND starts_at <= now() + make_interval(secs => %s)", (lead_hours * 3600,)
+
+
+def reset_reminders(conn, lead_hours):
+    """
+    Makes everything in the next lead_hours due again, with a chat to send to.
+    """
+    window, params = due_window(lead_hours)
+    cur = conn.cursor()
+    cur.execute(
+        f"UPDATE appointmentss SET reminded_at = NULL, chat_id = appointment_id WHERE {window} AND patient_email = %s;",
+        params + (BENCH_EMAIL,),
+    )
+    cur.execute("DELETE FROM email_outbox WHERE recipient = %s;", (BENCH_EMAIL,))
+    conn.commit()
+
+
+def explain_claim(conn, lead_hours, batch_size):
+    """
+    (partitions scanned, shared buffers touched) for the claim's range scan.
+    """
+    window, params = due_window(lead_hours)
+    cur = conn.cursor()
+    cur.execute(f"""
+        EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+        SELECT appointment_id FROM appointmentss
+        WHERE reminded_at IS NULL AND {window}
+        ORDER BY starts_at LIMIT %s;
+    """, params + (batch_size,))
+    plan = [row[0] for row in cur.fetchall()]
+    conn.rollback()
+    scanned = {
+        line.split(" on ")[1].split()[0] for line in plan
+        if " on appointmentss_y" in line and "never executed" not in line
+    }
+    buffers = next((line.strip() for line in plan if "Buffers:" in line), "Buffers: -")
+    return len(scanned), buffers
+
+
+async def measure(conn, args):
+    bot = FakeBot()
+    # No pacing: this times the tick itself, not Telegram's rate limits
+    queue = SendQueue(global_rate=1e9, global_burst=1e9, chat_rate=1e9, chat_burst=1e9, window=0)
+    reset_reminders(conn, args.lead_hours)
+
+    start = time.perf_counter()
+    backlog = await reminders.send_reminders(bot, args.lead_hours, args.batch_size, queue)
+    backlog_ms = (time.perf_counter() - start) * 1000
+
+    ticks = []
+    for _ in range(args.ticks):
+        start = time.perf_counter()
+        await reminders.send_reminders(bot, args.lead_hours, args.batch_size, queue)
+        ticks.append(time.perf_counter() - start)
+    return backlog, backlog_ms, percentiles(ticks), explain_claim(conn, args.lead_hours, args.batch_size)
+
+
+async def main(args):
+    with db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT EXISTS (SELECT 1 FROM appointmentss);")
+        if cur.fetchone()[0] and not args.force:
+            print("❌ appointmentss is not empty; point DATABASE_URL at a scratch database (or pass --force)")
+            return
+        doctor_ids = create_doctors(cur, args.doctors)
+        conn.commit()
+        db.warm_pool()
+
+        print(f"{'rows':>12}{'backlog':>9}{'backlog ms':>12}{'tick p50 ms':>13}{'tick p95 ms':>13}{'partitions':>12}  claim scan")
+        this_month = date.today().replace(day=1)
+        stages = [
+            (this_month, add_months(this_month, args.months_ahead)),
+            (add_months(this_month, -args.months_back), this_month),
+        ]
+        try:
+            for first_day, end_day in stages:
+                load_range(conn, doctor_ids, first_day, end_day)
+                cur.execute("ANALYZE appointmentss;")
+                cur.execute("SELECT COUNT(*) FROM appointmentss;")
+                rows = cur.fetchone()[0]
+                conn.commit()
+                backlog, backlog_ms, (p50, p95), (scanned, buffers) = await measure(conn, args)
+                print(f"{rows:>12,}{backlog:>9,}{backlog_ms:>12.1f}{p50:>13.2f}{p95:>13.2f}{scanned:>12}  {buffers}")
+        finally:
+            if not args.keep:
+                conn.rollback()
+                cur.execute("DELETE FROM email_outbox WHERE recipient = %s;", (BENCH_EMAIL,))
+                cur.execute("DELETE FROM appointmentss WHERE patient_email = %s;", (BENCH_EMAIL,))
+                cur.execute("DELETE FROM doctorss WHERE doctor_id = ANY(%s);", (doctor_ids,))
+                conn.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctors", type=int, default=120)
+    parser.add_argument("--months-ahead", type=int, default=6)
+    parser.add_argument("--months-back", type=int, default=12)
+    parser.add_argument("--lead-hours", type=float, default=reminders.REMINDER_LEAD_HOURS)
+    parser.add_argument("--batch-size", type=int, default=reminders.REMINDER_BATCH_SIZE)
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="leave the synthetic rows in place")
+    parser.add_argument("--force", action="store_true", help="run even if appointmentss has rows")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args))
+    except Exception as e:
+        print("❌ Error benchmarking reminders:")
+        print(e)
+    finally:
+        db.close_pool()
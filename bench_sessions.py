@@ -0,0 +1,70 @@
+import gc
+import sys
+import tracemalloc
+from session_store import MemorySessionStore, Session
+
+# Simulated chat counts; pass your own on the command line, e.g. 10000 50000
+SIZES = [int(n) for n in sys.argv[1:]] or [100_000, 1_000_000]
+# Conversation lines per chat; the strings are shared so only the session
+# structure itself is measured, not message text
+LINES = ["User: hi", "Assistant: Hey there!", "User: I want to book an appointment", "Assistant: Sure"]
+
+
+def dict_session():
+    # The nested-dict layout bot.py used before Session existed
+    session = {
+        "state": "idle",
+        "booking_data": {
+            "doctor_id": None,
+            "doctor_name": None,
+            "appointment_day": None,
+            "appointment_month": None,
+            "appointment_time": None,
+            "patient_name": None,
+            "patient_email": None
+        },
+        "context": []
+    }
+    for line in LINES:
+        session["context"].append(line)
+        if len(session["context"]) > 10:
+            session["context"] = session["context"][-10:]
+    return session
+
+
+def plain_dict_store(count):
+    sessions = {}
+    for chat_id in range(count):
+        sessions[chat_id] = dict_session()
+    return sessions
+
+
+def slots_store(count):
+    store = MemorySessionStore(idle_ttl=float("inf"), max_chats=count, sweep_interval=float("inf"))
+    for chat_id in range(count):
+        session = store.get(chat_id)
+        for line in LINES:
+            session.context.append(line)
+    return store
+
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    store = build(count)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    gc.collect()
+    return used
+
+
+if __name__ == "__main__":
+    print(f"📊 Bytes per session ({len(LINES)} context lines each)\n")
+    for count in SIZES:
+        before = measure(plain_dict_store, count)
+        after = measure(slots_store, count)
+        print(
+            f"{count:>9} chats  dicts={before / count:6.0f} B  Session={after / count:6.0f} B  "
+            f"total {before / 2**20:7.1f} MiB -> {after / 2**20:7.1f} MiB"
+        )
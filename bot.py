@@ -1,33 +1,76 @@
 import os
-import psycopg2
 import re
-import smtplib
-from email.mime.text import MIMEText
+import sys
 import google.generativeai as genai
 import json
+import time
 from datetime import datetime
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, filters
+import db
+from doctor_directory import directory
+from name_index import MATCH_THRESHOLD, search_pg_trgm
+from intent_matcher import IntentMatcher, load_symptom_map
+from gemini_client import EMPTY_REPLY, FALLBACK_REPLY, GeminiGateway
+from prompt_builder import PromptBuilder, prompt_history
+from progressive_reply import ProgressiveReply
+from response_cache import ResponseCache
+from admission import SHED_RATE_LIMITED, AdmissionController
+from email_outbox import confirmation_email, enqueue_email, outbox
+from availability import availability, extract_times
+from session_store import Session, make_session_store
+from partitions import maintainer as partition_maintainer
+from dispatcher import UPDATE_BACKLOG, chat_locks
+from send_queue import outbound
+import reminders
+import metrics
+from metrics import track
+import tracing
+from tracing import span, traced
 
 print("TELEGRAM_TOKEN VALUE:", os.getenv("TELEGRAM_TOKEN"))
 
 load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-EMAIL_HOST = os.getenv("EMAIL_HOST")
-EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
-EMAIL_USER = os.getenv("EMAIL_USER")
-EMAIL_PASS = os.getenv("EMAIL_PASS")
+# "memory" uses the in-process name index, "pg_trgm" asks Postgres instead
+DOCTOR_MATCHER = os.getenv("DOCTOR_MATCHER", "memory")
+# Optional JSON file with extra symptom -> specialty entries
+SYMPTOMS_FILE = os.getenv("SYMPTOMS_FILE")
+# Stream Gemini replies into one message that is edited as text arrives,
+# instead of sending the whole reply once it is done
+GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "true").lower() == "true"
+# Seconds to keep sending queued replies on shutdown
+SEND_QUEUE_DRAIN_TIMEOUT = float(os.getenv("SEND_QUEUE_DRAIN_TIMEOUT", 10))
+# Set when updates arrive by webhook (webhook_server.py); polling is then refused
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
 
 # Configure Gemini
 genai.configure(api_key=GEMINI_API_KEY)
+gemini = GeminiGateway()
+# Role-tagged, token-budgeted history for each Gemini call
+prompt_builder = PromptBuilder()
+# Per-chat rate limit and a cap on queued Gemini calls; whatever is shed
+# gets a cached or canned answer instead
+admission = AdmissionController()
+metrics.llm_pending.set_function(lambda: admission.in_flight)
+RATE_LIMITED_REPLY = (
+    "You’re sending messages faster than I can keep up! Give me a few seconds and ask again. "
+    "If you’d like to book an appointment, just type 'appointment'."
+)
+OVERLOADED_REPLY = (
+    "I’m a bit busy right now, so I can’t chat properly for a moment. Booking still works as usual: "
+    "just type 'appointment' to get started."
+)
+# Repeated small-talk questions are answered from here instead of Gemini
+response_cache = ResponseCache()
+metrics.response_cache_entries.set_function(lambda: len(response_cache))
 
 # -----------------------------------------------------------------------------
-# Per-chat session data in memory
+# Per-chat session data (in memory, SQLite or Postgres; see SESSION_BACKEND)
 # -----------------------------------------------------------------------------
-user_sessions = {}
+sessions = make_session_store()
 
 # -----------------------------------------------------------------------------
 # Booking States
@@ -46,6 +89,7 @@ BOOKING_STATES = [
 # -----------------------------------------------------------------------------
 # Symptom-based recommendation:
 #   If the user says "I have a fever," we might recommend the general practitioner
+#   Values are a specialty, or (specialty, weight) for stronger signals
 # -----------------------------------------------------------------------------
 SYMPTOM_MAP = {
     # Common GP-related symptoms
@@ -56,8 +100,13 @@ SYMPTOM_MAP = {
     # Cardiology-related
     "heart": "cardiologist",
     "cardiac": "cardiologist",
-    "chest pain": "cardiologist"
+    "chest pain": ("cardiologist", 2)
 }
+if SYMPTOMS_FILE:
+    SYMPTOM_MAP.update(load_symptom_map(SYMPTOMS_FILE))
+
+# Booking keywords, greetings and symptoms, all matched in one pass per message
+message_matcher = IntentMatcher(SYMPTOM_MAP)
 
 # -----------------------------------------------------------------------------
 # Helper Functions
@@ -66,160 +115,134 @@ SYMPTOM_MAP = {
 def is_valid_email(email: str) -> bool:
     return re.match(r"[^@]+@[^@]+\.[^@]+", email)
 
+@traced("get_doctors")
 def get_doctors():
     """
-    Retrieves the list of doctors from the 'doctorss' table:
+    Returns the cached list of doctors from the 'doctorss' table:
       (doctor_id, name, specialty)
     """
-    try:
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
-        cur.execute("SELECT doctor_id, name, specialty FROM doctorss;")
-        doctors = cur.fetchall()
-        conn.close()
-        return doctors
-    except Exception as e:
-        print("❌ DB Doctors Fetch Error:", e)
-        return []
+    return directory.snapshot()["doctors"]
 
+@traced("is_slot_available")
 def is_slot_available(doctor_id, day, month, time_):
     """
-    Checks the DB to see if the given doctor, date, and time slot are free.
+    Checks whether the given doctor, date, and time slot are free, using the
+    per-day availability index (one DB query per doctor-day).
     """
     try:
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT COUNT(*) FROM appointmentss
-            WHERE doctor_id = %s AND appointment_day = %s AND appointment_month = %s AND appointment_time = %s;
-        """, (doctor_id, day, month, time_))
-        count = cur.fetchone()[0]
-        conn.close()
-        return count == 0
+        return availability.is_free(doctor_id, day, month, time_)
     except Exception as e:
+        metrics.stage_errors.inc("slot_check")
         print("❌ Availability Check Error:", e)
         return False
 
-def create_appointment(data):
+@traced("first_free_slot")
+def first_free_slot(doctor_id, day, month, times):
     """
-    Inserts a new appointment into the 'appointmentss' table.
+    Returns the first of `times` that is still free for the doctor, or None.
     """
     try:
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO appointmentss (
-                patient_name, patient_email, doctor_id,
-                appointment_day, appointment_month, appointment_time
-            ) VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING appointment_id;
-        """, (
-            data["patient_name"],
-            data["patient_email"],
-            data["doctor_id"],
-            data["appointment_day"],
-            data["appointment_month"],
-            data["appointment_time"]
-        ))
-        appointment_id = cur.fetchone()[0]
-        conn.commit()
-        conn.close()
-        return appointment_id
+        return availability.first_free(doctor_id, day, month, times)
     except Exception as e:
-        print("❌ DB Appointment Insert Error:", e)
+        metrics.stage_errors.inc("slot_check")
+        print("❌ Availability Check Error:", e)
         return None
 
-def send_confirmation_email(email, name, doctor, day, month, time_):
+@traced("create_appointment")
+def create_appointment(data, chat_id=None):
     """
-    Sends a confirmation email to the patient with the booking details.
+    Books the appointment in one round trip through the server-side
+    create_appointment_with_conflict_check function; the unique slot index
+    makes it safe against two chats grabbing the same slot. The chat is
+    stored with it so reminders can go out on Telegram.
+
+    Returns one of:
+      {"status": "booked", "appointment_id": 42}
+      {"status": "conflict", "alternatives": ["10:30:00", ...]}
+      {"status": "error"}
     """
-    subject = "Appointment Confirmation - Srivathsan Healthcare"
-    body = f"""
-Hi {name},
-
-Your appointment with {doctor} is confirmed for {day}/{month} at {time_}.
+    slot = (data.doctor_id, data.appointment_day, data.appointment_month, data.appointment_time)
+    try:
+        with db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT create_appointment_with_conflict_check(
+                    %s::TEXT, %s::TEXT, %s::INTEGER, %s::INTEGER, %s::INTEGER, %s::TIME, %s::BIGINT
+                );
+            """, (data.patient_name, data.patient_email) + slot + (chat_id,))
+            appointment_id = cur.fetchone()[0]
+            conn.commit()
+    except Exception as e:
+        metrics.stage_errors.inc("create_appointment")
+        print("❌ DB Appointment Insert Error:", e)
+        return {"status": "error"}
+    # Either we just booked it or someone else did; the slot is taken either way
+    availability.mark_booked(*slot)
+    if appointment_id is None:
+        try:
+            alternatives = availability.suggest(*slot)
+        except Exception as e:
+            print("❌ Availability Check Error:", e)
+            alternatives = []
+        return {"status": "conflict", "alternatives": alternatives}
+    return {"status": "booked", "appointment_id": appointment_id}
+
+async def send_message(bot, **kwargs):
+    """
+    Queues bot.send_message on the outbound send queue, which paces it to
+    Telegram's flood limits, merges it with the chat's next message if that
+    follows right away and retries 429s. Returns a future for the sent
+    Message; the turn doesn't wait for delivery.
+    """
+    return outbound.send(bot, "send_message", **kwargs)
 
-Thank you for choosing Srivathsan Healthcare!
+@traced("send_confirmation_email")
+def send_confirmation_email(email, name, doctor, day, month, time_):
     """
-    msg = MIMEText(body)
-    msg["Subject"] = subject
-    msg["From"] = EMAIL_USER
-    msg["To"] = email
+    Queues a confirmation email with the booking details. The outbox worker
+    delivers it in the background; returns True once it is safely queued.
+    """
+    subject, body = confirmation_email(name, doctor, day, month, time_)
     try:
-        server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT)
-        server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASS)
-        server.sendmail(EMAIL_USER, [email], msg.as_string())
-        server.quit()
+        enqueue_email(email, subject, body)
         return True
     except Exception as e:
-        print("❌ Email Sending Error:", e)
+        metrics.stage_errors.inc("email_enqueue")
+        print("❌ Email Queue Error:", e)
         return False
 
-def initialize_session(chat_id):
+async def initialize_session(chat_id):
     """
     Retrieves or initializes user session data for the given chat_id.
     """
-    if chat_id not in user_sessions:
-        user_sessions[chat_id] = {
-            "state": "idle",
-            "booking_data": {
-                "doctor_id": None,
-                "doctor_name": None,
-                "appointment_day": None,
-                "appointment_month": None,
-                "appointment_time": None,
-                "patient_name": None,
-                "patient_email": None
-            },
-            # Keep track of the last few messages for more context with Gemini
-            "context": []
-        }
-    return user_sessions[chat_id]
+    return await sessions.aget(chat_id)
 
 def format_doctor_list():
     """
     Returns a nicely formatted list of doctors and specialties.
     """
-    docs = get_doctors()
-    if not docs:
-        return "No doctors are available at the moment."
-    lines = [f"- {doc[1]} ({doc[2]})" for doc in docs]
-    return "\n".join(lines)
+    return directory.snapshot()["list_text"]
 
 # -----------------------------------------------------------------------------
 # Fuzzy Doctor Matching
 # -----------------------------------------------------------------------------
+@traced("fuzzy_match_doctor")
 def fuzzy_match_doctor(user_input: str):
     """
-    Tries to fuzzy match a doctor name (e.g. "Srivathsan?" or "Suresh!!")
-    against the known list of doctors from the DB.
+    Tries to fuzzy match a doctor name (e.g. "Srivathsan?", "Suresh!!" or a
+    typo like "Srivatsan") against the known list of doctors.
 
     Returns: (doc_id, doc_name) or None if no match found.
     """
-    user_input_clean = re.sub(r"[^a-zA-Z0-9\s]", "", user_input).lower().strip()
-    doctors = get_doctors()
-    best_match = None
-    best_score = 0
-
-    for doc_id, name, specialty in doctors:
-        # Clean up the doctor name too
-        doc_name_clean = re.sub(r"[^a-zA-Z0-9\s]", "", name).lower().strip()
-        # A simple approach: count how many words from user_input match doc_name
-        # Or you can use difflib for a more robust approach
-        matches = 0
-        for token in user_input_clean.split():
-            if token in doc_name_clean.split():
-                matches += 1
-        score = matches / max(len(user_input_clean.split()), 1)
-
-        if score > best_score:
-            best_score = score
-            best_match = (doc_id, name)
+    if DOCTOR_MATCHER == "pg_trgm":
+        candidates = search_pg_trgm(user_input, limit=1)
+    else:
+        candidates = directory.snapshot()["name_index"].search(user_input, limit=1)
 
     # If we are above a threshold, we say it matched
-    if best_score > 0.4:  # adjust threshold as needed
-        return best_match
+    if candidates and candidates[0][2] > MATCH_THRESHOLD:
+        doc_id, name, _ = candidates[0]
+        return (doc_id, name)
     return None
 
 # -----------------------------------------------------------------------------
@@ -230,18 +253,9 @@ def recommend_doctor_for_symptoms(user_input: str):
     If the user mentions certain symptoms, we can recommend a doctor.
     E.g. 'I have a fever' -> recommends general practitioner.
     Returns: 'general practitioner' or 'cardiologist' or None if not sure.
+    When several specialties match, the one with the highest weighted score wins.
     """
-    user_input_lower = user_input.lower()
-    matched_specialties = []
-
-    for symptom, specialty in SYMPTOM_MAP.items():
-        if symptom in user_input_lower:
-            matched_specialties.append(specialty)
-
-    # If we find multiple specialties, just pick the first or you can handle logic
-    if matched_specialties:
-        return matched_specialties[0]
-    return None
+    return message_matcher.match(user_input)["specialty"]
 
 def get_doctor_by_specialty(specialty: str):
     """
@@ -249,69 +263,180 @@ def get_doctor_by_specialty(specialty: str):
     E.g. 'general practitioner' or 'cardiologist'.
     If none found, return None.
     """
-    doctors = get_doctors()
-    for doc_id, name, spec in doctors:
-        if spec.lower().startswith(specialty.lower()):
-            return (doc_id, name)
+    specialty = specialty.lower()
+    by_specialty = directory.snapshot()["by_specialty"]
+    if specialty in by_specialty:
+        return by_specialty[specialty][0]
+    # Fall back to a prefix match over the (few) distinct specialties
+    for spec, docs in by_specialty.items():
+        if spec.startswith(specialty):
+            return docs[0]
     return None
 
 # -----------------------------------------------------------------------------
 # Gemini Free-Form Response
 # -----------------------------------------------------------------------------
+async def stream_gemini_reply(chat_id, contents, bot):
+    """
+    Shows "typing…" straight away, then a single message that fills in as
+    Gemini streams its reply (edits throttled, see ProgressiveReply).
+    Nothing waits on Telegram until the stream is done, so the Gemini slot
+    is never held up by a slow send.
+    """
+    reply = ProgressiveReply(bot, chat_id)
+    reply.typing()
+    start = time.perf_counter()
+    text = ""
+    with track("gemini"):
+        async for piece in gemini.stream(contents):
+            text += piece
+            reply.update(text)
+    await reply.finish(text)
+    metrics.first_reply_seconds.observe(reply.first_shown_at - start)
+    return text
+
+
+def degraded_reply(user_input, reason):
+    """
+    What a shed message gets: the cached answer to the same question asked
+    at the start of a conversation if there is one, otherwise a canned reply.
+    Answers given later in other conversations are never used; they may
+    mention another patient's details.
+    """
+    text = response_cache.get_first_turn(user_input)
+    if text is not None:
+        metrics.llm_degraded.inc("cached")
+        return text
+    metrics.llm_degraded.inc("canned")
+    return RATE_LIMITED_REPLY if reason == SHED_RATE_LIMITED else OVERLOADED_REPLY
+
+
+@traced("send_gemini_response")
 async def send_gemini_response(chat_id, user_input, context, bot):
     """
-    Calls Gemini to respond in a natural, friendly style.
-    We pass it some context and the user’s prompt.
-    """
-    full_prompt = (
-        "You are a friendly, empathetic, and extremely human-like admin assistant for Srivathsan Healthcare.\n"
-        "Respond to the user in a warm, conversational tone.So "
-        "whenever you naturally talk about appointment "
-        "like for example if youre asking them a question "
-        "like would you like to book an appointment or something"
-        " related to appoint. always say like if you wanna go ahead "
-        "and book an appointment say the word appointment and i'll take you through the process. whatever kind of things beacuse sometimes when naturally you might say do you want to book an appoint ment the user might say yes so dont let them say yes if the say yes or okay or whaetver like a confirming word ask them to enter the word appointment to take them through the booking process. Whatever conversations youre making keep it in the space of health care admin you can have conversation with them naturally but always keep it in the space of an healthcare admin and always try to drive the conversation in booking an appointment by asking them to say the word appointment be strict about it and also youve been trained make appointment only you can do any other actions apart from naturaly having conversation.. driving them towards appointment when having conversation and also you could give some general medical advice and prompt them towards bookgin an appoint by asking them say the word appointment if you find that they might have some serious problem by the converssations you have with them and make sure to keep the conversation neat and clean noo too much talking and not too less talking be a nice admin and also if they are typing some random things and that has the word appointment dont jump into the booking flow if you see just one word appointment then you go with the booking flow and also one more thing youre basically based on edinburgh so make sure the terminolies and everything are the same accordingly\n\n"
-    )
-    if context:
-        # We embed the last few lines of conversation as context
-        full_prompt += "\n".join(context) + "\n"
-    full_prompt += f"User: {user_input}\nAssistant:"
-    try:
-        model = genai.GenerativeModel("models/gemini-2.0-flash")
-        response = model.generate_content(full_prompt)
-        text = response.text.strip() if response.text else "I'm sorry, I didn't catch that."
-    except Exception as e:
-        print("❌ Gemini response error:", e)
-        text = "I’m here to help, but something went wrong. Could you please rephrase that?"
-    await bot.send_message(chat_id=chat_id, text=text)
+    Calls Gemini to respond in a natural, friendly style and returns the reply.
+    We pass it the recent conversation (within the token budget) and the user’s prompt;
+    the system instruction is already set on the model.
+    """
+    contents = prompt_builder.build(context, user_input)
+    # Keyed on everything Gemini would see before this message, so a reply is
+    # never reused for a conversation that differs in any way
+    history = prompt_history(contents)
+    text = response_cache.get(user_input, history)
+    if text is not None:
+        await send_message(bot, chat_id=chat_id, text=text)
+        return text
+
+    # Shed instead of queueing behind a saturated Gemini (see admission.py)
+    shed = admission.check(chat_id)
+    if shed is not None:
+        metrics.llm_requests.inc(shed)
+        text = degraded_reply(user_input, shed)
+        await send_message(bot, chat_id=chat_id, text=text)
+        return text
+    metrics.llm_requests.inc("queued" if gemini.saturated() else "admitted")
+
+    # Reused model, bounded concurrency, timeouts and retries live in the gateway
+    with admission.pending():
+        if GEMINI_STREAMING:
+            text = await stream_gemini_reply(chat_id, contents, bot)
+        else:
+            with track("gemini"):
+                text = await gemini.generate(contents)
+            await send_message(bot, chat_id=chat_id, text=text)
+    if text == FALLBACK_REPLY:
+        metrics.stage_errors.inc("gemini")
+    if text not in (EMPTY_REPLY, FALLBACK_REPLY):
+        response_cache.put(user_input, history, text)
+    return text
 
 # -----------------------------------------------------------------------------
 # Booking Flow (State Machine)
 # -----------------------------------------------------------------------------
-async def process_booking_flow(chat_id, msg, update, context_obj):
-    session = user_sessions[chat_id]
-    state = session["state"]
-    booking = session["booking_data"]
+async def finalize_booking(chat_id, session, context_obj):
+    """
+    Saves the completed booking, confirms it to the user and resets the session.
+    On a slot conflict the user is sent back to pick another time instead.
+    """
+    booking = session.booking
+    # Create appointment in the DB (atomic check-and-insert)
+    with track("create_appointment"):
+        result = await db.run(create_appointment, booking, chat_id)
+    metrics.bookings.inc(result["status"])
+    if result["status"] == "conflict":
+        # Someone took the slot since we checked; keep the details and re-ask
+        session.state = "select_time"
+        if result["alternatives"]:
+            text = (
+                f"I’m so sorry, {booking.appointment_time} was just taken. The nearest free times are "
+                + ", ".join(result["alternatives"])
+                + ". Which would you like?"
+            )
+        else:
+            text = "I’m so sorry, that slot was just taken. Could you give me another time in HH:MM:SS?"
+        await send_message(context_obj.bot, chat_id=chat_id, text=text)
+        return
+    if result["status"] == "booked":
+        await send_message(context_obj.bot,
+            chat_id=chat_id,
+            text="Awesome news: your appointment is confirmed"
+        )
+        with track("email_enqueue"):
+            emailed = await db.run(
+                send_confirmation_email,
+                booking.patient_email,
+                booking.patient_name,
+                booking.doctor_name,
+                booking.appointment_day,
+                booking.appointment_month,
+                booking.appointment_time
+            )
+        if emailed:
+            await send_message(context_obj.bot,
+                chat_id=chat_id,
+                text="I’m sending you a confirmation email now. Hope you feel better soon!"
+            )
+        else:
+            await send_message(context_obj.bot,
+                chat_id=chat_id,
+                text="We booked the appointment, but I couldn’t send the confirmation email. Sorry about that!"
+            )
+    else:
+        await send_message(context_obj.bot,
+            chat_id=chat_id,
+            text="There was an error saving your appointment. Maybe try again in a moment?"
+        )
+    # Reset session
+    session.reset_booking()
+
+async def process_booking_flow(chat_id, msg, update, context_obj, matched=None):
+    session = sessions.get(chat_id)
+    state = session.state
+    booking = session.booking
+    # handle_message usually has already scanned the message; reuse its result.
+    # Date/time/name/email steps never need it, so don't scan for them.
+    if matched is None and state in ["idle", "booking_init", "select_doctor"]:
+        matched = message_matcher.match(msg)
 
     # 1) If we are idle but see a booking intent, move to booking_init
-    if state == "idle" and any(word in msg.lower() for word in ["book", "appointment", "consultation", "schedule"]):
-        session["state"] = "booking_init"
+    if state == "idle" and matched["booking"]:
+        session.state = "booking_init"
 
         # Also check if the user mentioned a symptom
         # => Offer a recommended doctor if we can detect one
-        recommended_specialty = recommend_doctor_for_symptoms(msg)
+        recommended_specialty = matched["specialty"]
         if recommended_specialty:
             doc = get_doctor_by_specialty(recommended_specialty)
             if doc:
                 (doc_id, doc_name) = doc
-                booking["doctor_id"] = doc_id
-                booking["doctor_name"] = doc_name
-                session["state"] = "select_day"
+                booking.doctor_id = doc_id
+                booking.doctor_name = doc_name
+                session.state = "select_day"
                 response_text = (
                     f"I’m so sorry you’re not feeling well. Based on your symptoms, I’d recommend seeing {doc_name}. "
                     "Let's get you scheduled! Which day of this month would work for you (1-31)?"
                 )
-                await context_obj.bot.send_message(chat_id=chat_id, text=response_text)
+                await send_message(context_obj.bot, chat_id=chat_id, text=response_text)
                 return
             # If we recommended a specialty but no doc is found, just go normal flow
         # Normal flow if no symptom-based recommendation
@@ -321,32 +446,36 @@ async def process_booking_flow(chat_id, msg, update, context_obj):
             + doctor_list
             + "\n\nWho would you like to consult with? Or let me know if you have symptoms so I can recommend someone."
         )
-        await context_obj.bot.send_message(chat_id=chat_id, text=response_text)
+        await send_message(context_obj.bot, chat_id=chat_id, text=response_text)
         return
 
     # If user is in "booking_init" or "select_doctor" state, we try to figure out which doctor they want
     if state in ["booking_init", "select_doctor"]:
-        best_match = fuzzy_match_doctor(msg)
+        if DOCTOR_MATCHER == "pg_trgm":
+            with track("fuzzy_match"):
+                best_match = await db.run(fuzzy_match_doctor, msg)
+        else:
+            best_match = fuzzy_match_doctor(msg)
         if best_match:
             doc_id, doc_name = best_match
-            booking["doctor_id"] = doc_id
-            booking["doctor_name"] = doc_name
-            session["state"] = "select_day"
-            await context_obj.bot.send_message(
+            booking.doctor_id = doc_id
+            booking.doctor_name = doc_name
+            session.state = "select_day"
+            await send_message(context_obj.bot,
                 chat_id=chat_id,
                 text=f"Great choice! I’ve got you down for {doc_name}. Which day of this month works for you (1-31)?"
             )
         else:
             # Could also check for symptom-based rec again
-            recommended_specialty = recommend_doctor_for_symptoms(msg)
+            recommended_specialty = matched["specialty"]
             if recommended_specialty:
                 doc = get_doctor_by_specialty(recommended_specialty)
                 if doc:
                     (doc_id, doc_name) = doc
-                    booking["doctor_id"] = doc_id
-                    booking["doctor_name"] = doc_name
-                    session["state"] = "select_day"
-                    await context_obj.bot.send_message(
+                    booking.doctor_id = doc_id
+                    booking.doctor_name = doc_name
+                    session.state = "select_day"
+                    await send_message(context_obj.bot,
                         chat_id=chat_id,
                         text=(
                             f"I’m so sorry to hear that you’re not well. "
@@ -356,9 +485,9 @@ async def process_booking_flow(chat_id, msg, update, context_obj):
                     )
                     return
             # If still no match, prompt the user politely
-            session["state"] = "select_doctor"
+            session.state = "select_doctor"
             doc_list = format_doctor_list()
-            await context_obj.bot.send_message(
+            await send_message(context_obj.bot,
                 chat_id=chat_id,
                 text=(
                     "I’m not entirely sure which doctor you want. Could you clarify? "
@@ -371,14 +500,14 @@ async def process_booking_flow(chat_id, msg, update, context_obj):
     # Next states: collecting date/time
     if state == "select_day":
         if msg.isdigit() and 1 <= int(msg) <= 31:
-            booking["appointment_day"] = int(msg)
-            session["state"] = "select_month"
-            await context_obj.bot.send_message(
+            booking.appointment_day = int(msg)
+            session.state = "select_month"
+            await send_message(context_obj.bot,
                 chat_id=chat_id,
                 text="Great! Which month number would you prefer? (1-12)"
             )
         else:
-            await context_obj.bot.send_message(
+            await send_message(context_obj.bot,
                 chat_id=chat_id,
                 text="Hmm, that doesn't seem like a valid day (1-31). Could you try again?"
             )
@@ -386,54 +515,75 @@ async def process_booking_flow(chat_id, msg, update, context_obj):
 
     if state == "select_month":
         if msg.isdigit() and 1 <= int(msg) <= 12:
-            booking["appointment_month"] = int(msg)
-            session["state"] = "select_time"
-            await context_obj.bot.send_message(
+            booking.appointment_month = int(msg)
+            session.state = "select_time"
+            await send_message(context_obj.bot,
                 chat_id=chat_id,
                 text="Fantastic. What time slot do you prefer? (Format: HH:MM:SS, e.g. 09:30:00)"
             )
         else:
-            await context_obj.bot.send_message(
+            await send_message(context_obj.bot,
                 chat_id=chat_id,
                 text="That doesn’t seem like a valid month (1-12). Could you try again?"
             )
         return
 
     if state == "select_time":
-        # Validate the time format
-        if re.match(r"^\d{2}:\d{2}:\d{2}$", msg):
-            booking["appointment_time"] = msg
-            # Check if slot is available
-            if is_slot_available(
-                booking["doctor_id"],
-                booking["appointment_day"],
-                booking["appointment_month"],
-                booking["appointment_time"]
-            ):
-                session["state"] = "get_name"
-                await context_obj.bot.send_message(
-                    chat_id=chat_id,
-                    text="That slot is free! Could I get your name?"
+        # Accept one or more times, e.g. "10:00:00" or "10:00 or 14:30"
+        candidates = extract_times(msg)
+        if candidates:
+            # One lookup checks every candidate against the doctor's loaded day
+            with track("slot_check"):
+                free_time = await db.run(
+                    first_free_slot,
+                    booking.doctor_id,
+                    booking.appointment_day,
+                    booking.appointment_month,
+                    candidates
                 )
-            else:
-                await context_obj.bot.send_message(
+            if free_time:
+                booking.appointment_time = free_time
+                if booking.patient_email:
+                    # Re-picking a time after a booking conflict; we already have their details
+                    await finalize_booking(chat_id, session, context_obj)
+                    return
+                session.state = "get_name"
+                await send_message(context_obj.bot,
                     chat_id=chat_id,
-                    text="I’m sorry, that time slot’s already taken. Could you give me another time in HH:MM:SS?"
+                    text=f"{free_time} is free! Could I get your name?"
                 )
+            else:
+                with track("slot_suggest"):
+                    alternatives = await db.run(
+                        availability.suggest,
+                        booking.doctor_id,
+                        booking.appointment_day,
+                        booking.appointment_month,
+                        candidates[0]
+                    )
+                if alternatives:
+                    text = (
+                        "I’m sorry, that time slot’s already taken. The nearest free times are "
+                        + ", ".join(alternatives)
+                        + ". Which would you like?"
+                    )
+                else:
+                    text = "I’m sorry, that time slot’s already taken. Could you give me another time in HH:MM:SS?"
+                await send_message(context_obj.bot, chat_id=chat_id, text=text)
         else:
-            await context_obj.bot.send_message(
+            await send_message(context_obj.bot,
                 chat_id=chat_id,
                 text="Time must be in HH:MM:SS format (e.g., 14:30:00). Could you try again?"
             )
         return
 
     if state == "get_name":
-        booking["patient_name"] = msg.strip()
-        session["state"] = "get_email"
-        await context_obj.bot.send_message(
+        booking.patient_name = msg.strip()
+        session.state = "get_email"
+        await send_message(context_obj.bot,
             chat_id=chat_id,
             text=(
-                f"Thanks, {booking['patient_name']}! Finally, could I get your email address "
+                f"Thanks, {booking.patient_name}! Finally, could I get your email address "
                 "so I can send you a confirmation?"
             )
         )
@@ -441,50 +591,10 @@ async def process_booking_flow(chat_id, msg, update, context_obj):
 
     if state == "get_email":
         if is_valid_email(msg):
-            booking["patient_email"] = msg.strip()
-            # Create appointment in the DB
-            app_id = create_appointment(booking)
-            if app_id:
-                await context_obj.bot.send_message(
-                    chat_id=chat_id,
-                    text="Awesome news: your appointment is confirmed"
-                )
-                emailed = send_confirmation_email(
-                    booking["patient_email"],
-                    booking["patient_name"],
-                    booking["doctor_name"],
-                    booking["appointment_day"],
-                    booking["appointment_month"],
-                    booking["appointment_time"]
-                )
-                if emailed:
-                    await context_obj.bot.send_message(
-                        chat_id=chat_id,
-                        text="I’ve just sent you a confirmation email. Hope you feel better soon!"
-                    )
-                else:
-                    await context_obj.bot.send_message(
-                        chat_id=chat_id,
-                        text="We booked the appointment, but I couldn’t send the confirmation email. Sorry about that!"
-                    )
-            else:
-                await context_obj.bot.send_message(
-                    chat_id=chat_id,
-                    text="There was an error saving your appointment. Maybe try again in a moment?"
-                )
-            # Reset session
-            session["state"] = "idle"
-            session["booking_data"] = {
-                "doctor_id": None,
-                "doctor_name": None,
-                "appointment_day": None,
-                "appointment_month": None,
-                "appointment_time": None,
-                "patient_name": None,
-                "patient_email": None
-            }
+            booking.patient_email = msg.strip()
+            await finalize_booking(chat_id, session, context_obj)
         else:
-            await context_obj.bot.send_message(
+            await send_message(context_obj.bot,
                 chat_id=chat_id,
                 text="That doesn’t look like a valid email. Could you try typing it again?"
             )
@@ -498,45 +608,66 @@ async def handle_message(update: Update, context_obj: ContextTypes.DEFAULT_TYPE)
     chat_id = update.effective_chat.id
     msg = update.message.text.strip()
 
-    # ✅ Reset session if user types "reset"
-    if msg.lower() == "reset":
-        user_sessions[chat_id] = {
-            "state": "idle",
-            "booking_data": {
-                "doctor_id": None,
-                "doctor_name": None,
-                "appointment_day": None,
-                "appointment_month": None,
-                "appointment_time": None,
-                "patient_name": None,
-                "patient_email": None
-            },
-            "context": []
-        }
-        await context_obj.bot.send_message(chat_id=chat_id, text="🔄 Chat has been reset")
-        return
-
-
-
+    # One trace per update; the helpers below add their own child spans
+    with span("handle_message", chat_id=chat_id, update_id=update.update_id) as root:
+        # Different chats are handled concurrently, but one chat's messages go
+        # through the state machine strictly one at a time, in order; only the
+        # one at the head of the chat's queue holds a worker slot
+        async with chat_locks.hold(chat_id):
+            # ✅ Reset session if user types "reset"
+            if msg.lower() == "reset":
+                state = (await initialize_session(chat_id)).state
+                if state != "idle":
+                    metrics.abandoned.inc(state)
+                sessions.save(chat_id, Session())
+                await send_message(context_obj.bot, chat_id=chat_id, text="🔄 Chat has been reset")
+                return
 
-    session = initialize_session(chat_id)
+            start = time.perf_counter()
+            with track("session_load"):
+                session = await initialize_session(chat_id)
+            state = session.state
+            root.set("state", state)
+            try:
+                await respond_to_message(chat_id, msg, session, update, context_obj)
+            except Exception:
+                metrics.turn_errors.inc(state)
+                raise
+            finally:
+                # Shared stores write changed sessions back in batches, off the hot path
+                sessions.save(chat_id, session)
+                record_turn(state, session.state, time.perf_counter() - start)
+                root.set("next_state", session.state)
+
+
+def record_turn(before, after, elapsed):
+    metrics.turn_seconds.observe(elapsed, before)
+    if after != before:
+        metrics.state_transitions.inc(before, after)
+        if after != "idle":
+            metrics.funnel.inc(after)
+
+
+async def respond_to_message(chat_id, msg, session, update, context_obj):
     # Keep track of conversation context for a more personal Gemini fallback
-    session["context"].append(f"User: {msg}")
-    if len(session["context"]) > 10:
-        session["context"] = session["context"][-10:]
+    # (a ring buffer, so only the last few lines are ever kept)
+    session.context.append(f"User: {msg}")
 
     # If we're in the middle of a booking flow, handle that first
-    if session["state"] != "idle":
+    if session.state != "idle":
         await process_booking_flow(chat_id, msg, update, context_obj)
         return
 
+    # One pass over the message finds booking intent, symptoms and greetings
+    matched = message_matcher.match(msg)
+
     # If the user message suggests they want to book an appointment but we are idle
-    if any(word in msg.lower() for word in ["book", "appointment", "consultation", "schedule"]):
-        await process_booking_flow(chat_id, msg, update, context_obj)
+    if matched["booking"]:
+        await process_booking_flow(chat_id, msg, update, context_obj, matched)
         return
 
     # If the user has a health complaint or symptom but hasn't explicitly asked to book
-    recommended_specialty = recommend_doctor_for_symptoms(msg)
+    recommended_specialty = matched["specialty"]
     if recommended_specialty:
         doc = get_doctor_by_specialty(recommended_specialty)
         if doc:
@@ -546,32 +677,90 @@ async def handle_message(update: Update, context_obj: ContextTypes.DEFAULT_TYPE)
                 f"I'm really sorry you're experiencing that. You might consider seeing {doc_name}, "
                 "who specializes in that area. If you would like to book an appointment now, just type the word 'Appointment'?"
             )
-            session["context"].append(f"Assistant: {text}")
-            await context_obj.bot.send_message(chat_id=chat_id, text=text)
+            session.context.append(f"Assistant: {text}")
+            await send_message(context_obj.bot, chat_id=chat_id, text=text)
             return
 
     # If it's just casual chat or something else, let Gemini handle it
-    greetings = ["hi", "hello", "hey", "good morning", "good afternoon", "good evening"]
-    if any(greet in msg.lower() for greet in greetings):
+    if matched["greeting"]:
         # Offer a friendly greeting with a prompt
         text = (
             "Hey there! Welcome to Srivathsan Healthcare. How can I help you today? If you’d like to book an appointment or "
             "ask about symptoms, I’m here for you."
         )
-        session["context"].append(f"Assistant: {text}")
-        await context_obj.bot.send_message(chat_id=chat_id, text=text)
+        session.context.append(f"Assistant: {text}")
+        await send_message(context_obj.bot, chat_id=chat_id, text=text)
         return
 
     # Fallback to Gemini for free-flowing conversation
-    await send_gemini_response(chat_id, msg, session["context"], context_obj.bot)
-    session["context"].append("Assistant: [Gemini response]")
+    text = await send_gemini_response(chat_id, msg, session.context.lines(), context_obj.bot)
+    # The real reply, so the next turn's history shows what was actually said
+    session.context.append(f"Assistant: {text}")
 
 
 # -----------------------------------------------------------------------------
 # Run the Bot
 # -----------------------------------------------------------------------------
-if __name__ == "__main__":
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+def start_services(metrics_port=metrics.METRICS_PORT):
+    """
+    Starts everything a bot process needs besides Telegram itself.
+    """
+    # Prometheus scrapes latency histograms, funnel and error counters here
+    metrics.start_server(metrics_port)
+    # Open the pooled DB connections before the first message arrives
+    db.warm_pool()
+    # Load the doctor directory once and reload it whenever doctorss changes
+    directory.refresh()
+    directory.listen_for_changes()
+    # Confirmation emails are delivered from the outbox in the background
+    outbox.start()
+    sessions.start()
+    # Keeps future monthly appointment partitions ready and archives old ones
+    partition_maintainer.start()
+    # Finished trace spans are written to TRACE_FILE in the background
+    tracing.exporter.start()
+
+def stop_services():
+    outbox.stop()
+    partition_maintainer.stop()
+    sessions.close()
+    tracing.exporter.stop()
+    db.close_pool()
+
+async def drain_send_queue(app=None):
+    try:
+        await outbound.join(SEND_QUEUE_DRAIN_TIMEOUT)
+    except Exception as e:
+        print("❌ Send queue drain error:", e)
+
+def build_application(polling=True):
+    """
+    Builds the Telegram application with our handlers. Webhook workers pass
+    polling=False since updates are fed to them directly.
+    """
+    # Take updates off the queue freely: chat_locks keeps each chat in order
+    # and is what caps the work in flight (UPDATE_CONCURRENCY)
+    builder = ApplicationBuilder().token(TELEGRAM_TOKEN).concurrent_updates(UPDATE_BACKLOG)
+    # Let queued replies go out before the bot's HTTP client is closed
+    builder = builder.post_stop(drain_send_queue)
+    if not polling:
+        builder = builder.updater(None)
+    app = builder.build()
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    # Upcoming-appointment reminders, one batched tick every REMINDER_INTERVAL
+    if app.job_queue is not None:
+        reminders.schedule(app.job_queue)
+    else:
+        print("❌ Reminders are off: install python-telegram-bot[job-queue]")
+    return app
+
+if __name__ == "__main__":
+    if WEBHOOK_URL:
+        # Polling deletes the webhook, so the two would keep undoing each other
+        print("❌ WEBHOOK_URL is set, so updates go to webhook_server.py; unset it to poll with bot.py")
+        sys.exit(1)
+    start_services()
+    app = build_application()
     print("🤖 Srivathsan Healthcare Assistant is now running...")
     app.run_polling()
+    stop_services()
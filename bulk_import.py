@@ -0,0 +1,346 @@
+import argparse
+import calendar
+import csv
+import io
+import json
+import re
+import time
+from datetime import date
+from psycopg2.extras import execute_values
+from db import connection, close_pool
+
+# Streams doctors or historical appointments from CSV / JSONL into Postgres.
+#   python bulk_import.py doctors doctors.csv
+#   python bulk_import.py appointments bookings.jsonl --rejects rejects.jsonl
+# Appointment rows need patient_name, patient_email, doctor_name (or doctor_id),
+# appointment_day, appointment_month and appointment_time, plus ideally
+# appointment_year (without it the next occurrence of that date is assumed,
+# which is right for bookings but not for history). Rows are read one
+# at a time and sent with COPY in batches, so memory stays at one batch no
+# matter how big the file is. Bad rows go to the rejects file with a reason.
+# Monthly partitions for the months a batch covers are created before it is
+# loaded, since history (and far-off bookings) predate the ones kept ready.
+BATCH_SIZE = 50_000
+PROGRESS_EVERY = 5  # seconds
+# Years in the input are local clinic dates
+CLINIC_TIMEZONE = "Europe/London"
+
+# VARCHAR(100) for names, emails and specialties (migrations/0001_baseline.sql)
+MAX_TEXT_LENGTH = 100
+# Same check the bot applies to emails it collects (is_valid_email)
+EMAIL_PATTERN = re.compile(r"[^@]+@[^@]+\.[^@]+")
+
+APPOINTMENT_COLUMNS = (
+    "patient_name", "patient_email", "doctor_id",
+    "appointment_day", "appointment_month", "appointment_time", "starts_at",
+)
+# Columns that identify a row when working out which ones an INSERT skipped
+APPOINTMENT_KEY = APPOINTMENT_COLUMNS[:6]
+DOCTOR_COLUMNS = ("name", "specialty")
+
+
+def read_rows(path):
+    """
+    Yields (line_number, row_dict) from a CSV (with a header) or JSONL file.
+    """
+    with open(path, "r", newline="", encoding="utf-8") as file:
+        if path.endswith((".jsonl", ".ndjson", ".json")):
+            for number, line in enumerate(file, 1):
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except ValueError as e:
+                        yield number, {"_error": f"invalid JSON: {e}", "_raw": line.rstrip("\n")}
+                        continue
+                    if not isinstance(row, dict):
+                        row = {"_error": f"expected a JSON object, got {type(row).__name__}", "_raw": line.rstrip("\n")}
+                    yield number, row
+        else:
+            # Line 1 is the header
+            for number, row in enumerate(csv.DictReader(file), 2):
+                yield number, row
+
+
+def normalize_name(name):
+    return " ".join(name.lower().split())
+
+
+class DoctorMap:
+    """
+    Every doctor, loaded with one query up front: normalized name -> doctor_id.
+    """
+
+    def __init__(self, cur):
+        cur.execute("SELECT doctor_id, name FROM doctorss;")
+        self.by_name = {normalize_name(name): doctor_id for doctor_id, name in cur.fetchall()}
+        self.ids = set(self.by_name.values())
+
+    def __len__(self):
+        return len(self.by_name)
+
+
+def parse_time(value):
+    parts = str(value).strip().split(":")
+    if len(parts) not in (2, 3):
+        raise ValueError(f"bad appointment_time {value!r}")
+    hours, minutes, seconds = (int(p) for p in parts + ["0"] * (3 - len(parts)))
+    if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+        raise ValueError(f"bad appointment_time {value!r}")
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def next_occurrence_year(day, month, today=None):
+    """
+    Year of the next day/month on or after today, like the bot's bookings
+    (infer_appointment_start in the database).
+    """
+    today = today or date.today()
+    for year in range(today.year, today.year + 5):
+        if day <= calendar.monthrange(year, month)[1] and date(year, month, day) >= today:
+            return year
+    raise ValueError(f"no such date {day}/{month}")
+
+
+def checked_text(field, value):
+    if len(value) > MAX_TEXT_LENGTH:
+        raise ValueError(f"{field} longer than {MAX_TEXT_LENGTH} characters")
+    return value
+
+
+def appointment_record(row, doctors):
+    """
+    Validates one input row and returns the tuple to load, or raises
+    ValueError with the reason it was rejected.
+    """
+    if "_error" in row:
+        raise ValueError(row["_error"])
+    name = checked_text("patient_name", (row.get("patient_name") or "").strip())
+    if not name:
+        raise ValueError("missing patient_name")
+    email = checked_text("patient_email", (row.get("patient_email") or "").strip()) or None
+    if email and not EMAIL_PATTERN.match(email):
+        raise ValueError(f"bad patient_email {email!r}")
+    if row.get("doctor_id") not in (None, ""):
+        doctor_id = int(row["doctor_id"])
+        if doctor_id not in doctors.ids:
+            raise ValueError(f"unknown doctor_id {doctor_id}")
+    else:
+        doctor_id = doctors.by_name.get(normalize_name(row.get("doctor_name") or ""))
+        if doctor_id is None:
+            raise ValueError(f"unknown doctor {row.get('doctor_name')!r}")
+    day, month = int(row["appointment_day"]), int(row["appointment_month"])
+    if not 1 <= day <= 31:
+        raise ValueError(f"bad appointment_day {day}")
+    if not 1 <= month <= 12:
+        raise ValueError(f"bad appointment_month {month}")
+    year = row.get("appointment_year")
+    # 2024 is a leap year, so 29/02 passes when no year is given
+    if day > calendar.monthrange(int(year) if year not in (None, "") else 2024, month)[1]:
+        raise ValueError(f"no such date {day}/{month}" + (f"/{year}" if year else ""))
+    time_ = parse_time(row["appointment_time"])
+    # appointmentss is partitioned on starts_at, so every row needs one
+    year = int(year) if year not in (None, "") else next_occurrence_year(day, month)
+    starts_at = f"{year:04d}-{month:02d}-{day:02d} {time_}"
+    return (name, email, doctor_id, day, month, time_, starts_at)
+
+
+def doctor_record(row, doctors):
+    if "_error" in row:
+        raise ValueError(row["_error"])
+    name = checked_text("name", (row.get("name") or "").strip())
+    if not name:
+        raise ValueError("missing name")
+    if normalize_name(name) in doctors.by_name:
+        raise ValueError(f"doctor {name!r} already exists")
+    # Later rows with the same name are duplicates of this one
+    doctors.by_name[normalize_name(name)] = None
+    return (name, checked_text("specialty", (row.get("specialty") or "").strip()) or None)
+
+
+class Rejects:
+    """
+    Rejected rows as JSONL: {"line": ..., "reason": ..., "row": {...}}.
+    The file is only created if something is actually rejected.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def add(self, line, reason, row):
+        if self._file is None:
+            self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write(json.dumps({"line": line, "reason": reason, "row": row}, default=str) + "\n")
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def insert_rows(conn, table, columns, batch):
+    """
+    Last resort for a batch that won't go in as a whole: one INSERT per row,
+    each under a savepoint, so a bad row only rejects itself. Returns the
+    rows that did not go in as (line, reason) pairs.
+    """
+    cur = conn.cursor()
+    insert = (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) ON CONFLICT DO NOTHING;"
+    )
+    failed = []
+    for line, record in batch:
+        cur.execute("SAVEPOINT import_row;")
+        try:
+            cur.execute(insert, record)
+        except Exception as e:
+            cur.execute("ROLLBACK TO SAVEPOINT import_row;")
+            failed.append((line, str(e).strip().splitlines()[0]))
+            continue
+        if cur.rowcount == 0:
+            failed.append((line, "conflicts with an existing row"))
+        cur.execute("RELEASE SAVEPOINT import_row;")
+    conn.commit()
+    return failed
+
+
+def copy_batch(conn, table, columns, key_columns, batch):
+    """
+    Loads a batch with COPY. If COPY fails (typically a slot that is already
+    booked), the batch is retried with INSERT ... ON CONFLICT DO NOTHING and
+    the rows that did not go in are returned as (line, reason) pairs. If
+    that fails too (a row the database refuses for some other reason), the
+    batch goes in row by row (insert_rows).
+    """
+    cur = conn.cursor()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for _, record in batch:
+        writer.writerow(["\\N" if value is None else value for value in record])
+    buffer.seek(0)
+    try:
+        cur.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N');",
+            buffer,
+        )
+        conn.commit()
+        return []
+    except Exception as e:
+        conn.rollback()
+        copy_error = str(e).strip().splitlines()[0]
+
+    try:
+        inserted = execute_values(cur, f"""
+            INSERT INTO {table} ({', '.join(columns)}) VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING {', '.join(key_columns)};
+        """, [record for _, record in batch], page_size=1000, fetch=True)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        return insert_rows(conn, table, columns, batch)
+    remaining = {}
+    for row in inserted:
+        key = tuple(str(value) for value in row)
+        remaining[key] = remaining.get(key, 0) + 1
+    failed = []
+    for line, record in batch:
+        key = tuple(str(value) for value in record[:len(key_columns)])
+        if remaining.get(key):
+            remaining[key] -= 1
+        else:
+            failed.append((line, f"conflicts with an existing row ({copy_error})"))
+    return failed
+
+
+def ensure_batch_partitions(conn, batch):
+    """
+    Creates any missing monthly partitions between the batch's earliest and
+    latest starts_at. Returns how many were created.
+    """
+    # starts_at is "YYYY-MM-DD HH:MM:SS" in clinic time, so strings sort by date
+    starts = [record[-1] for _, record in batch]
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT ensure_appointment_partitions(%s::DATE, %s::DATE, 'appointmentss', %s);",
+        (min(starts)[:10], max(starts)[:10], CLINIC_TIMEZONE),
+    )
+    created = cur.fetchone()[0]
+    conn.commit()
+    return created
+
+
+def run_import(kind, path, rejects_path, batch_size=BATCH_SIZE):
+    if kind == "appointments":
+        table, columns, key_columns, to_record = "appointmentss", APPOINTMENT_COLUMNS, APPOINTMENT_KEY, appointment_record
+        prepare = ensure_batch_partitions
+    else:
+        table, columns, key_columns, to_record = "doctorss", DOCTOR_COLUMNS, DOCTOR_COLUMNS, doctor_record
+        prepare = None
+
+    rejects = Rejects(rejects_path)
+    loaded = 0
+    start = last_report = time.perf_counter()
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SET TIME ZONE %s;", (CLINIC_TIMEZONE,))
+            doctors = DoctorMap(cur)
+            # Commit so a rolled-back batch doesn't undo the SET
+            conn.commit()
+            print(f"📋 {len(doctors)} doctors known")
+            # Original rows for the current batch, kept only so rejects can show them
+            batch, originals = [], {}
+            for line, row in read_rows(path):
+                try:
+                    batch.append((line, to_record(row, doctors)))
+                    originals[line] = row
+                except KeyError as e:
+                    rejects.add(line, f"missing {e}", row)
+                except (ValueError, TypeError) as e:
+                    rejects.add(line, str(e), row)
+                if len(batch) >= batch_size:
+                    loaded += flush(conn, table, columns, key_columns, batch, originals, rejects, prepare)
+                    batch, originals = [], {}
+                    now = time.perf_counter()
+                    if now - last_report >= PROGRESS_EVERY:
+                        last_report = now
+                        print(f"⏳ {loaded:,} rows loaded, {rejects.count:,} rejected, "
+                              f"{loaded / (now - start):,.0f} rows/s")
+            if batch:
+                loaded += flush(conn, table, columns, key_columns, batch, originals, rejects, prepare)
+    finally:
+        rejects.close()
+        close_pool()
+    elapsed = time.perf_counter() - start
+    print(f"✅ Loaded {loaded:,} {kind} in {elapsed:.1f}s ({loaded / elapsed if elapsed else 0:,.0f} rows/s)")
+    if rejects.count:
+        print(f"❌ {rejects.count:,} rows rejected; see {rejects_path}")
+    return loaded, rejects.count
+
+
+def flush(conn, table, columns, key_columns, batch, originals, rejects, prepare=None):
+    if prepare is not None:
+        created = prepare(conn, batch)
+        if created:
+            print(f"✅ Created {created} appointment partitions")
+    failed = copy_batch(conn, table, columns, key_columns, batch)
+    for line, reason in failed:
+        rejects.add(line, reason, originals[line])
+    return len(batch) - len(failed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("kind", choices=["doctors", "appointments"])
+    parser.add_argument("path", help="CSV or JSONL file")
+    parser.add_argument("--rejects", help="where rejected rows go (default: <path>.rejects.jsonl)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    try:
+        run_import(args.kind, args.path, args.rejects or args.path + ".rejects.jsonl", args.batch_size)
+    except Exception as e:
+        print("❌ Import failed:")
+        print(e)
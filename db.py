@@ -0,0 +1,134 @@
+import os
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from psycopg2 import pool
+from dotenv import load_dotenv
+
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 10))
+# Connections idle for longer than this (seconds) get a "SELECT 1" before reuse
+DB_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_HEALTH_CHECK_INTERVAL", 30))
+
+# -----------------------------------------------------------------------------
+# Shared connection pool
+#   psycopg2's ThreadedConnectionPool raises when it runs dry, so a semaphore
+#   sized to the pool makes callers wait for a free connection instead.
+# -----------------------------------------------------------------------------
+_pool = None
+_slots = None
+_last_used = {}
+_lock = threading.Lock()
+
+
+def init_pool(minconn=None, maxconn=None, dsn=None):
+    """
+    Creates the shared pool (once). The first `minconn` connections are opened
+    immediately, so calling this at startup warms the pool.
+    """
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            minconn = DB_POOL_MIN if minconn is None else minconn
+            maxconn = DB_POOL_MAX if maxconn is None else maxconn
+            _pool = pool.ThreadedConnectionPool(minconn, maxconn, dsn or DATABASE_URL)
+            _slots = threading.BoundedSemaphore(maxconn)
+    return _pool
+
+
+def close_pool():
+    """
+    Closes every pooled connection. Safe to call more than once.
+    """
+    global _pool, _slots
+    with _lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = None
+        _slots = None
+        _last_used.clear()
+
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < DB_HEALTH_CHECK_INTERVAL:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1;")
+        cur.fetchone()
+        cur.close()
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def _checkout(p):
+    conn = p.getconn()
+    if not _is_healthy(conn):
+        # Drop the dead connection and let the pool open a fresh one
+        _last_used.pop(id(conn), None)
+        p.putconn(conn, close=True)
+        conn = p.getconn()
+    return conn
+
+
+@contextmanager
+def connection():
+    """
+    Borrows a connection from the pool and hands it back afterwards.
+    Callers commit their own writes; anything left uncommitted is rolled back
+    when the connection is returned.
+    """
+    p = init_pool()
+    slots = _slots
+    slots.acquire()
+    conn = None
+    try:
+        conn = _checkout(p)
+        yield conn
+    finally:
+        if conn is not None:
+            _last_used[id(conn)] = time.monotonic()
+            p.putconn(conn, close=bool(conn.closed))
+        slots.release()
+
+
+def warm_pool():
+    """
+    Opens the minimum number of connections and verifies the DB answers.
+    Returns True when the database is reachable.
+    """
+    try:
+        init_pool()
+        return health_check()
+    except Exception as e:
+        print("❌ DB Pool Warmup Error:", e)
+        return False
+
+
+def health_check():
+    """
+    Runs a trivial query on a pooled connection.
+    """
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT 1;")
+            return cur.fetchone()[0] == 1
+    except Exception as e:
+        print("❌ DB Health Check Error:", e)
+        return False
+
+
+async def run(func, *args, **kwargs):
+    """
+    Runs a blocking DB helper in a worker thread so the bot's event loop
+    keeps serving other chats while Postgres answers.
+    """
+    return await asyncio.to_thread(func, *args, **kwargs)
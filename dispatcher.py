@@ -0,0 +1,55 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+# How many updates the bot works on at once, across all chats
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 16))
+# How many updates the application takes off its queue at once, counting the
+# ones waiting behind an earlier update from the same chat. Those don't hold
+# one of the UPDATE_CONCURRENCY slots, so this only needs to be large.
+UPDATE_BACKLOG = int(os.getenv("UPDATE_BACKLOG", 4096))
+
+
+class ChatSerializer:
+    """
+    Per-chat locks so updates from different chats run concurrently while
+    updates from the same chat are handled one at a time, in arrival order
+    (asyncio.Lock wakes waiters first-in, first-out).
+
+    Each lock's waiters are that chat's queue. An update only takes one of
+    the `concurrency` worker slots once it is at the head of its queue, so
+    a chat with a pile of messages uses one slot and never makes other
+    chats wait behind it.
+
+    A chat's lock only exists while an update for it is running or waiting;
+    the last one out removes it, so idle chats cost nothing.
+    """
+
+    def __init__(self, concurrency=UPDATE_CONCURRENCY):
+        self._locks = {}
+        self._slots = asyncio.Semaphore(concurrency)
+
+    @asynccontextmanager
+    async def hold(self, chat_id):
+        entry = self._locks.get(chat_id)
+        if entry is None:
+            entry = self._locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[chat_id]
+
+    def active_chats(self):
+        """
+        Number of chats with an update running or queued.
+        """
+        return len(self._locks)
+
+
+chat_locks = ChatSerializer()
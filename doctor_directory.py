@@ -0,0 +1,170 @@
+import os
+import select
+import threading
+import time
+import psycopg2
+import db
+import metrics
+from metrics import track
+from name_index import NameIndex
+
+# Seconds before the cached directory is considered stale
+DOCTOR_CACHE_TTL = float(os.getenv("DOCTOR_CACHE_TTL", 300))
+# Channel fired by the doctorss trigger (migrations/0001_baseline.sql)
+DOCTORS_CHANNEL = "doctorss_changed"
+
+
+def fetch_doctors():
+    """
+    Retrieves the list of doctors from the 'doctorss' table:
+      (doctor_id, name, specialty)
+    """
+    with db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT doctor_id, name, specialty FROM doctorss;")
+        return cur.fetchall()
+
+
+def build_snapshot(doctors):
+    """
+    Precomputes everything the bot needs from the doctor list, so a message
+    never has to re-tokenize names or re-render the list.
+    """
+    by_specialty = {}
+    for doc_id, name, specialty in doctors:
+        by_specialty.setdefault((specialty or "").lower(), []).append((doc_id, name))
+    if doctors:
+        list_text = "\n".join(f"- {name} ({specialty})" for _, name, specialty in doctors)
+    else:
+        list_text = "No doctors are available at the moment."
+    return {
+        "doctors": list(doctors),
+        "name_index": NameIndex(doctors),
+        "by_specialty": by_specialty,
+        "list_text": list_text,
+    }
+
+
+class DoctorDirectory:
+    """
+    In-process cache of the doctor directory.
+
+    Reads are served from an immutable snapshot. Once the TTL expires (or a
+    NOTIFY arrives) the stale snapshot keeps being served while a background
+    thread reloads it, so only the very first load ever waits on Postgres.
+    """
+
+    def __init__(self, loader=fetch_doctors, ttl=DOCTOR_CACHE_TTL):
+        self._loader = loader
+        self.ttl = ttl
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._listener = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def refresh(self):
+        """
+        Reloads the directory from the DB. On failure the previous snapshot
+        is kept and False is returned.
+        """
+        try:
+            with track("db_fetch_doctors"):
+                doctors = self._loader()
+            snapshot = build_snapshot(doctors)
+        except Exception as e:
+            print("❌ DB Doctors Fetch Error:", e)
+            return False
+        self._snapshot = snapshot
+        self._loaded_at = time.monotonic()
+        self.refreshes += 1
+        metrics.doctor_cache_refreshes.inc()
+        return True
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def worker():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.misses += 1
+            metrics.doctor_cache.inc("miss")
+            if not self.refresh():
+                return build_snapshot([])
+            return self._snapshot
+        if time.monotonic() - self._loaded_at > self.ttl:
+            self.misses += 1
+            metrics.doctor_cache.inc("miss")
+            self._refresh_in_background()
+        else:
+            self.hits += 1
+            metrics.doctor_cache.inc("hit")
+        return snapshot
+
+    def invalidate(self):
+        """
+        Marks the cached directory stale; the next read triggers a reload.
+        """
+        self._loaded_at = 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "doctors": len(self._snapshot["doctors"]) if self._snapshot else 0,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._snapshot else None,
+        }
+
+    def listen_for_changes(self, dsn=None):
+        """
+        Starts a daemon thread that LISTENs on DOCTORS_CHANNEL and invalidates
+        the cache whenever the doctorss table changes. Uses its own connection
+        because a listening session can't go back into the pool.
+        """
+        if self._listener is not None:
+            return self._listener
+
+        def worker():
+            while True:
+                conn = None
+                try:
+                    conn = psycopg2.connect(dsn or db.DATABASE_URL)
+                    conn.autocommit = True
+                    cur = conn.cursor()
+                    cur.execute(f"LISTEN {DOCTORS_CHANNEL};")
+                    # Anything may have changed while we were disconnected
+                    self.invalidate()
+                    while True:
+                        if select.select([conn], [], [], 60) == ([], [], []):
+                            continue
+                        conn.poll()
+                        if conn.notifies:
+                            conn.notifies.clear()
+                            self.invalidate()
+                except Exception as e:
+                    print("❌ Doctor Directory Listener Error:", e)
+                    if conn is not None:
+                        conn.close()
+                    time.sleep(5)
+
+        self._listener = threading.Thread(target=worker, daemon=True)
+        self._listener.start()
+        return self._listener
+
+
+directory = DoctorDirectory()
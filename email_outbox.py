@@ -0,0 +1,263 @@
+import os
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+from dotenv import load_dotenv
+import db
+from metrics import track
+
+load_dotenv()
+EMAIL_HOST = os.getenv("EMAIL_HOST")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
+EMAIL_USER = os.getenv("EMAIL_USER")
+EMAIL_PASS = os.getenv("EMAIL_PASS")
+EMAIL_STARTTLS = os.getenv("EMAIL_STARTTLS", "true").lower() == "true"
+# Emails claimed and sent per pass over the queue
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 5))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 6))
+# Seconds before the first retry; doubles with each failed attempt
+OUTBOX_RETRY_BACKOFF = float(os.getenv("OUTBOX_RETRY_BACKOFF", 30))
+# Seconds a claimed batch stays hidden from other workers; a worker that dies
+# mid-batch leaves its unsent rows to be picked up again once this expires
+OUTBOX_CLAIM_LEASE = float(os.getenv("OUTBOX_CLAIM_LEASE", 900))
+# Send NOOP before reusing an SMTP session idle for longer than this
+SMTP_IDLE_CHECK = float(os.getenv("SMTP_IDLE_CHECK", 60))
+
+
+def confirmation_email(name, doctor, day, month, time_):
+    """
+    Returns (subject, body) for a booking confirmation.
+    """
+    subject = "Appointment Confirmation - Srivathsan Healthcare"
+    body = f"""
+Hi {name},
+
+Your appointment with {doctor} is confirmed for {day}/{month} at {time_}.
+
+Thank you for choosing Srivathsan Healthcare!
+    """
+    return subject, body
+
+
+def reminder_email(name, doctor, starts_at):
+    """
+    Returns (subject, body) for an upcoming-appointment reminder.
+    """
+    subject = "Appointment Reminder - Srivathsan Healthcare"
+    body = f"""
+Hi {name},
+
+This is a reminder of your appointment with {doctor} on {starts_at:%A %d %B} at {starts_at:%H:%M}.
+
+If you can no longer make it, please let us know so we can offer the slot to someone else.
+
+Srivathsan Healthcare
+    """
+    return subject, body
+
+
+def enqueue_email(recipient, subject, body):
+    """
+    Persists an email to the outbox table and wakes the worker.
+    Returns the outbox row id.
+    """
+    with db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO email_outbox (recipient, subject, body)
+            VALUES (%s, %s, %s)
+            RETURNING email_id;
+        """, (recipient, subject, body))
+        email_id = cur.fetchone()[0]
+        conn.commit()
+    outbox.wake()
+    return email_id
+
+
+class SmtpSession:
+    """
+    Long-lived SMTP connection that is opened lazily, probed with NOOP when it
+    has been idle for a while, and reopened if the server dropped it.
+    """
+
+    def __init__(self, host=None, port=None, user=None, password=None, starttls=None):
+        self.host = host or EMAIL_HOST
+        self.port = port or EMAIL_PORT
+        self.user = EMAIL_USER if user is None else user
+        self.password = EMAIL_PASS if password is None else password
+        self.starttls = EMAIL_STARTTLS if starttls is None else starttls
+        self._server = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        self._server = server
+
+    def _ensure_connected(self):
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_CHECK:
+            try:
+                if self._server.noop()[0] != 250:
+                    self.close()
+            except smtplib.SMTPException:
+                self.close()
+        if self._server is None:
+            self._connect()
+
+    def send(self, recipient, subject, body):
+        msg = MIMEText(body)
+        msg["Subject"] = subject
+        msg["From"] = self.user
+        msg["To"] = recipient
+        try:
+            self._ensure_connected()
+            self._server.sendmail(self.user, [recipient], msg.as_string())
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # Stale session: reconnect once and retry
+            self.close()
+            self._connect()
+            self._server.sendmail(self.user, [recipient], msg.as_string())
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+        self._server = None
+
+
+class OutboxWorker:
+    """
+    Background thread that drains email_outbox in batches over one reused
+    SMTP session. Rows are claimed with SKIP LOCKED so several bot processes
+    can run a worker each; failures are retried with exponential backoff
+    until OUTBOX_MAX_ATTEMPTS, then marked 'failed'.
+    """
+
+    def __init__(self, session=None, batch_size=OUTBOX_BATCH_SIZE, poll_interval=OUTBOX_POLL_INTERVAL):
+        self.session = session or SmtpSession()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.sent = 0
+        self.failed = 0
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.session.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.drain_once()
+            except Exception as e:
+                print("❌ Email Outbox Error:", e)
+                processed = 0
+            if processed < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def drain_once(self):
+        """
+        Claims one batch, sends it, then records each outcome. Returns how many
+        emails were processed.
+        """
+        batch = self._claim()
+        for email_id, recipient, subject, body, attempts in batch:
+            try:
+                with track("smtp_send"):
+                    self.session.send(recipient, subject, body)
+            except Exception as e:
+                print("❌ Email Sending Error:", e)
+                self.session.close()
+                if self._mark_failed(email_id, attempts, e):
+                    self.failed += 1
+                continue
+            self._mark_sent(email_id)
+            self.sent += 1
+        return len(batch)
+
+    def _claim(self):
+        # Counts the attempt and pushes next_attempt_at out by the lease in one
+        # short transaction, so no row lock is held while SMTP is talking
+        with db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE email_outbox
+                SET attempts = attempts + 1,
+                    next_attempt_at = now() + make_interval(secs => %s)
+                WHERE email_id IN (
+                    SELECT email_id
+                    FROM email_outbox
+                    WHERE status = 'pending' AND next_attempt_at <= now()
+                    ORDER BY next_attempt_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING email_id, recipient, subject, body, attempts;
+            """, (OUTBOX_CLAIM_LEASE, self.batch_size))
+            batch = cur.fetchall()
+            conn.commit()
+        return batch
+
+    def _mark_sent(self, email_id):
+        with db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE email_outbox
+                SET status = 'sent', sent_at = now()
+                WHERE email_id = %s;
+            """, (email_id,))
+            conn.commit()
+
+    def _mark_failed(self, email_id, attempts, error):
+        """
+        Schedules a retry, or gives up after OUTBOX_MAX_ATTEMPTS. `attempts`
+        already counts the failed one. Returns True if the email was given up on.
+        """
+        status, delay = retry_schedule(attempts)
+        with db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE email_outbox
+                SET status = %s,
+                    last_error = %s,
+                    next_attempt_at = now() + make_interval(secs => %s)
+                WHERE email_id = %s;
+            """, (status, str(error)[:500], delay, email_id))
+            conn.commit()
+        return status == "failed"
+
+
+def retry_schedule(attempts):
+    """
+    Returns (status, delay_seconds) for an email that has now failed `attempts` times.
+    """
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        return "failed", 0
+    return "pending", OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1)
+
+
+outbox = OutboxWorker()
@@ -0,0 +1,190 @@
+import os
+import asyncio
+import random
+import google.generativeai as genai
+from dotenv import load_dotenv
+import metrics
+from metrics import track
+from prompt_builder import SYSTEM_INSTRUCTION, content_tokens, estimate_tokens
+
+load_dotenv()
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-2.0-flash")
+# At most this many Gemini calls in flight; the rest wait their turn
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 4))
+# Seconds a single attempt may take before we give up on it
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", 15))
+GEMINI_RETRIES = int(os.getenv("GEMINI_RETRIES", 2))
+GEMINI_BACKOFF = float(os.getenv("GEMINI_BACKOFF", 0.5))
+
+EMPTY_REPLY = "I'm sorry, I didn't catch that."
+FALLBACK_REPLY = "I’m here to help, but something went wrong. Could you please rephrase that?"
+
+
+def chunk_text(chunk):
+    """
+    A streamed chunk's text; the SDK raises instead of returning "" for
+    chunks without any (e.g. the final one carrying only usage metadata).
+    """
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+class GeminiGateway:
+    """
+    Single entry point for Gemini calls.
+
+    The model object is created once and reused. Calls never block the event
+    loop: the SDK's async API is used when the client has one, otherwise the
+    blocking call runs in a worker thread. A semaphore caps concurrent calls,
+    each attempt has a timeout, failures are retried with jittered backoff,
+    and if every attempt fails the caller gets FALLBACK_REPLY.
+
+    The system instruction is set on the model once, so each call only
+    carries the conversation (a prompt string or role-tagged contents).
+    Prompt and reply tokens of every successful call are recorded, from the
+    response's usage metadata when it has one.
+
+    `client` can be any object with generate_content() or
+    generate_content_async() returning something with a `.text`, which is how
+    tests plug in a fake.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        model_name=GEMINI_MODEL,
+        system_instruction=SYSTEM_INSTRUCTION,
+        max_concurrency=GEMINI_MAX_CONCURRENCY,
+        timeout=GEMINI_TIMEOUT,
+        retries=GEMINI_RETRIES,
+        backoff=GEMINI_BACKOFF,
+    ):
+        self._client = client
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.calls = 0
+        self.failures = 0
+        self.fallbacks = 0
+        self.prompt_tokens = 0
+        self.reply_tokens = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = genai.GenerativeModel(self.model_name, system_instruction=self.system_instruction)
+        return self._client
+
+    def saturated(self):
+        """
+        True if a new call would have to wait for one in flight to finish.
+        """
+        return self._semaphore.locked()
+
+    async def _call(self, prompt):
+        client = self.client
+        if hasattr(client, "generate_content_async"):
+            response = await client.generate_content_async(prompt)
+        else:
+            response = await asyncio.to_thread(client.generate_content, prompt)
+        text = response.text.strip() if response.text else EMPTY_REPLY
+        self._record_tokens(prompt, text, getattr(response, "usage_metadata", None))
+        return text
+
+    def _record_tokens(self, prompt, text, usage):
+        prompt_tokens = getattr(usage, "prompt_token_count", None) or content_tokens(prompt)
+        reply_tokens = getattr(usage, "candidates_token_count", None) or estimate_tokens(text)
+        self.prompt_tokens += prompt_tokens
+        self.reply_tokens += reply_tokens
+        metrics.gemini_tokens.observe(prompt_tokens, "prompt")
+        metrics.gemini_tokens.observe(reply_tokens, "reply")
+
+    async def generate(self, prompt):
+        """
+        Returns Gemini's reply to `prompt` (a string or PromptBuilder contents), or FALLBACK_REPLY if it could not
+        be produced within the retry budget.
+        """
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                self.calls += 1
+                try:
+                    with track("gemini_call"):
+                        return await asyncio.wait_for(self._call(prompt), self.timeout)
+                except Exception as e:
+                    self.failures += 1
+                    print(f"❌ Gemini response error (attempt {attempt + 1}):", repr(e))
+                    if attempt < self.retries:
+                        # Full jitter so retries from many chats don't line up
+                        await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        self.fallbacks += 1
+        return FALLBACK_REPLY
+
+    async def _open_stream(self, prompt):
+        """
+        Starts a streamed generation and returns an async function giving the
+        next chunk (StopAsyncIteration at the end).
+        """
+        client = self.client
+        if hasattr(client, "generate_content_async"):
+            response = await client.generate_content_async(prompt, stream=True)
+            return response.__aiter__().__anext__
+        response = await asyncio.to_thread(client.generate_content, prompt, stream=True)
+        chunks = iter(response)
+
+        async def next_chunk():
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                raise StopAsyncIteration
+            return chunk
+        return next_chunk
+
+    async def stream(self, prompt):
+        """
+        Yields Gemini's reply to `prompt` piece by piece as it is generated.
+
+        Same concurrency cap, timeouts (to the first chunk and between
+        chunks) and retries as generate(), except that nothing is retried
+        once text has been yielded: the reply just ends there. If nothing
+        could be produced, FALLBACK_REPLY is yielded instead.
+        """
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                self.calls += 1
+                parts, last = [], None
+                try:
+                    with track("gemini_call"):
+                        next_chunk = await asyncio.wait_for(self._open_stream(prompt), self.timeout)
+                        while True:
+                            try:
+                                last = await asyncio.wait_for(next_chunk(), self.timeout)
+                            except StopAsyncIteration:
+                                break
+                            text = chunk_text(last)
+                            if text:
+                                parts.append(text)
+                                yield text
+                except Exception as e:
+                    self.failures += 1
+                    print(f"❌ Gemini stream error (attempt {attempt + 1}):", repr(e))
+                    if parts:
+                        return
+                    if attempt < self.retries:
+                        await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+                    continue
+                if not parts:
+                    yield EMPTY_REPLY
+                self._record_tokens(prompt, "".join(parts) or EMPTY_REPLY, getattr(last, "usage_metadata", None))
+                return
+        self.fallbacks += 1
+        yield FALLBACK_REPLY
+
+    def stats(self):
+        return {
+            "calls": self.calls, "failures": self.failures, "fallbacks": self.fallbacks,
+            "prompt_tokens": self.prompt_tokens, "reply_tokens": self.reply_tokens,
+        }
@@ -0,0 +1,87 @@
+import json
+import re
+
+BOOKING_KEYWORDS = ["book", "booking", "appointment", "consultation", "schedule"]
+GREETINGS = ["hi", "hello", "hey", "good morning", "good afternoon", "good evening"]
+# Endings a keyword or symptom may carry ("coughing", "feverish", "booked",
+# "scheduling"); a final "e" is optional so "schedule" takes them too.
+# Greetings only match whole, or "hi" would match "his".
+INFLECTIONS = r"(?:e|es|s|d|ed|ing|ish|y)?"
+
+
+def load_symptom_map(path):
+    """
+    Loads extra symptoms from a JSON file shaped like SYMPTOM_MAP:
+      {"migraine": "neurologist", "palpitations": ["cardiologist", 2]}
+    """
+    with open(path, "r") as file:
+        raw = json.load(file)
+    return {symptom.lower(): tuple(value) if isinstance(value, list) else value for symptom, value in raw.items()}
+
+
+def alternation(phrases):
+    # (?!) never matches, for an empty list
+    return "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True)) or "(?!)"
+
+
+class IntentMatcher:
+    """
+    Matches booking keywords, greetings and every known symptom with one
+    compiled regex, so a message is scanned once no matter how large the
+    symptom vocabulary grows. Keywords and symptoms also match their
+    common inflections (INFLECTIONS).
+
+    symptom_map values are either a specialty name or a (specialty, weight)
+    pair; weights let a strong signal like "chest pain" outrank "cough".
+    """
+
+    def __init__(self, symptom_map, booking_keywords=BOOKING_KEYWORDS, greetings=GREETINGS):
+        self.phrases = {}
+        for keyword in booking_keywords:
+            self.phrases[keyword.lower()] = ("booking", None, 0)
+        for greeting in greetings:
+            self.phrases.setdefault(greeting.lower(), ("greeting", None, 0))
+        for symptom, value in symptom_map.items():
+            specialty, weight = value if isinstance(value, tuple) else (value, 1)
+            self.phrases[symptom.lower()] = ("symptom", specialty, weight)
+        # Stem (the phrase less any final "e") -> phrase, for everything but greetings
+        self.stems = {}
+        for phrase, (kind, _, _) in self.phrases.items():
+            if kind != "greeting":
+                self.stems.setdefault(phrase[:-1] if phrase.endswith("e") else phrase, phrase)
+        greetings = [p for p, (kind, _, _) in self.phrases.items() if kind == "greeting"]
+        # Longest phrases first so "chest pain" wins over a shorter overlapping entry
+        self.pattern = re.compile(
+            r"\b(?:(" + alternation(self.stems) + r")" + INFLECTIONS
+            + r"|(" + alternation(greetings) + r"))\b",
+            re.IGNORECASE,
+        )
+
+    def match(self, text: str):
+        """
+        Returns everything found in `text`:
+          {"booking": bool, "greeting": bool, "symptoms": [...],
+           "specialty_scores": {specialty: score}, "specialty": best or None}
+        """
+        result = {
+            "booking": False,
+            "greeting": False,
+            "symptoms": [],
+            "specialty_scores": {},
+            "specialty": None,
+        }
+        scores = result["specialty_scores"]
+        for hit in self.pattern.finditer(text):
+            phrase = self.stems[hit.group(1).lower()] if hit.group(1) else hit.group(2).lower()
+            kind, specialty, weight = self.phrases[phrase]
+            if kind == "booking":
+                result["booking"] = True
+            elif kind == "greeting":
+                result["greeting"] = True
+            else:
+                result["symptoms"].append(phrase)
+                scores[specialty] = scores.get(specialty, 0) + weight
+        if scores:
+            # Highest score wins; ties go to whichever specialty was mentioned first
+            result["specialty"] = max(scores, key=scores.get)
+        return result
@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from telegram import Chat, Message, Update
+
+import bot
+import db
+import tracing
+from availability import availability
+from doctor_directory import directory
+from gemini_client import GeminiGateway
+from response_cache import ResponseCache
+
+# Drives bot.handle_message with synthetic users, without Telegram, Gemini,
+# SMTP or (optionally) Postgres, and reports per-turn latency by state.
+#   python loadtest.py --users 200 --duration 30 --gemini-latency 0.8
+#   python loadtest.py --database-url postgresql://localhost/bot_loadtest
+RESULTS_FILE = "loadtest_results.jsonl"
+# Share of users running each scenario
+DEFAULT_MIX = {"booking": 0.3, "symptom": 0.2, "greeting": 0.2, "chat": 0.3}
+# p95 growth (vs the previous comparable run) that gets flagged
+REGRESSION_THRESHOLD = 0.2
+
+DOCTORS = [
+    (1, "Dr. Srivathsan", "General Practitioner"),
+    (2, "Dr. Suresh", "Cardiologist"),
+]
+SYMPTOM_MESSAGES = ["I have a fever", "my chest pain is back", "bad cough since monday", "I think I have the flu"]
+GREETING_MESSAGES = ["hi", "hello", "hey there", "good morning"]
+CHAT_MESSAGES = [
+    "what are your opening hours?",
+    "what do you do?",
+    "thanks!",
+    "do you take walk-ins",
+    "is there parking near the clinic",
+    "how long does a consultation usually take",
+]
+
+
+# -----------------------------------------------------------------------------
+# Stand-ins for the external services
+# -----------------------------------------------------------------------------
+class FakeBot:
+    """
+    Records what the bot sends and waits `latency` seconds per call, like
+    a Telegram round trip.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = 0
+        self.edits = 0
+        self.last_text = {}
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        self.last_text[chat_id] = text
+        return FakeMessage(self.sent)
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.edits += 1
+        self.last_text[chat_id] = text
+
+    async def send_chat_action(self, chat_id, action, **kwargs):
+        await asyncio.sleep(self.latency)
+
+
+class FakeMessage:
+    def __init__(self, message_id):
+        self.message_id = message_id
+
+
+class FakeContext:
+    def __init__(self, fake_bot):
+        self.bot = fake_bot
+
+
+class FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGemini:
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def generate_content_async(self, prompt, stream=False):
+        latency = self.latency * random.uniform(0.5, 1.5)
+        text = "Happy to help! If you'd like to book, just say the word appointment."
+        if stream:
+            # First chunk after a quarter of the latency, the rest spread over the remainder
+            await asyncio.sleep(latency / 4)
+            return self._chunks(text.split(" "), latency * 3 / 4)
+        await asyncio.sleep(latency)
+        return FakeGeminiResponse(text)
+
+    async def _chunks(self, words, latency):
+        for index in range(0, len(words), 4):
+            if index:
+                await asyncio.sleep(latency / (len(words) / 4))
+            yield FakeGeminiResponse(" ".join(words[index:index + 4]) + " ")
+
+
+def install_stand_ins(db_latency, smtp_latency):
+    """
+    Replaces the Postgres- and SMTP-backed helpers with in-memory versions
+    that sleep like the real thing would block.
+    """
+    booked = set()
+    lock = threading.Lock()
+
+    def load_doctors():
+        time.sleep(db_latency)
+        return DOCTORS
+
+    def load_booked_times(doctor_id, day, month):
+        time.sleep(db_latency)
+        with lock:
+            return [t for (d, dd, mm, t) in booked if (d, dd, mm) == (doctor_id, day, month)]
+
+    def create_appointment(data, chat_id=None):
+        time.sleep(db_latency)
+        slot = (data.doctor_id, data.appointment_day, data.appointment_month, data.appointment_time)
+        with lock:
+            taken = slot in booked
+            booked.add(slot)
+        availability.mark_booked(*slot)
+        if taken:
+            return {"status": "conflict", "alternatives": availability.suggest(*slot)}
+        return {"status": "booked", "appointment_id": len(booked)}
+
+    def enqueue_email(recipient, subject, body):
+        time.sleep(smtp_latency)
+        return 1
+
+    directory._loader = load_doctors
+    directory.invalidate()
+    availability._loader = load_booked_times
+    bot.create_appointment = create_appointment
+    bot.enqueue_email = enqueue_email
+
+
+# -----------------------------------------------------------------------------
+# Synthetic users
+# -----------------------------------------------------------------------------
+def make_update(update_id, chat_id, text):
+    chat = Chat(id=chat_id, type=Chat.PRIVATE)
+    message = Message(message_id=update_id, date=datetime.now(timezone.utc), chat=chat, text=text)
+    return Update(update_id=update_id, message=message)
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.turns = 0
+        self.errors = 0
+        self._update_id = 0
+
+    async def turn(self, chat_id, text, context):
+        """
+        Sends one message through handle_message and records its latency under
+        the state the chat was in when the message arrived.
+        """
+        state = bot.sessions.get(chat_id).state
+        if state == "idle":
+            kind = bot.message_matcher.match(text)
+            state = "idle:booking" if kind["booking"] else "idle:symptom" if kind["specialty"] else "idle:greeting" if kind["greeting"] else "idle:chat"
+        self._update_id += 1
+        start = time.perf_counter()
+        try:
+            await bot.handle_message(make_update(self._update_id, chat_id, text), context)
+        except Exception as e:
+            self.errors += 1
+            print("❌ Turn error:", e)
+        self.samples.setdefault(state, []).append(time.perf_counter() - start)
+        self.turns += 1
+
+
+async def booking_flow(recorder, chat_id, context):
+    steps = [
+        "I'd like to book an appointment",
+        random.choice(["Srivathsan", "Suresh", "Dr Srivatsan"]),
+        str(random.randint(1, 28)),
+        str(random.randint(1, 12)),
+    ]
+    for text in steps:
+        await recorder.turn(chat_id, text, context)
+    for _ in range(5):
+        await recorder.turn(chat_id, f"{random.randint(9, 16):02d}:{random.choice(['00', '30'])}:00", context)
+        if bot.sessions.get(chat_id).state != "select_time":
+            break
+    await recorder.turn(chat_id, "Load Tester", context)
+    await recorder.turn(chat_id, f"load{chat_id}@example.com", context)
+    # A booking conflict at the last step sends the user back to pick a time
+    for _ in range(5):
+        if bot.sessions.get(chat_id).state != "select_time":
+            break
+        await recorder.turn(chat_id, f"{random.randint(9, 16):02d}:{random.choice(['00', '30'])}:00", context)
+
+
+async def run_user(recorder, chat_id, scenario, context, deadline, think_time):
+    while time.perf_counter() < deadline:
+        if scenario == "booking":
+            await booking_flow(recorder, chat_id, context)
+        elif scenario == "symptom":
+            await recorder.turn(chat_id, random.choice(SYMPTOM_MESSAGES), context)
+        elif scenario == "greeting":
+            await recorder.turn(chat_id, random.choice(GREETING_MESSAGES), context)
+        else:
+            await recorder.turn(chat_id, random.choice(CHAT_MESSAGES), context)
+        await asyncio.sleep(random.uniform(0, think_time))
+
+
+# -----------------------------------------------------------------------------
+# Reporting
+# -----------------------------------------------------------------------------
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples):
+    summary = {}
+    for state, values in sorted(samples.items()):
+        ordered = sorted(values)
+        summary[state] = {
+            "count": len(ordered),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        }
+    return summary
+
+
+def previous_run(config, path=RESULTS_FILE):
+    try:
+        with open(path, "r") as file:
+            runs = [json.loads(line) for line in file if line.strip()]
+    except FileNotFoundError:
+        return None
+    comparable = [run for run in runs if run["config"] == config]
+    return comparable[-1] if comparable else None
+
+
+def report(result, baseline):
+    print(f"📊 {result['turns']} turns in {result['elapsed_s']}s -> {result['turns_per_s']} turns/s "
+          f"({result['errors']} errors)\n")
+    print(f"{'state':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for state, stats in result["states"].items():
+        line = f"{state:<16}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+        before = baseline["states"].get(state) if baseline else None
+        if before and before["p95_ms"] > 0:
+            change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+            flag = "  ⚠️ regression" if change > REGRESSION_THRESHOLD else ""
+            line += f"   p95 {change:+.0%} vs {baseline['timestamp']}{flag}"
+        print(line)
+    if "llm_requests" in result:
+        print("\n🤖 LLM turns: " + ", ".join(f"{k} {v}" for k, v in result["llm_requests"].items()))
+
+
+async def main(args):
+    random.seed(args.seed)
+    if not args.database_url:
+        install_stand_ins(args.db_latency, args.smtp_latency)
+    else:
+        db.init_pool(dsn=args.database_url)
+        db.warm_pool()
+        bot.enqueue_email = lambda *a: 1
+    bot.gemini = GeminiGateway(client=FakeGemini(args.gemini_latency))
+    bot.response_cache = ResponseCache(path=None)
+    context = FakeContext(FakeBot(args.telegram_latency))
+
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+    scenarios = random.choices(list(mix), weights=list(mix.values()), k=args.users)
+    recorder = Recorder()
+    # Spans land in TRACE_FILE, so slow turns can be inspected with trace_report.py
+    tracing.exporter.start()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(
+        run_user(recorder, 500000 + i, scenario, context, deadline, args.think_time)
+        for i, scenario in enumerate(scenarios)
+    ))
+    # Replies are delivered from the send queue after the turn returns
+    await bot.outbound.join()
+    elapsed = time.perf_counter() - start
+    tracing.exporter.stop()
+
+    config = {
+        "users": args.users, "duration": args.duration, "mix": mix,
+        "db": "postgres" if args.database_url else "stand-in",
+        "latency": {
+            "db": args.db_latency, "gemini": args.gemini_latency,
+            "smtp": args.smtp_latency, "telegram": args.telegram_latency,
+        },
+    }
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": config,
+        "turns": recorder.turns,
+        "errors": recorder.errors,
+        "elapsed_s": round(elapsed, 2),
+        "turns_per_s": round(recorder.turns / elapsed, 1),
+        "states": summarize(recorder.samples),
+        # Calls and prompt/reply tokens, to see what history trimming saves
+        "gemini": bot.gemini.stats(),
+        # LLM turns admitted / shed (rate_limited, overloaded) by admission control
+        "llm_requests": {
+            outcome: bot.metrics.llm_requests.value(outcome)
+            for outcome in ("admitted", "queued", "rate_limited", "overloaded")
+        },
+    }
+    report(result, previous_run(config, args.results))
+    with open(args.results, "a") as file:
+        file.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--think-time", type=float, default=0.2)
+    parser.add_argument("--mix", help='JSON, e.g. {"booking": 0.5, "chat": 0.5}')
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    parser.add_argument("--gemini-latency", type=float, default=0.8)
+    parser.add_argument("--smtp-latency", type=float, default=0.05)
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    parser.add_argument("--database-url", help="run against a local Postgres instead of stand-ins")
+    parser.add_argument("--results", default=RESULTS_FILE)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,101 @@
+import argparse
+import json
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from webhook_server import WEBHOOK_PATH, WEBHOOK_SECRET, WebhookHTTPServer, make_handler, shard_for
+
+# Fires synthetic Telegram updates at a webhook front end on localhost.
+#   python loadtest_webhook.py --local            # in-process front end, counting sinks
+#   python loadtest_webhook.py --url http://127.0.0.1:8443/telegram
+
+
+def synthetic_update(i, chats):
+    chat_id = 100000 + i % chats
+    return {
+        "update_id": i,
+        "message": {
+            "message_id": i,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+            "text": "hello",
+        },
+    }
+
+
+def post(url, payload):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET},
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return status, time.perf_counter() - start
+
+
+def start_local_front_end(workers):
+    """
+    Front end with counting sinks instead of bot workers, to measure ingestion
+    and routing alone.
+    """
+    queues = [queue.Queue() for _ in range(workers)]
+    counts = [0] * workers
+
+    def sink(index):
+        while True:
+            queues[index].get()
+            counts[index] += 1
+
+    for index in range(workers):
+        threading.Thread(target=sink, args=(index,), daemon=True).start()
+    server = WebhookHTTPServer(("127.0.0.1", 0), make_handler(queues))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}{WEBHOOK_PATH}", counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url")
+    parser.add_argument("--local", action="store_true")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    counts = None
+    url = args.url
+    if args.local or not url:
+        url, counts = start_local_front_end(args.workers)
+
+    payloads = [synthetic_update(i, args.chats) for i in range(args.updates)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(lambda p: post(url, p), payloads))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[1] for r in results)
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    print(f"📊 {args.updates} updates from {args.chats} chats, concurrency {args.concurrency}")
+    print(f"   {args.updates / elapsed:.0f} updates/s  "
+          f"p50={latencies[len(latencies) // 2] * 1000:.1f}ms  "
+          f"p95={latencies[int(len(latencies) * 0.95)] * 1000:.1f}ms  "
+          f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms  statuses={statuses}")
+    if counts is not None:
+        time.sleep(0.2)
+        expected = [0] * args.workers
+        for p in payloads:
+            expected[shard_for(p, args.workers)] += 1
+        print(f"   per-worker routed={counts} expected={expected}")
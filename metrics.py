@@ -0,0 +1,255 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+load_dotenv()
+# Port for the Prometheus /metrics endpoint; 0 turns it off
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9200))
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+
+# Seconds; covers a cached lookup (~µs) up to a slow Gemini call with retries
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Tokens per Gemini call
+TOKEN_BUCKETS = (50, 100, 200, 400, 800, 1200, 1600, 2400, 3200, 4800, 6400)
+
+# -----------------------------------------------------------------------------
+# Minimal Prometheus-style metrics
+#   Recording is a dict lookup plus a couple of additions under a per-metric
+#   lock, so it is cheap enough to leave on for every update. The text format
+#   is only built when /metrics is scraped.
+# -----------------------------------------------------------------------------
+_registry = []
+
+
+def _label_text(labelnames, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_label_text(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, ([*s[0]], s[1], s[2])) for labels, s in self._series.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """
+    A current value, read from `fn` when /metrics is scraped.
+    """
+
+    def __init__(self, name, help_text, fn=None):
+        self.name = name
+        self.help_text = help_text
+        self.fn = fn
+        _registry.append(self)
+
+    def set_function(self, fn):
+        self.fn = fn
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        if self.fn is not None:
+            lines.append(f"{self.name} {self.fn()}")
+        return lines
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------------------------------------------------------
+# The bot's metrics
+# -----------------------------------------------------------------------------
+turn_seconds = Histogram(
+    "bot_turn_seconds", "Time to handle one incoming message, by state on arrival", ("state",)
+)
+stage_seconds = Histogram(
+    "bot_stage_seconds", "Time spent in each external call (DB, Gemini, SMTP, Telegram)", ("stage",)
+)
+stage_errors = Counter(
+    "bot_stage_errors_total", "External calls that failed, by stage", ("stage",)
+)
+state_transitions = Counter(
+    "bot_state_transitions_total", "Booking state changes", ("from_state", "to_state")
+)
+funnel = Counter(
+    "bot_booking_funnel_total", "Chats reaching each booking state; drops between states are abandonments", ("state",)
+)
+abandoned = Counter(
+    "bot_booking_abandoned_total", "Booking flows reset by the user, by the state they were in", ("state",)
+)
+bookings = Counter(
+    "bot_bookings_total", "Booking attempts by outcome (booked, conflict, error)", ("result",)
+)
+turn_errors = Counter(
+    "bot_turn_errors_total", "Messages whose handler raised", ("state",)
+)
+first_reply_seconds = Histogram(
+    "bot_first_reply_seconds", "Time from calling Gemini to the first text the user sees (streaming replies)"
+)
+gemini_tokens = Histogram(
+    "bot_gemini_tokens", "Tokens per Gemini call, prompt and reply", ("kind",), buckets=TOKEN_BUCKETS
+)
+
+llm_requests = Counter(
+    "bot_llm_requests_total",
+    "Messages headed for Gemini: admitted, queued (admitted but waited for a slot) or shed (rate_limited, overloaded)",
+    ("outcome",),
+)
+llm_degraded = Counter(
+    "bot_llm_degraded_total", "Shed messages answered from the response cache or with a canned reply", ("answer",)
+)
+reminders = Counter(
+    "bot_reminders_total", "Appointment reminders by channel (telegram, email) and failed Telegram sends", ("channel",)
+)
+telegram_calls = Counter(
+    "bot_telegram_calls_total",
+    "Outgoing Telegram calls: sent, coalesced (merged into another), retried (after a 429) or failed",
+    ("result",),
+)
+doctor_cache = Counter(
+    "bot_doctor_cache_lookups_total",
+    "Doctor directory reads: hit (fresh snapshot) or miss (first load, or stale and reloading)",
+    ("result",),
+)
+doctor_cache_refreshes = Counter("bot_doctor_cache_refreshes_total", "Doctor directory reloads from Postgres")
+response_cache = Counter(
+    "bot_response_cache_lookups_total",
+    "Response cache lookups: hit, similar_hit, miss, or skipped (conversation too long to cache)",
+    ("result",),
+)
+response_cache_entries = Gauge("bot_response_cache_entries", "Replies held in the response cache")
+telegram_queued = Gauge("bot_telegram_queued", "Telegram calls waiting in the send queue")
+llm_pending = Gauge("bot_llm_pending", "Gemini calls running or waiting for a slot")
+
+
+class track:
+    """
+    with track("gemini"): ...
+    Times the block into bot_stage_seconds{stage} and counts it in
+    bot_stage_errors_total{stage} if it raises. Works around awaits too.
+    (A plain class rather than @contextmanager: a fraction of the overhead.)
+    """
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stage_seconds.observe(time.perf_counter() - self.start, self.stage)
+        if exc_type is not None:
+            stage_errors.inc(self.stage)
+        return False
+
+
+# -----------------------------------------------------------------------------
+# /metrics endpoint
+# -----------------------------------------------------------------------------
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=METRICS_PORT, host=METRICS_HOST):
+    """
+    Serves /metrics from a daemon thread. Returns the server, or None if the
+    endpoint is disabled or the port is unavailable.
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        print("❌ Metrics Server Error:", e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📈 Metrics available on {host}:{port}/metrics")
+    return server
@@ -0,0 +1,195 @@
+import argparse
+import hashlib
+import importlib.util
+import os
+import re
+import sys
+from db import connection, close_pool
+
+# Versioned schema migrations. Every change to the database lives in
+# migrations/ as NNNN_description.sql or NNNN_description.py and is applied
+# once, in order; applied versions are recorded in schema_migrations.
+#   python migrate.py            # apply everything pending
+#   python migrate.py --to 0003  # stop after 0003
+#   python migrate.py status
+#
+# .sql files run in a single transaction together with their bookkeeping row,
+# unless their first line is "-- migrate: no-transaction" (needed for
+# CREATE INDEX CONCURRENTLY and other online changes); those run statement
+# by statement in autocommit mode and must be safe to re-run.
+# .py files define up(conn) and commit as they go (e.g. batched backfills).
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+NO_TRANSACTION = "-- migrate: no-transaction"
+# pg_advisory_lock key, so two deploys can't migrate at the same time
+LOCK_KEY = 7419001
+FILE_PATTERN = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, "rb") as file:
+            self.source = file.read()
+        self.checksum = hashlib.sha256(self.source).hexdigest()
+
+    @property
+    def is_python(self):
+        return self.path.endswith(".py")
+
+    @property
+    def transactional(self):
+        return not self.is_python and not self.source.decode().startswith(NO_TRANSACTION)
+
+
+def discover(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = FILE_PATTERN.match(filename)
+        if match:
+            migrations.append(Migration(match.group(1), match.group(2), os.path.join(directory, filename)))
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Two migrations share a version number")
+    return migrations
+
+
+def split_statements(sql):
+    """
+    Splits a script on top-level semicolons, leaving $$-quoted bodies
+    (functions, DO blocks) intact.
+    """
+    statements, current, in_dollar = [], [], False
+    for part in re.split(r"(\$\$|;)", sql):
+        if part == "$$":
+            in_dollar = not in_dollar
+        if part == ";" and not in_dollar:
+            statement = "".join(current).strip()
+            if statement and not all(l.strip().startswith("--") or not l.strip() for l in statement.splitlines()):
+                statements.append(statement)
+            current = []
+        else:
+            current.append(part)
+    tail = "".join(current).strip()
+    if tail and not all(l.strip().startswith("--") or not l.strip() for l in tail.splitlines()):
+        statements.append(tail)
+    return statements
+
+
+def ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(10) PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+
+
+def applied_versions(cur):
+    cur.execute("SELECT version, checksum FROM schema_migrations;")
+    return dict(cur.fetchall())
+
+
+def record(cur, migration):
+    cur.execute(
+        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s);",
+        (migration.version, migration.name, migration.checksum),
+    )
+
+
+def apply(conn, migration):
+    cur = conn.cursor()
+    if migration.transactional:
+        cur.execute(migration.source.decode())
+        record(cur, migration)
+        conn.commit()
+    elif migration.is_python:
+        spec = importlib.util.spec_from_file_location(f"migration_{migration.version}", migration.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.up(conn)
+        record(cur, migration)
+        conn.commit()
+    else:
+        conn.autocommit = True
+        try:
+            for statement in split_statements(migration.source.decode()):
+                cur.execute(statement)
+            record(cur, migration)
+        finally:
+            conn.autocommit = False
+
+
+def run(target=None):
+    """
+    Applies pending migrations up to and including `target` (default: all).
+    Returns the versions applied.
+    """
+    done = []
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_lock(%s);", (LOCK_KEY,))
+        try:
+            ensure_table(cur)
+            conn.commit()
+            applied = applied_versions(cur)
+            for migration in discover():
+                if target and migration.version > target:
+                    break
+                if migration.version in applied:
+                    if applied[migration.version] != migration.checksum:
+                        print(f"❌ Migration {migration.version}_{migration.name} was edited after it was applied")
+                    continue
+                print(f"⏳ Applying {migration.version}_{migration.name}...")
+                try:
+                    apply(conn, migration)
+                except Exception:
+                    conn.rollback()
+                    raise
+                done.append(migration.version)
+                print(f"✅ Applied {migration.version}_{migration.name}")
+        finally:
+            conn.rollback()
+            cur.execute("SELECT pg_advisory_unlock(%s);", (LOCK_KEY,))
+            conn.commit()
+    if not done:
+        print("✅ Schema is up to date")
+    return done
+
+
+def status():
+    with connection() as conn:
+        cur = conn.cursor()
+        ensure_table(cur)
+        conn.commit()
+        applied = applied_versions(cur)
+    for migration in discover():
+        if migration.version not in applied:
+            state = "pending"
+        elif applied[migration.version] != migration.checksum:
+            state = "applied (file changed since)"
+        else:
+            state = "applied"
+        print(f"{migration.version}  {migration.name:<40} {state}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", nargs="?", choices=["up", "status"], default="up")
+    parser.add_argument("--to", help="last version to apply")
+    args = parser.parse_args()
+    try:
+        if args.command == "status":
+            status()
+        else:
+            run(args.to)
+    except Exception as e:
+        print("❌ Migration failed:")
+        print(e)
+        # Non-zero so a release phase running this stops the deploy
+        sys.exit(1)
+    finally:
+        close_pool()
@@ -0,0 +1,102 @@
+-- Schema as previously created by init_db.py and setup_functions.py.
+-- Everything is IF NOT EXISTS / OR REPLACE, so databases set up with those
+-- scripts can run it too and simply get it recorded as applied.
+
+CREATE TABLE IF NOT EXISTS doctorss (
+    doctor_id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    specialty VARCHAR(100)
+);
+
+-- (Older databases point doctor_id at a stray "doctors" table; 0002 fixes that)
+CREATE TABLE IF NOT EXISTS appointmentss (
+    appointment_id SERIAL PRIMARY KEY,
+    patient_name VARCHAR(100) NOT NULL,
+    patient_email VARCHAR(100),
+    doctor_id INTEGER NOT NULL REFERENCES doctorss(doctor_id),
+    appointment_day INTEGER NOT NULL CHECK (appointment_day BETWEEN 1 AND 31),
+    appointment_month INTEGER NOT NULL CHECK (appointment_month BETWEEN 1 AND 12),
+    appointment_time TIME NOT NULL
+);
+
+-- Sort order of view_data.py's export and patient lookups by email
+CREATE INDEX IF NOT EXISTS appointmentss_calendar_idx
+    ON appointmentss (appointment_month, appointment_day, appointment_time, appointment_id);
+CREATE INDEX IF NOT EXISTS appointmentss_email_idx
+    ON appointmentss (lower(patient_email));
+
+-- Trigram index so name_index.search_pg_trgm can match doctor names with typos
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS doctorss_name_trgm_idx
+    ON doctorss USING gin (lower(name) gin_trgm_ops);
+
+-- Queue of outgoing emails, drained by email_outbox.OutboxWorker
+CREATE TABLE IF NOT EXISTS email_outbox (
+    email_id SERIAL PRIMARY KEY,
+    recipient VARCHAR(100) NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    sent_at TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS email_outbox_pending_idx
+    ON email_outbox (next_attempt_at) WHERE status = 'pending';
+
+-- Booking sessions shared between bot workers (SESSION_BACKEND=postgres)
+CREATE TABLE IF NOT EXISTS bot_sessions (
+    chat_id BIGINT PRIMARY KEY,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- One booking per doctor per slot; also turns the conflict check into an index lookup
+CREATE UNIQUE INDEX IF NOT EXISTS appointmentss_slot_uidx
+    ON appointmentss (doctor_id, appointment_day, appointment_month, appointment_time);
+
+CREATE OR REPLACE FUNCTION create_appointment_with_conflict_check(
+    p_patient_name TEXT,
+    p_patient_email TEXT,
+    p_doctor_id INTEGER,
+    p_day INTEGER,
+    p_month INTEGER,
+    p_time TIME
+)
+RETURNS INTEGER AS $$
+DECLARE
+    new_appointment_id INTEGER;
+BEGIN
+    -- The unique slot index makes check-and-insert atomic: a concurrent
+    -- booking for the same slot simply inserts nothing
+    INSERT INTO appointmentss (
+        patient_name, patient_email, doctor_id,
+        appointment_day, appointment_month, appointment_time
+    )
+    VALUES (
+        p_patient_name, p_patient_email, p_doctor_id,
+        p_day, p_month, p_time
+    )
+    ON CONFLICT (doctor_id, appointment_day, appointment_month, appointment_time) DO NOTHING
+    RETURNING appointment_id INTO new_appointment_id;
+
+    -- NULL means the slot was already taken
+    RETURN new_appointment_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Tell listening bot processes to reload their doctor directory cache
+CREATE OR REPLACE FUNCTION notify_doctorss_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('doctorss_changed', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS doctorss_changed ON doctorss;
+CREATE TRIGGER doctorss_changed
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON doctorss
+FOR EACH STATEMENT EXECUTE FUNCTION notify_doctorss_changed();
@@ -0,0 +1,28 @@
+-- migrate: no-transaction
+-- appointmentss.doctor_id used to reference "doctors" instead of doctorss.
+-- Swap the foreign key without a long lock: add it NOT VALID (instant), then
+-- VALIDATE it in its own transaction, which doesn't block bookings.
+
+DO $$
+DECLARE
+    fk RECORD;
+BEGIN
+    FOR fk IN
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'appointmentss'::regclass AND contype = 'f'
+          AND confrelid <> 'doctorss'::regclass
+    LOOP
+        EXECUTE format('ALTER TABLE appointmentss DROP CONSTRAINT %I', fk.conname);
+    END LOOP;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'appointmentss'::regclass AND conname = 'appointmentss_doctor_id_fkey'
+    ) THEN
+        ALTER TABLE appointmentss
+            ADD CONSTRAINT appointmentss_doctor_id_fkey
+            FOREIGN KEY (doctor_id) REFERENCES doctorss(doctor_id) NOT VALID;
+    END IF;
+END $$;
+
+ALTER TABLE appointmentss VALIDATE CONSTRAINT appointmentss_doctor_id_fkey;
@@ -0,0 +1,73 @@
+-- Real points in time for appointments. appointment_day / month / time stay
+-- (the bot still talks in those), and a trigger derives starts_at / ends_at
+-- from them for every new row. Adding nullable columns is metadata-only, so
+-- this doesn't rewrite the table; 0004 backfills existing rows in batches.
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+ALTER TABLE appointmentss
+    ADD COLUMN IF NOT EXISTS starts_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS ends_at TIMESTAMPTZ;
+
+-- First occurrence of day/month at p_time on or after p_after, in the
+-- clinic's time zone. NULL if that day never exists (e.g. 31/02).
+CREATE OR REPLACE FUNCTION infer_appointment_start(
+    p_day INTEGER,
+    p_month INTEGER,
+    p_time TIME,
+    p_after TIMESTAMPTZ,
+    p_tz TEXT DEFAULT 'Europe/London'
+)
+RETURNS TIMESTAMPTZ AS $$
+DECLARE
+    local_after TIMESTAMP := p_after AT TIME ZONE p_tz;
+    candidate TIMESTAMP;
+BEGIN
+    -- Up to 4 years ahead, for 29/02
+    FOR offset_years IN 0..4 LOOP
+        BEGIN
+            candidate := make_timestamp(
+                extract(year FROM local_after)::INTEGER + offset_years, p_month, p_day,
+                extract(hour FROM p_time)::INTEGER, extract(minute FROM p_time)::INTEGER,
+                extract(second FROM p_time)
+            );
+        EXCEPTION WHEN datetime_field_overflow THEN
+            CONTINUE;
+        END;
+        IF candidate >= local_after THEN
+            RETURN candidate AT TIME ZONE p_tz;
+        END IF;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Start of the clinic's current day; bookings are for today or later
+CREATE OR REPLACE FUNCTION clinic_today(p_tz TEXT DEFAULT 'Europe/London')
+RETURNS TIMESTAMPTZ AS $$
+    SELECT date_trunc('day', now() AT TIME ZONE p_tz) AT TIME ZONE p_tz;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION appointmentss_fill_starts_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' OR NEW.starts_at IS NULL THEN
+        NEW.starts_at := infer_appointment_start(
+            NEW.appointment_day, NEW.appointment_month, NEW.appointment_time, clinic_today()
+        );
+        IF NEW.starts_at IS NULL THEN
+            RAISE EXCEPTION 'no such date: %/%', NEW.appointment_day, NEW.appointment_month
+                USING ERRCODE = 'datetime_field_overflow';
+        END IF;
+        NEW.ends_at := NULL;
+    END IF;
+    -- Slots are 30 minutes (SLOT_MINUTES in availability.py)
+    NEW.ends_at := COALESCE(NEW.ends_at, NEW.starts_at + interval '30 minutes');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS appointmentss_fill_starts_at ON appointmentss;
+CREATE TRIGGER appointmentss_fill_starts_at
+BEFORE INSERT OR UPDATE OF appointment_day, appointment_month, appointment_time ON appointmentss
+FOR EACH ROW EXECUTE FUNCTION appointmentss_fill_starts_at();
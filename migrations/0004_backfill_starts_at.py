@@ -0,0 +1,48 @@
+import time
+
+# Fills starts_at / ends_at for rows booked before 0003, a batch at a time with
+# a commit after each, so bookings keep flowing while it runs. Old rows carry
+# no year; each gets the occurrence of its day/month closest to today (within
+# six months either side). Rows whose date doesn't exist (31/02) stay NULL.
+BATCH_SIZE = 5000
+PAUSE = 0.05  # seconds between batches, to leave room for live traffic
+
+
+def up(conn):
+    cur = conn.cursor()
+    last_id, filled = 0, 0
+    while True:
+        cur.execute("""
+            WITH batch AS (
+                SELECT appointment_id FROM appointmentss
+                WHERE appointment_id > %s AND starts_at IS NULL
+                ORDER BY appointment_id
+                LIMIT %s
+            )
+            UPDATE appointmentss a
+            SET starts_at = infer_appointment_start(
+                    a.appointment_day, a.appointment_month, a.appointment_time,
+                    now() - interval '6 months'
+                ),
+                ends_at = infer_appointment_start(
+                    a.appointment_day, a.appointment_month, a.appointment_time,
+                    now() - interval '6 months'
+                ) + interval '30 minutes'
+            FROM batch
+            WHERE a.appointment_id = batch.appointment_id
+            RETURNING a.appointment_id;
+        """, (last_id, BATCH_SIZE))
+        ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+        if not ids:
+            break
+        last_id = max(ids)
+        filled += len(ids)
+        print(f"   backfilled {filled:,} appointments")
+        time.sleep(PAUSE)
+
+    cur.execute("SELECT COUNT(*) FROM appointmentss WHERE starts_at IS NULL;")
+    invalid = cur.fetchone()[0]
+    conn.commit()
+    if invalid:
+        print(f"❌ {invalid} appointments have a day/month that doesn't exist and were left without starts_at")
@@ -0,0 +1,10 @@
+-- migrate: no-transaction
+-- B-tree indexes for the bot's lookups, built without blocking writes:
+--   a doctor's bookings for a day / "next week for Dr X" -> (doctor_id, starts_at)
+--   everything in a time window (reports, reminders)      -> (starts_at)
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS appointmentss_doctor_starts_idx
+    ON appointmentss (doctor_id, starts_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS appointmentss_starts_idx
+    ON appointmentss (starts_at);
@@ -0,0 +1,57 @@
+-- A doctor can't have two appointments whose times overlap. The GiST
+-- exclusion constraint replaces the (doctor, day, month, time) unique index,
+-- which had no year and only caught identical start times.
+-- Adding the constraint builds its index under a lock, so run this off-peak.
+
+DO $$
+DECLARE
+    overlaps BIGINT;
+BEGIN
+    SELECT COUNT(*) INTO overlaps
+    FROM appointmentss a
+    JOIN appointmentss b
+      ON a.doctor_id = b.doctor_id
+     AND a.appointment_id < b.appointment_id
+     AND tstzrange(a.starts_at, a.ends_at) && tstzrange(b.starts_at, b.ends_at)
+    WHERE a.starts_at IS NOT NULL AND b.starts_at IS NOT NULL;
+    IF overlaps > 0 THEN
+        RAISE EXCEPTION '% pairs of existing appointments overlap; resolve them before applying this migration', overlaps;
+    END IF;
+END $$;
+
+ALTER TABLE appointmentss
+    ADD CONSTRAINT appointmentss_no_overlap
+    EXCLUDE USING gist (doctor_id WITH =, tstzrange(starts_at, ends_at) WITH &&)
+    WHERE (starts_at IS NOT NULL);
+
+DROP INDEX IF EXISTS appointmentss_slot_uidx;
+
+CREATE OR REPLACE FUNCTION create_appointment_with_conflict_check(
+    p_patient_name TEXT,
+    p_patient_email TEXT,
+    p_doctor_id INTEGER,
+    p_day INTEGER,
+    p_month INTEGER,
+    p_time TIME
+)
+RETURNS INTEGER AS $$
+DECLARE
+    new_appointment_id INTEGER;
+BEGIN
+    -- starts_at / ends_at come from the appointmentss_fill_starts_at trigger;
+    -- the exclusion constraint makes check-and-insert atomic
+    INSERT INTO appointmentss (
+        patient_name, patient_email, doctor_id,
+        appointment_day, appointment_month, appointment_time
+    )
+    VALUES (
+        p_patient_name, p_patient_email, p_doctor_id,
+        p_day, p_month, p_time
+    )
+    RETURNING appointment_id INTO new_appointment_id;
+    RETURN new_appointment_id;
+EXCEPTION WHEN exclusion_violation THEN
+    -- NULL means the slot was already taken
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
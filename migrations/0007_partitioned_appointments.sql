@@ -0,0 +1,76 @@
+-- Monthly range partitions for appointments (on starts_at, clinic-local month
+-- boundaries). The new table is built next to the old one as appointmentss_p
+-- and swapped in by 0008 once the rows are copied.
+-- Needs PostgreSQL 13+ (BEFORE row triggers on partitioned tables).
+
+-- Creates any missing monthly partitions covering p_from..p_to. Each gets its
+-- own no-overlap exclusion constraint (PostgreSQL can't enforce a range
+-- exclusion across partitions; bookings never span midnight, let alone a month).
+CREATE OR REPLACE FUNCTION ensure_appointment_partitions(
+    p_from DATE,
+    p_to DATE,
+    p_parent TEXT DEFAULT 'appointmentss',
+    p_tz TEXT DEFAULT 'Europe/London'
+)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', p_from)::DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= p_to LOOP
+        partition_name := format('appointmentss_y%sm%s', to_char(month_start, 'YYYY'), to_char(month_start, 'MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, p_parent,
+                month_start::TIMESTAMP AT TIME ZONE p_tz,
+                (month_start + interval '1 month')::TIMESTAMP AT TIME ZONE p_tz
+            );
+            EXECUTE format(
+                'ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist (doctor_id WITH =, tstzrange(starts_at, ends_at) WITH &&)',
+                partition_name, partition_name || '_no_overlap'
+            );
+            created := created + 1;
+        END IF;
+        month_start := (month_start + interval '1 month')::DATE;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TABLE appointmentss_p (
+    appointment_id INTEGER NOT NULL DEFAULT nextval('appointmentss_appointment_id_seq'),
+    patient_name VARCHAR(100) NOT NULL,
+    patient_email VARCHAR(100),
+    doctor_id INTEGER NOT NULL REFERENCES doctorss(doctor_id),
+    appointment_day INTEGER NOT NULL CHECK (appointment_day BETWEEN 1 AND 31),
+    appointment_month INTEGER NOT NULL CHECK (appointment_month BETWEEN 1 AND 12),
+    appointment_time TIME NOT NULL,
+    starts_at TIMESTAMPTZ NOT NULL,
+    ends_at TIMESTAMPTZ NOT NULL,
+    CONSTRAINT appointmentss_part_pkey PRIMARY KEY (appointment_id, starts_at)
+) PARTITION BY RANGE (starts_at);
+
+-- Defined once here, created on every partition automatically
+CREATE INDEX appointmentss_part_doctor_starts_idx ON appointmentss_p (doctor_id, starts_at);
+CREATE INDEX appointmentss_part_starts_idx ON appointmentss_p (starts_at, appointment_id);
+CREATE INDEX appointmentss_part_email_idx ON appointmentss_p (lower(patient_email));
+
+-- Everything already booked, plus the coming year
+SELECT ensure_appointment_partitions(
+    COALESCE((SELECT min(starts_at) FROM appointmentss)::DATE, current_date),
+    GREATEST(
+        COALESCE((SELECT max(starts_at) FROM appointmentss)::DATE, current_date),
+        (current_date + interval '13 months')::DATE
+    ),
+    'appointmentss_p'
+);
+
+-- Partitions past ARCHIVE_AFTER_MONTHS are moved here (see partitions.py)
+CREATE TABLE IF NOT EXISTS appointmentss_archive (LIKE appointmentss_p INCLUDING DEFAULTS);
+CREATE INDEX IF NOT EXISTS appointmentss_archive_starts_idx ON appointmentss_archive (starts_at);
+CREATE INDEX IF NOT EXISTS appointmentss_archive_email_idx ON appointmentss_archive (lower(patient_email));
+
+-- Old rows whose day/month never existed (no starts_at) can't be partitioned
+CREATE TABLE IF NOT EXISTS appointmentss_undated (LIKE appointmentss INCLUDING DEFAULTS);
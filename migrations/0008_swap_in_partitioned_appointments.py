@@ -0,0 +1,103 @@
+# Copies appointmentss into the partitioned appointmentss_p in committed
+# batches while the bot keeps booking, then swaps the tables in one short
+# transaction that blocks writes (not reads) only while the last few rows are
+# copied. The bot only ever inserts appointments; rows edited or deleted
+# during the copy are not carried over. The old table is kept as
+# appointmentss_old; drop it once you're happy with the result. If the
+# migration is interrupted, re-running it picks up after the last committed
+# batch.
+BATCH_SIZE = 20000
+
+COLUMNS = """
+    appointment_id, patient_name, patient_email, doctor_id,
+    appointment_day, appointment_month, appointment_time, starts_at, ends_at
+"""
+
+
+def copy_range(cur, after_id, up_to_id, missing_only=False):
+    # missing_only skips rows a batch already copied (one that ran past max_id)
+    cur.execute(f"""
+        INSERT INTO appointmentss_p ({COLUMNS})
+        SELECT {COLUMNS} FROM appointmentss a
+        WHERE appointment_id > %s AND appointment_id <= %s AND starts_at IS NOT NULL
+        {"AND NOT EXISTS (SELECT 1 FROM appointmentss_p p WHERE p.appointment_id = a.appointment_id)" if missing_only else ""};
+    """, (after_id, up_to_id))
+    return cur.rowcount
+
+
+def up(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(max(appointment_id), 0) FROM appointmentss;")
+    max_id = cur.fetchone()[0]
+    # Batches go in appointment_id order, so everything up to the highest id
+    # already in appointmentss_p was copied by an earlier, interrupted run
+    cur.execute("SELECT COALESCE(max(appointment_id), 0), count(*) FROM appointmentss_p;")
+    last_id, copied = cur.fetchone()
+    conn.commit()
+    if copied:
+        print(f"   resuming after {copied:,} appointments copied earlier")
+
+    while last_id < max_id:
+        copied += copy_range(cur, last_id, last_id + BATCH_SIZE)
+        conn.commit()
+        last_id += BATCH_SIZE
+        print(f"   copied {copied:,} appointments")
+
+    # Brief write lock: catch up on rows booked during the copy, then swap
+    cur.execute("LOCK TABLE appointmentss IN EXCLUSIVE MODE;")
+    copied += copy_range(cur, max_id, 2 ** 31 - 1, missing_only=True)
+    cur.execute("INSERT INTO appointmentss_undated SELECT * FROM appointmentss WHERE starts_at IS NULL;")
+    undated = cur.rowcount
+    cur.execute("""
+        DROP TRIGGER IF EXISTS appointmentss_fill_starts_at ON appointmentss;
+        ALTER TABLE appointmentss RENAME TO appointmentss_old;
+        ALTER TABLE appointmentss_p RENAME TO appointmentss;
+        ALTER SEQUENCE appointmentss_appointment_id_seq OWNED BY appointmentss.appointment_id;
+
+        CREATE TRIGGER appointmentss_fill_starts_at
+        BEFORE INSERT OR UPDATE OF appointment_day, appointment_month, appointment_time ON appointmentss
+        FOR EACH ROW EXECUTE FUNCTION appointmentss_fill_starts_at();
+    """)
+    # Rows are routed to a partition before BEFORE triggers run, so the
+    # booking function has to supply starts_at / ends_at itself
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION create_appointment_with_conflict_check(
+            p_patient_name TEXT,
+            p_patient_email TEXT,
+            p_doctor_id INTEGER,
+            p_day INTEGER,
+            p_month INTEGER,
+            p_time TIME
+        )
+        RETURNS INTEGER AS $$
+        DECLARE
+            new_appointment_id INTEGER;
+            slot_start TIMESTAMPTZ := infer_appointment_start(p_day, p_month, p_time, clinic_today());
+        BEGIN
+            IF slot_start IS NULL THEN
+                RAISE EXCEPTION 'no such date: %/%', p_day, p_month
+                    USING ERRCODE = 'datetime_field_overflow';
+            END IF;
+            -- The partition's exclusion constraint makes check-and-insert atomic
+            INSERT INTO appointmentss (
+                patient_name, patient_email, doctor_id,
+                appointment_day, appointment_month, appointment_time,
+                starts_at, ends_at
+            )
+            VALUES (
+                p_patient_name, p_patient_email, p_doctor_id,
+                p_day, p_month, p_time,
+                slot_start, slot_start + interval '30 minutes'
+            )
+            RETURNING appointment_id INTO new_appointment_id;
+            RETURN new_appointment_id;
+        EXCEPTION WHEN exclusion_violation THEN
+            -- NULL means the slot was already taken
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    conn.commit()
+    print(f"   {copied:,} appointments now in the partitioned table")
+    if undated:
+        print(f"❌ {undated} appointments without a valid date were moved to appointmentss_undated")
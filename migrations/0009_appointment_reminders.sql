@@ -0,0 +1,54 @@
+-- Reminders: the chat to remind on Telegram (NULL for bookings made before
+-- this, or imported) and when the reminder went out (NULL = not yet)
+ALTER TABLE appointmentss ADD COLUMN IF NOT EXISTS chat_id BIGINT;
+ALTER TABLE appointmentss ADD COLUMN IF NOT EXISTS reminded_at TIMESTAMPTZ;
+-- Archival copies partitions with SELECT *, so the side tables need the same columns
+ALTER TABLE appointmentss_archive ADD COLUMN IF NOT EXISTS chat_id BIGINT;
+ALTER TABLE appointmentss_archive ADD COLUMN IF NOT EXISTS reminded_at TIMESTAMPTZ;
+ALTER TABLE appointmentss_undated ADD COLUMN IF NOT EXISTS chat_id BIGINT;
+ALTER TABLE appointmentss_undated ADD COLUMN IF NOT EXISTS reminded_at TIMESTAMPTZ;
+
+-- Each reminder tick is one range scan over this: only appointments still
+-- waiting for a reminder, and (with partition pruning) only this month's
+CREATE INDEX IF NOT EXISTS appointmentss_unreminded_idx
+    ON appointmentss (starts_at) WHERE reminded_at IS NULL;
+
+-- Same as before plus the patient's chat; existing six-argument calls still
+-- work through the default
+DROP FUNCTION IF EXISTS create_appointment_with_conflict_check(TEXT, TEXT, INTEGER, INTEGER, INTEGER, TIME);
+CREATE OR REPLACE FUNCTION create_appointment_with_conflict_check(
+    p_patient_name TEXT,
+    p_patient_email TEXT,
+    p_doctor_id INTEGER,
+    p_day INTEGER,
+    p_month INTEGER,
+    p_time TIME,
+    p_chat_id BIGINT DEFAULT NULL
+)
+RETURNS INTEGER AS $$
+DECLARE
+    new_appointment_id INTEGER;
+    slot_start TIMESTAMPTZ := infer_appointment_start(p_day, p_month, p_time, clinic_today());
+BEGIN
+    IF slot_start IS NULL THEN
+        RAISE EXCEPTION 'no such date: %/%', p_day, p_month
+            USING ERRCODE = 'datetime_field_overflow';
+    END IF;
+    -- The partition's exclusion constraint makes check-and-insert atomic
+    INSERT INTO appointmentss (
+        patient_name, patient_email, doctor_id,
+        appointment_day, appointment_month, appointment_time,
+        starts_at, ends_at, chat_id
+    )
+    VALUES (
+        p_patient_name, p_patient_email, p_doctor_id,
+        p_day, p_month, p_time,
+        slot_start, slot_start + interval '30 minutes', p_chat_id
+    )
+    RETURNING appointment_id INTO new_appointment_id;
+    RETURN new_appointment_id;
+EXCEPTION WHEN exclusion_violation THEN
+    -- NULL means the slot was already taken
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,45 @@
+-- 29/02 is inferred up to four years ahead, past the months partition
+-- maintenance keeps ready, so the booking function now makes sure the slot's
+-- month has a partition before inserting. Usually that's one to_regclass()
+-- lookup. (No DEFAULT partition: it would rule out DETACH ... CONCURRENTLY
+-- when archiving.)
+CREATE OR REPLACE FUNCTION create_appointment_with_conflict_check(
+    p_patient_name TEXT,
+    p_patient_email TEXT,
+    p_doctor_id INTEGER,
+    p_day INTEGER,
+    p_month INTEGER,
+    p_time TIME,
+    p_chat_id BIGINT DEFAULT NULL
+)
+RETURNS INTEGER AS $$
+DECLARE
+    new_appointment_id INTEGER;
+    slot_start TIMESTAMPTZ := infer_appointment_start(p_day, p_month, p_time, clinic_today());
+BEGIN
+    IF slot_start IS NULL THEN
+        RAISE EXCEPTION 'no such date: %/%', p_day, p_month
+            USING ERRCODE = 'datetime_field_overflow';
+    END IF;
+    PERFORM ensure_appointment_partitions(
+        (slot_start AT TIME ZONE 'Europe/London')::DATE,
+        (slot_start AT TIME ZONE 'Europe/London')::DATE
+    );
+    -- The partition's exclusion constraint makes check-and-insert atomic
+    INSERT INTO appointmentss (
+        patient_name, patient_email, doctor_id,
+        appointment_day, appointment_month, appointment_time,
+        starts_at, ends_at, chat_id
+    )
+    VALUES (
+        p_patient_name, p_patient_email, p_doctor_id,
+        p_day, p_month, p_time,
+        slot_start, slot_start + interval '30 minutes', p_chat_id
+    )
+    RETURNING appointment_id INTO new_appointment_id;
+    RETURN new_appointment_id;
+EXCEPTION WHEN exclusion_violation THEN
+    -- NULL means the slot was already taken
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
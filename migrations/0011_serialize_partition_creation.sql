@@ -0,0 +1,90 @@
+-- Two bookings for the same not-yet-partitioned month could both see no
+-- partition and race to CREATE it; the loser failed with duplicate_table and
+-- its booking was lost. Creation now queues on a transaction advisory lock
+-- and re-checks, and a partition that appears anyway (another parent, a
+-- manual CREATE) is skipped rather than raised.
+CREATE OR REPLACE FUNCTION ensure_appointment_partitions(
+    p_from DATE,
+    p_to DATE,
+    p_parent TEXT DEFAULT 'appointmentss',
+    p_tz TEXT DEFAULT 'Europe/London'
+)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', p_from)::DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= p_to LOOP
+        partition_name := format('appointmentss_y%sm%s', to_char(month_start, 'YYYY'), to_char(month_start, 'MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            -- Held until commit, so a waiter's re-check sees the winner's table
+            PERFORM pg_advisory_xact_lock(7419003);
+            IF to_regclass(partition_name) IS NULL THEN
+                BEGIN
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                        partition_name, p_parent,
+                        month_start::TIMESTAMP AT TIME ZONE p_tz,
+                        (month_start + interval '1 month')::TIMESTAMP AT TIME ZONE p_tz
+                    );
+                    EXECUTE format(
+                        'ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist (doctor_id WITH =, tstzrange(starts_at, ends_at) WITH &&)',
+                        partition_name, partition_name || '_no_overlap'
+                    );
+                    created := created + 1;
+                EXCEPTION WHEN duplicate_table THEN
+                    NULL;
+                END;
+            END IF;
+        END IF;
+        month_start := (month_start + interval '1 month')::DATE;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partition creation locks appointmentss until the booking commits, so the
+-- booking path only falls back to it for a month PartitionMaintainer hasn't
+-- made ready (29/02 years ahead); the usual case is one to_regclass() lookup.
+CREATE OR REPLACE FUNCTION create_appointment_with_conflict_check(
+    p_patient_name TEXT,
+    p_patient_email TEXT,
+    p_doctor_id INTEGER,
+    p_day INTEGER,
+    p_month INTEGER,
+    p_time TIME,
+    p_chat_id BIGINT DEFAULT NULL
+)
+RETURNS INTEGER AS $$
+DECLARE
+    new_appointment_id INTEGER;
+    slot_start TIMESTAMPTZ := infer_appointment_start(p_day, p_month, p_time, clinic_today());
+    slot_day DATE;
+BEGIN
+    IF slot_start IS NULL THEN
+        RAISE EXCEPTION 'no such date: %/%', p_day, p_month
+            USING ERRCODE = 'datetime_field_overflow';
+    END IF;
+    slot_day := (slot_start AT TIME ZONE 'Europe/London')::DATE;
+    IF to_regclass(format('appointmentss_y%sm%s', to_char(slot_day, 'YYYY'), to_char(slot_day, 'MM'))) IS NULL THEN
+        PERFORM ensure_appointment_partitions(slot_day, slot_day);
+    END IF;
+    -- The partition's exclusion constraint makes check-and-insert atomic
+    INSERT INTO appointmentss (
+        patient_name, patient_email, doctor_id,
+        appointment_day, appointment_month, appointment_time,
+        starts_at, ends_at, chat_id
+    )
+    VALUES (
+        p_patient_name, p_patient_email, p_doctor_id,
+        p_day, p_month, p_time,
+        slot_start, slot_start + interval '30 minutes', p_chat_id
+    )
+    RETURNING appointment_id INTO new_appointment_id;
+    RETURN new_appointment_id;
+EXCEPTION WHEN exclusion_violation THEN
+    -- NULL means the slot was already taken
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
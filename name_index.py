@@ -0,0 +1,144 @@
+import re
+import db
+
+# Honorifics carry no information about which doctor is meant
+TITLE_TOKENS = {"dr", "doctor", "prof", "professor", "mr", "mrs", "ms", "miss"}
+# Minimum per-token similarity (1 - edit distance / length) to count as a hit
+TOKEN_SIMILARITY = 0.75
+# Overall confidence needed before we treat a match as the doctor the user meant
+MATCH_THRESHOLD = 0.4
+
+
+def tokenize(text: str):
+    cleaned = re.sub(r"[^a-zA-Z0-9\s]", "", text).lower()
+    return [t for t in cleaned.split() if t not in TITLE_TOKENS]
+
+
+def deletes(token: str, depth: int):
+    """
+    Every string reachable from `token` by removing up to `depth` characters.
+    """
+    found = set()
+    frontier = {token}
+    for _ in range(depth):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        found |= frontier
+    return found
+
+
+def edit_distance(a: str, b: str, limit: int):
+    """
+    Levenshtein distance between a and b, giving up (returning limit + 1)
+    as soon as it is clear the distance exceeds `limit`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class NameIndex:
+    """
+    Prebuilt doctor-name index: an inverted index from name token to doctors,
+    plus a symmetric-delete index over the token vocabulary for typo-tolerant
+    lookups. Each vocabulary token is stored under itself and every one-letter
+    deletion of it, so finding near misses is a handful of dict lookups rather
+    than a scan over every doctor.
+    """
+
+    def __init__(self, doctors):
+        self.names = {}
+        self.token_count = {}
+        self.postings = {}
+        self.variants = {}
+        for doc_id, name, *_ in doctors:
+            tokens = set(tokenize(name))
+            self.names[doc_id] = name
+            self.token_count[doc_id] = len(tokens)
+            for token in tokens:
+                self.postings.setdefault(token, []).append(doc_id)
+        for token in self.postings:
+            for variant in deletes(token, 1) | {token}:
+                self.variants.setdefault(variant, []).append(token)
+
+    def similar_tokens(self, token: str):
+        """
+        Returns [(vocab_token, similarity)] for vocabulary tokens close to `token`.
+        """
+        if token in self.postings:
+            return [(token, 1.0)]
+        depth = int(len(token) * (1 - TOKEN_SIMILARITY))
+        if depth == 0:
+            # Too short to allow any typo
+            return []
+        candidates = set()
+        for variant in deletes(token, depth) | {token}:
+            candidates.update(self.variants.get(variant, ()))
+        results = []
+        for candidate in candidates:
+            length = max(len(token), len(candidate))
+            limit = int(length * (1 - TOKEN_SIMILARITY))
+            distance = edit_distance(token, candidate, limit)
+            if distance <= limit:
+                results.append((candidate, 1 - distance / length))
+        return results
+
+    def search(self, user_input: str, limit: int = 5):
+        """
+        Returns up to `limit` candidates as [(doc_id, name, confidence)],
+        best first. Confidence is the share of the user's words that matched
+        the doctor's name, weighted by how closely each word matched.
+        """
+        tokens = tokenize(user_input)
+        if not tokens:
+            return []
+        scores = {}
+        for token in tokens:
+            best_for_doc = {}
+            for vocab_token, similarity in self.similar_tokens(token):
+                for doc_id in self.postings[vocab_token]:
+                    if similarity > best_for_doc.get(doc_id, 0):
+                        best_for_doc[doc_id] = similarity
+            for doc_id, similarity in best_for_doc.items():
+                scores[doc_id] = scores.get(doc_id, 0) + similarity
+        ranked = sorted(
+            scores.items(),
+            # Prefer higher scores, then the name that is fully covered by the input
+            key=lambda item: (-item[1], self.token_count[item[0]]),
+        )
+        return [
+            (doc_id, self.names[doc_id], round(score / len(tokens), 3))
+            for doc_id, score in ranked[:limit]
+        ]
+
+
+def search_pg_trgm(user_input: str, limit: int = 5):
+    """
+    Same contract as NameIndex.search, answered by Postgres' pg_trgm extension
+    for directories too large to keep in memory. Needs the trigram index that
+    migrations/0001_baseline.sql creates on doctorss.name.
+    """
+    query = " ".join(tokenize(user_input))
+    if not query:
+        return []
+    with db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT doctor_id, name, word_similarity(%s, lower(name)) AS score
+            FROM doctorss
+            WHERE %s <%% lower(name)
+            ORDER BY score DESC
+            LIMIT %s;
+        """, (query, query, limit))
+        return [(doc_id, name, round(score, 3)) for doc_id, name, score in cur.fetchall()]
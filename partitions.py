@@ -0,0 +1,247 @@
+import os
+import argparse
+import gzip
+import re
+import threading
+from datetime import date
+import psycopg2
+from dotenv import load_dotenv
+from db import DATABASE_URL, connection, close_pool
+
+load_dotenv()
+# Monthly partitions kept ready ahead of today (bookings go up to a year out)
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 13))
+# Whole months older than this are moved out of the live table
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", 24))
+# If set, archived months are written here as gzipped CSV instead of being
+# kept in the appointmentss_archive table
+ARCHIVE_EXPORT_DIR = os.getenv("ARCHIVE_EXPORT_DIR")
+# Seconds between maintenance runs in the bot process
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", 6 * 3600))
+# pg_try_advisory_lock key, so only one worker process does maintenance at a time
+MAINTENANCE_LOCK_KEY = 7419002
+
+PARTITION_NAME = re.compile(r"^appointmentss_y(\d{4})m(\d{2})$")
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def ensure_partitions(months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Creates any missing monthly partitions from this month to months_ahead.
+    Returns how many were created.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT ensure_appointment_partitions(current_date, (current_date + make_interval(months => %s))::DATE);",
+            (months_ahead,),
+        )
+        created = cur.fetchone()[0]
+        conn.commit()
+    return created
+
+
+def _by_month(names):
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def list_partitions():
+    """
+    (partition_name, first_day_of_month) for every attached partition, oldest first.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'appointmentss'::regclass;
+        """)
+        return _by_month(row[0] for row in cur.fetchall())
+
+
+def detached_partitions():
+    """
+    Monthly tables an archive run detached but didn't get to drop, oldest first.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT c.relname FROM pg_class c
+            WHERE c.relkind = 'r'
+              AND c.relnamespace = to_regnamespace(current_schema())
+              AND c.relname LIKE 'appointmentss_y%'
+              AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid);
+        """)
+        return _by_month(row[0] for row in cur.fetchall())
+
+
+def detach_partition(name):
+    """
+    Detaches one partition from appointmentss in its own transaction.
+
+    On PostgreSQL 14+ this is DETACH ... CONCURRENTLY, which never takes an
+    ACCESS EXCLUSIVE lock on appointmentss, so bookings carry on; one that
+    was interrupted is finished off with FINALIZE. Older servers get a plain
+    DETACH, committed straight away so the lock is held only for the
+    catalog change. Does nothing if the partition is already detached.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        concurrent = conn.server_version >= 140000
+        cur.execute(
+            f"SELECT {'inhdetachpending' if concurrent else 'false'} FROM pg_inherits "
+            "WHERE inhparent = 'appointmentss'::regclass AND inhrelid = to_regclass(%s);",
+            (name,),
+        )
+        row = cur.fetchone()
+        conn.rollback()
+        if row is None:
+            return
+        if not concurrent:
+            cur.execute(f'ALTER TABLE appointmentss DETACH PARTITION "{name}";')
+            conn.commit()
+            return
+        # Neither form may run inside a transaction block
+        conn.autocommit = True
+        try:
+            cur.execute(f'ALTER TABLE appointmentss DETACH PARTITION "{name}" {"FINALIZE" if row[0] else "CONCURRENTLY"};')
+        finally:
+            conn.autocommit = False
+
+
+def archive_partition(name, export_dir=ARCHIVE_EXPORT_DIR):
+    """
+    Detaches one monthly partition, moves its rows to appointmentss_archive
+    (or a gzipped CSV in export_dir) and drops it. Returns the row count.
+    """
+    detach_partition(name)
+    # Copy and drop commit together; if they fail, the detached table is
+    # left as it is and the next run picks it up (detached_partitions)
+    with connection() as conn:
+        cur = conn.cursor()
+        if export_dir:
+            os.makedirs(export_dir, exist_ok=True)
+            path = os.path.join(export_dir, f"{name}.csv.gz")
+            with gzip.open(path + ".tmp", "wt", encoding="utf-8") as file:
+                cur.copy_expert(f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER);', file)
+            os.replace(path + ".tmp", path)
+            cur.execute(f'SELECT COUNT(*) FROM "{name}";')
+            rows = cur.fetchone()[0]
+        else:
+            cur.execute(f'INSERT INTO appointmentss_archive SELECT * FROM "{name}";')
+            rows = cur.rowcount
+        cur.execute(f'DROP TABLE "{name}";')
+        conn.commit()
+    return rows
+
+
+def archive_partitions(keep_months=ARCHIVE_AFTER_MONTHS, export_dir=ARCHIVE_EXPORT_DIR, today=None):
+    """
+    Archives every partition whose whole month is more than keep_months ago,
+    including ones an earlier run detached and then failed on.
+    """
+    cutoff = add_months(today or date.today(), -keep_months)
+    archived = []
+    for name, month in detached_partitions() + list_partitions():
+        if add_months(month, 1) <= cutoff:
+            rows = archive_partition(name, export_dir)
+            archived.append((name, rows))
+            print(f"📦 Archived {name} ({rows:,} appointments)")
+    return archived
+
+
+def maintain(dsn=None):
+    """
+    One maintenance pass: future partitions, then archival. Skipped if another
+    process is already doing it.
+    """
+    # The lock lives on its own connection outside the pool: the steps below
+    # borrow pool connections, and holding one here for the whole pass would
+    # deadlock with DB_POOL_MAX=1 or a pool saturated by bookings
+    lock_conn = psycopg2.connect(dsn or DATABASE_URL)
+    try:
+        lock_conn.autocommit = True
+        cur = lock_conn.cursor()
+        cur.execute("SELECT pg_try_advisory_lock(%s);", (MAINTENANCE_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            return False
+        try:
+            created = ensure_partitions()
+            if created:
+                print(f"✅ Created {created} appointment partitions")
+            archive_partitions()
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s);", (MAINTENANCE_LOCK_KEY,))
+    finally:
+        # Closing the session would release the lock anyway
+        lock_conn.close()
+    return True
+
+
+class PartitionMaintainer:
+    """
+    Runs maintain() at startup and every PARTITION_MAINTENANCE_INTERVAL
+    seconds in a background thread of the bot process.
+    """
+
+    def __init__(self, interval=PARTITION_MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                maintain()
+            except Exception as e:
+                print("❌ Partition Maintenance Error:", e)
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+maintainer = PartitionMaintainer()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Appointment partition maintenance")
+    parser.add_argument("command", nargs="?", choices=["maintain", "ensure", "archive", "list"], default="maintain")
+    parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    parser.add_argument("--keep-months", type=int, default=ARCHIVE_AFTER_MONTHS)
+    parser.add_argument("--export-dir", default=ARCHIVE_EXPORT_DIR)
+    args = parser.parse_args()
+    try:
+        if args.command == "list":
+            for name, month in list_partitions():
+                print(name)
+        elif args.command == "ensure":
+            print(f"✅ Created {ensure_partitions(args.months_ahead)} appointment partitions")
+        elif args.command == "archive":
+            archive_partitions(args.keep_months, args.export_dir)
+        else:
+            maintain()
+    except Exception as e:
+        print("❌ Partition maintenance failed:")
+        print(e)
+    finally:
+        close_pool()
@@ -0,0 +1,126 @@
+import os
+import time
+from dotenv import load_dotenv
+from telegram.constants import ChatAction, MessageLimit
+from telegram.error import BadRequest
+from send_queue import outbound
+
+load_dotenv()
+# Minimum seconds between edits of a streaming reply. Telegram throttles
+# edits (roughly one a second per chat), so faster chunks are batched up
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.0))
+# Characters shown in the first message; shorter starts wait for more text
+STREAM_MIN_CHARS = int(os.getenv("STREAM_MIN_CHARS", 20))
+MAX_MESSAGE_LENGTH = MessageLimit.MAX_TEXT_LENGTH
+
+
+class ProgressiveReply:
+    """
+    One Telegram message that grows as a reply streams in.
+
+        reply = ProgressiveReply(bot, chat_id)
+        reply.typing()
+        async for piece in gemini.stream(contents):
+            text += piece
+            reply.update(text)
+        await reply.finish(text)
+
+    The first update() with at least min_chars sends the message; later
+    ones edit it, at most once every `interval` seconds. Nothing but
+    finish() waits on Telegram: the calls go through the outbound send
+    queue (which paces them, collapses edits that back up and retries
+    429s). While the first message is still queued, newer text replaces
+    what it will say, and an edit is skipped while the previous one is
+    still queued, since the next edit or finish() shows its text anyway. finish() waits
+    for the final text to land, and text past Telegram's message length
+    goes out as follow-up messages. `bot` is anything with send_message,
+    edit_message_text and send_chat_action, which is how tests plug in a
+    fake.
+    """
+
+    def __init__(self, bot, chat_id, interval=STREAM_EDIT_INTERVAL, min_chars=STREAM_MIN_CHARS, queue=outbound):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.interval = interval
+        self.min_chars = min_chars
+        self.queue = queue
+        self.message_id = None
+        self.shown = ""
+        self.edits = 0
+        self.first_shown_at = None
+        self._first = None
+        self._pending = None
+        self._next_edit = 0.0
+
+    def typing(self):
+        """
+        Shows "typing…" until the first message arrives (or 5 seconds pass).
+        """
+        self.queue.send(self.bot, "send_chat_action", chat_id=self.chat_id, action=ChatAction.TYPING)
+
+    def _send(self, text):
+        self.shown = text
+        self._first = self.queue.send(self.bot, "send_message", chat_id=self.chat_id, text=text)
+        self._first.add_done_callback(self._sent)
+
+    def _revise(self, text):
+        # True if the first message hasn't gone out yet and will now say `text`
+        if self.message_id is None and self.queue.revise(self.chat_id, self._first, text=text):
+            self.shown = text
+            return True
+        return False
+
+    def _sent(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.message_id = future.result().message_id
+        self.first_shown_at = time.perf_counter()
+        self._next_edit = self.first_shown_at + self.interval
+
+    def _edit(self, text):
+        self.edits += 1
+        self.shown = text
+        self._next_edit = time.perf_counter() + self.interval
+        self._pending = self.queue.send(
+            self.bot, "edit_message_text", text=text, chat_id=self.chat_id, message_id=self.message_id
+        )
+        return self._pending
+
+    def update(self, text):
+        """
+        Shows `text` (the whole reply so far) if the edit interval allows.
+        Never waits.
+        """
+        text = text[:MAX_MESSAGE_LENGTH]
+        if self._first is None:
+            if len(text.strip()) >= self.min_chars:
+                self._send(text)
+            return
+        if text == self.shown or self._revise(text):
+            return
+        if (
+            self.message_id is not None
+            and time.perf_counter() >= self._next_edit
+            and (self._pending is None or self._pending.done())
+        ):
+            self._edit(text)
+
+    async def finish(self, text):
+        """
+        Shows the complete reply and waits until it has been delivered.
+        """
+        head, rest = text[:MAX_MESSAGE_LENGTH], text[MAX_MESSAGE_LENGTH:]
+        if self._first is None:
+            self._send(head)
+        else:
+            self._revise(head)
+        await self._first
+        if head != self.shown:
+            try:
+                await self._edit(head)
+            except BadRequest:
+                # Already logged by the queue; the message keeps its last text
+                pass
+        while rest:
+            head, rest = rest[:MAX_MESSAGE_LENGTH], rest[MAX_MESSAGE_LENGTH:]
+            self.queue.send(self.bot, "send_message", chat_id=self.chat_id, text=head)
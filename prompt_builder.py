@@ -0,0 +1,122 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+# Tokens of conversation history sent with each Gemini call (the system
+# instruction and the new message come on top of this)
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", 600))
+# Turns that don't fit the budget are squeezed into one summary line instead
+# of being dropped outright
+PROMPT_SUMMARIZE = os.getenv("PROMPT_SUMMARIZE", "true").lower() == "true"
+# Characters kept from each dropped turn / the summary as a whole
+SUMMARY_TURN_CHARS = int(os.getenv("SUMMARY_TURN_CHARS", 80))
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", 320))
+# Rough English average for Gemini's tokenizer; the real counts come back on
+# each response and are what gets recorded
+CHARS_PER_TOKEN = 4
+
+# Sent once as the model's system_instruction rather than in front of every message
+SYSTEM_INSTRUCTION = (
+    "You are a friendly, empathetic, and extremely human-like admin assistant for Srivathsan Healthcare.\n"
+    "Respond to the user in a warm, conversational tone.So "
+    "whenever you naturally talk about appointment "
+    "like for example if youre asking them a question "
+    "like would you like to book an appointment or something"
+    " related to appoint. always say like if you wanna go ahead "
+    "and book an appointment say the word appointment and i'll take you through the process. whatever kind of things beacuse sometimes when naturally you might say do you want to book an appoint ment the user might say yes so dont let them say yes if the say yes or okay or whaetver like a confirming word ask them to enter the word appointment to take them through the booking process. Whatever conversations youre making keep it in the space of health care admin you can have conversation with them naturally but always keep it in the space of an healthcare admin and always try to drive the conversation in booking an appointment by asking them to say the word appointment be strict about it and also youve been trained make appointment only you can do any other actions apart from naturaly having conversation.. driving them towards appointment when having conversation and also you could give some general medical advice and prompt them towards bookgin an appoint by asking them say the word appointment if you find that they might have some serious problem by the converssations you have with them and make sure to keep the conversation neat and clean noo too much talking and not too less talking be a nice admin and also if they are typing some random things and that has the word appointment dont jump into the booking flow if you see just one word appointment then you go with the booking flow and also one more thing youre basically based on edinburgh so make sure the terminolies and everything are the same accordingly"
+)
+
+# Session context lines look like "User: ..." / "Assistant: ..."
+ROLES = {"User": "user", "Assistant": "model"}
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def parse_line(line):
+    """
+    "User: hi" -> ("user", "hi"). Lines without a known prefix count as the user's.
+    """
+    speaker, sep, text = line.partition(": ")
+    if sep and speaker in ROLES:
+        return ROLES[speaker], text
+    return "user", line
+
+
+def summarize(turns):
+    """
+    One line standing in for turns that no longer fit: the start of each,
+    newest kept if it gets too long. No extra model call.
+    """
+    parts = []
+    for role, text in turns:
+        text = " ".join(text.split())
+        if len(text) > SUMMARY_TURN_CHARS:
+            text = text[:SUMMARY_TURN_CHARS - 1] + "…"
+        parts.append(("user: " if role == "user" else "you: ") + text)
+    summary = "; ".join(parts)
+    if len(summary) > SUMMARY_MAX_CHARS:
+        summary = "…" + summary[-(SUMMARY_MAX_CHARS - 1):]
+    return f"(Earlier in this conversation: {summary})"
+
+
+class PromptBuilder:
+    """
+    Turns a chat's context lines and new message into Gemini `contents`:
+    role-tagged turns, newest first until history_tokens is spent, older
+    turns optionally folded into a summary line. Consecutive turns from
+    the same side are merged and the history always starts with the user,
+    as Gemini expects.
+    """
+
+    def __init__(self, history_tokens=PROMPT_HISTORY_TOKENS, summarize_older=PROMPT_SUMMARIZE):
+        self.history_tokens = history_tokens
+        self.summarize_older = summarize_older
+
+    def build(self, context, user_input):
+        turns = [parse_line(line) for line in context]
+        # respond_to_message has already added the new message to the context
+        if turns and turns[-1] == ("user", user_input):
+            turns.pop()
+
+        kept, spent = [], 0
+        for index in range(len(turns) - 1, -1, -1):
+            cost = estimate_tokens(turns[index][1])
+            if spent + cost > self.history_tokens:
+                break
+            kept.append(turns[index])
+            spent += cost
+        kept.reverse()
+        dropped = turns[:len(turns) - len(kept)]
+        # A reply whose question was dropped reads oddly on its own
+        while kept and kept[0][0] == "model":
+            dropped.append(kept.pop(0))
+
+        contents = []
+        if dropped and self.summarize_older:
+            contents.append({"role": "user", "parts": [summarize(dropped)]})
+        for role, text in kept + [("user", user_input)]:
+            if contents and contents[-1]["role"] == role:
+                contents[-1]["parts"].append(text)
+            else:
+                contents.append({"role": role, "parts": [text]})
+        return contents
+
+
+def prompt_history(contents):
+    """
+    Everything in `contents` before the new message, one "role: text" line
+    per part (a summary of older turns counts as one).
+    """
+    lines = [f"{content['role']}: {part}" for content in contents for part in content["parts"]]
+    return lines[:-1]
+
+
+def content_tokens(contents):
+    """
+    Estimated tokens in a contents list (or plain prompt string).
+    """
+    if isinstance(contents, str):
+        return estimate_tokens(contents)
+    return sum(estimate_tokens(part) for content in contents for part in content["parts"])
@@ -0,0 +1,126 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+import db
+import metrics
+from metrics import track
+from email_outbox import outbox, reminder_email
+from send_queue import outbound
+
+load_dotenv()
+# Patients are reminded this many hours before their appointment
+REMINDER_LEAD_HOURS = float(os.getenv("REMINDER_LEAD_HOURS", 24))
+# Seconds between reminder ticks
+REMINDER_INTERVAL = float(os.getenv("REMINDER_INTERVAL", 60))
+# Appointments claimed per query; a tick keeps going until it gets fewer
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", 500))
+REMINDER_EMAILS = os.getenv("REMINDER_EMAILS", "true").lower() == "true"
+
+# -----------------------------------------------------------------------------
+# One range scan over appointmentss_unreminded_idx per batch: appointments
+# starting within the lead time that haven't been reminded yet. They are
+# marked reminded in the same statement, and their emails go into the outbox
+# in the same transaction, so a restart can never remind anyone twice and
+# several bot processes can tick at once (SKIP LOCKED). The bounds are
+# repeated on the UPDATE so both sides prune to the current partitions.
+# -----------------------------------------------------------------------------
+CLAIM_DUE = """
+    WITH due AS (
+        SELECT appointment_id, starts_at FROM appointmentss
+        WHERE reminded_at IS NULL
+          AND starts_at > now()
+          AND starts_at <= now() + make_interval(secs => %(lead)s)
+        ORDER BY starts_at
+        LIMIT %(batch)s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE appointmentss a SET reminded_at = now()
+    FROM due, doctorss d
+    WHERE a.appointment_id = due.appointment_id
+      AND a.starts_at = due.starts_at
+      AND a.starts_at > now()
+      AND a.starts_at <= now() + make_interval(secs => %(lead)s)
+      AND d.doctor_id = a.doctor_id
+    RETURNING a.appointment_id, a.chat_id, a.patient_name, a.patient_email, d.name,
+              a.starts_at AT TIME ZONE 'Europe/London';
+"""
+
+
+def reminder_text(name, doctor, starts_at):
+    return (
+        f"Hi {name}! Just a reminder of your appointment with {doctor} on "
+        f"{starts_at:%A %d %B} at {starts_at:%H:%M}. "
+        "If you can’t make it, please let us know so someone else can have the slot."
+    )
+
+
+def claim_due(lead_hours=REMINDER_LEAD_HOURS, batch_size=REMINDER_BATCH_SIZE, emails=REMINDER_EMAILS):
+    """
+    Marks up to batch_size due appointments as reminded, queues their
+    reminder emails and returns
+    (appointment_id, chat_id, patient_name, patient_email, doctor_name, local starts_at) rows.
+    """
+    with db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(CLAIM_DUE, {"lead": lead_hours * 3600, "batch": batch_size})
+        due = cur.fetchall()
+        queued = [
+            (email,) + reminder_email(name, doctor, starts_at)
+            for _, _, name, email, doctor, starts_at in due if email
+        ] if emails else []
+        if queued:
+            execute_values(cur, "INSERT INTO email_outbox (recipient, subject, body) VALUES %s;", queued)
+        conn.commit()
+    if queued:
+        outbox.wake()
+        metrics.reminders.inc("email", amount=len(queued))
+    return due
+
+
+async def send_reminders(bot, lead_hours=REMINDER_LEAD_HOURS, batch_size=REMINDER_BATCH_SIZE, queue=outbound):
+    """
+    One tick: claims everything due and sends the Telegram reminders
+    through the send queue, batch by batch. Returns how many appointments
+    were reminded.
+    """
+    reminded = 0
+    while True:
+        with track("reminder_claim"):
+            due = await db.run(claim_due, lead_hours, batch_size)
+        sends = [
+            queue.send(bot, "send_message", chat_id=chat_id, text=reminder_text(name, doctor, starts_at))
+            for _, chat_id, name, _, doctor, starts_at in due if chat_id
+        ]
+        # The queue paces these to Telegram's limits; wait so ticks don't pile up
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        failed = sum(1 for result in results if isinstance(result, Exception))
+        metrics.reminders.inc("telegram", amount=len(results) - failed)
+        if failed:
+            metrics.reminders.inc("failed", amount=failed)
+        reminded += len(due)
+        if len(due) < batch_size:
+            return reminded
+
+
+async def reminder_job(context):
+    """
+    Job queue callback.
+    """
+    try:
+        reminded = await send_reminders(context.bot)
+        if reminded:
+            print(f"⏰ Sent reminders for {reminded} appointments")
+    except Exception as e:
+        print("❌ Reminder Error:", e)
+
+
+def schedule(job_queue, interval=REMINDER_INTERVAL):
+    """
+    Runs reminder_job every `interval` seconds on the application's job queue.
+    A tick still running when the next is due makes that one be skipped.
+    """
+    return job_queue.run_repeating(
+        reminder_job, interval=interval, first=interval, name="appointment_reminders",
+        job_kwargs={"max_instances": 1, "coalesce": True},
+    )
@@ -0,0 +1,212 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha1
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 2000))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 6 * 3600))
+# Longest prompt history (in lines) a reply is still cached after. The key
+# covers all of it, since the reply may draw on any of it (names, symptoms,
+# emails); longer conversations are never cached. 0 = first turns only.
+RESPONSE_CACHE_CONTEXT_TURNS = int(os.getenv("RESPONSE_CACHE_CONTEXT_TURNS", 2))
+# Trigram similarity needed for a near-duplicate hit; 0 disables fuzzy hits
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0))
+# Optional SQLite file so cached replies survive restarts
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH")
+
+
+def normalize(text: str) -> str:
+    """
+    "What are your opening hours??" and "what are your  opening hours"
+    should share one cache entry.
+    """
+    return " ".join(re.sub(r"[^a-z0-9\s]", " ", text.lower()).split())
+
+
+def context_key(context):
+    # Exact text: two histories only share replies if they are the same
+    if not context:
+        return ""
+    return sha1("\n".join(context).encode("utf-8")).hexdigest()
+
+
+def trigram_set(text: str):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SqliteBackend:
+    """
+    Write-through persistence for ResponseCache entries.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("PRAGMA synchronous=NORMAL;")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                context TEXT NOT NULL,
+                message TEXT NOT NULL,
+                reply TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (context, message)
+            );
+        """)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache WHERE expires_at < ?;", (time.time(),))
+            self._conn.commit()
+            return self._conn.execute(
+                "SELECT context, message, reply, expires_at FROM response_cache ORDER BY expires_at;"
+            ).fetchall()
+
+    def save(self, context, message, reply, expires_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?);",
+                (context, message, reply, expires_at),
+            )
+            self._conn.commit()
+
+    def delete(self, context, message):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE context = ? AND message = ?;", (context, message)
+            )
+            self._conn.commit()
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of Gemini replies keyed on the normalized user message and
+    a fingerprint of the whole history Gemini was sent with it, so a reply is
+    only reused when the conversation leading up to it is identical. Only
+    short conversations (up to context_turns history lines) are cached at
+    all, and near-duplicate hits are limited to first turns, so nothing one
+    patient said can end up in another patient's reply.
+    """
+
+    def __init__(
+        self,
+        max_size=RESPONSE_CACHE_SIZE,
+        ttl=RESPONSE_CACHE_TTL,
+        context_turns=RESPONSE_CACHE_CONTEXT_TURNS,
+        similarity=RESPONSE_CACHE_SIMILARITY,
+        path=RESPONSE_CACHE_PATH,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.context_turns = context_turns
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._backend = SqliteBackend(path) if path else None
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+        if self._backend:
+            for ctx, message, reply, expires_at in self._backend.load():
+                self._store((ctx, message), reply, expires_at)
+
+    def _store(self, key, reply, expires_at):
+        self._entries[key] = (reply, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            old_key, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            if self._backend:
+                self._backend.delete(*old_key)
+
+    def _find_similar(self, ctx, message):
+        if ctx:
+            return None
+        grams = trigram_set(message)
+        best_key, best_score = None, self.similarity
+        for key in self._entries:
+            if key[0] != ctx:
+                continue
+            other = trigram_set(key[1])
+            score = len(grams & other) / len(grams | other)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cacheable(self, context):
+        return len(context or ()) <= self.context_turns
+
+    def get(self, message, context=None):
+        """
+        Returns the cached reply for `message` given the history Gemini
+        would be sent with it (prompt_history), or None.
+        """
+        if not self.cacheable(context):
+            self.skipped += 1
+            metrics.response_cache.inc("skipped")
+            return None
+        key = (context_key(context), normalize(message))
+        entry = self._entries.get(key)
+        similar = False
+        if entry is None and self.similarity > 0:
+            similar_key = self._find_similar(*key)
+            if similar_key is not None:
+                key, entry, similar = similar_key, self._entries[similar_key], True
+        if entry is None or entry[1] < time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            metrics.response_cache.inc("miss")
+            return None
+        self._entries.move_to_end(key)
+        if similar:
+            self.similar_hits += 1
+            metrics.response_cache.inc("similar_hit")
+        else:
+            self.hits += 1
+            metrics.response_cache.inc("hit")
+        return entry[0]
+
+    def get_first_turn(self, message):
+        """
+        The reply cached for `message` as the opening of a conversation (no
+        history), or None. For when Gemini can't be asked at all: unlike a
+        reply from some other conversation, it can't carry anyone's details.
+        """
+        entry = self._entries.get(("", normalize(message)))
+        if entry is None or entry[1] < time.time():
+            return None
+        return entry[0]
+
+    def put(self, message, context, reply):
+        if not self.cacheable(context):
+            return
+        key = (context_key(context), normalize(message))
+        expires_at = time.time() + self.ttl
+        self._store(key, reply, expires_at)
+        if self._backend:
+            self._backend.save(key[0], key[1], reply, expires_at)
+
+    def stats(self):
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.similar_hits) / lookups, 3) if lookups else 0.0,
+        }
@@ -1,10 +1,5 @@
-import os
-import psycopg2
-from dotenv import load_dotenv
-from datetime import datetime
-
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
+from db import connection, close_pool
+from psycopg2.extras import execute_values
 
 # Updated sample appointment data with only day and month
 sample_data = [
@@ -12,32 +7,40 @@ sample_data = [
     ("Priya Sharma", "priya@example.com", "Dr. Suresh", 19, 4, "11:30:00"),
     ("Liam Brown", "liam@example.com", "Dr. Srivathsan", 20, 4, "14:00:00")
 ]
+# (For real histories use bulk_import.py, which streams CSV/JSONL with COPY)
 
 try:
-    conn = psycopg2.connect(DATABASE_URL)
-    cur = conn.cursor()
+    with connection() as conn:
+        cur = conn.cursor()
 
-    for patient in sample_data:
-        patient_name, patient_email, doctor_name, day, month, time = patient
+        # Look every doctor up once instead of once per appointment
+        cur.execute("SELECT name, doctor_id FROM doctorss;")
+        doctor_ids = dict(cur.fetchall())
 
-        # Fetch doctor_id using the doctor_name
-        cur.execute("SELECT doctor_id FROM doctors WHERE name = %s;", (doctor_name,))
-        result = cur.fetchone()
+        rows = []
+        for patient in sample_data:
+            patient_name, patient_email, doctor_name, day, month, time = patient
+            doctor_id = doctor_ids.get(doctor_name)
+            if doctor_id:
+                rows.append((patient_name, patient_email, doctor_id, day, month, time, day, month, time))
+            else:
+                print(f"❌ Doctor '{doctor_name}' not found. Skipping...")
 
-        if result:
-            doctor_id = result[0]
-            cur.execute("""
-                INSERT INTO appointmentss (
-                    patient_name, patient_email, doctor_id,
-                    appointment_day, appointment_month, appointment_time
-                ) VALUES (%s, %s, %s, %s, %s, %s);
-            """, (patient_name, patient_email, doctor_id, day, month, time))
-        else:
-            print(f"❌ Doctor '{doctor_name}' not found. Skipping...")
+        # starts_at picks the partition, so it is worked out up front
+        execute_values(cur, """
+            INSERT INTO appointmentss (
+                patient_name, patient_email, doctor_id,
+                appointment_day, appointment_month, appointment_time, starts_at
+            ) VALUES %s;
+        """, rows, template="""(
+            %s, %s, %s, %s, %s, %s,
+            infer_appointment_start(%s, %s, %s::TIME, clinic_today())
+        )""")
 
-    conn.commit()
-    print("✅ Sample appointments inserted!")
-    conn.close()
+        conn.commit()
+        print("✅ Sample appointments inserted!")
 except Exception as e:
     print("❌ Failed to insert data:")
     print(e)
+finally:
+    close_pool()
@@ -1,9 +1,5 @@
-import os
-import psycopg2
-from dotenv import load_dotenv
-
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
+from db import connection, close_pool
+from psycopg2.extras import execute_values
 
 # Updated doctor seed data based on the revamped logic
 doctors = [
@@ -12,18 +8,18 @@ doctors = [
 ]
 
 try:
-    conn = psycopg2.connect(DATABASE_URL)
-    cur = conn.cursor()
+    with connection() as conn:
+        cur = conn.cursor()
 
-    for doc in doctors:
-        cur.execute("""
+        execute_values(cur, """
             INSERT INTO doctorss (name, specialty)
-            VALUES (%s, %s);
-        """, doc)
+            VALUES %s;
+        """, doctors)
 
-    conn.commit()
-    print("✅ Sample doctors inserted!")
-    conn.close()
+        conn.commit()
+        print("✅ Sample doctors inserted!")
 except Exception as e:
     print("❌ Failed to insert doctors:")
     print(e)
+finally:
+    close_pool()
@@ -0,0 +1,250 @@
+import os
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+from telegram.constants import MessageLimit
+from telegram.error import RetryAfter
+import metrics
+from metrics import track
+from tracing import span
+
+load_dotenv()
+# Telegram allows about 30 messages a second per bot overall, and about one a
+# second per chat (short bursts are tolerated)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_GLOBAL_BURST = float(os.getenv("TELEGRAM_GLOBAL_BURST", 30))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", 3))
+# Seconds an idle chat's first message waits for more to merge with it
+TELEGRAM_COALESCE_WINDOW = float(os.getenv("TELEGRAM_COALESCE_WINDOW", 0.05))
+# Times a call is retried after a 429 before it is given up
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 3))
+# Per-chat state kept (least recently used dropped first)
+TELEGRAM_MAX_CHATS = int(os.getenv("TELEGRAM_MAX_CHATS", 100_000))
+
+# Only these may be merged; anything with markup, parse modes etc. goes as is
+MERGEABLE_SEND = {"chat_id", "text"}
+# Not messages, so they don't use up a chat's message budget
+UNPACED_METHODS = {"send_chat_action"}
+
+
+class Bucket:
+    """
+    Token bucket that hands out reservations: reserve() takes a token now
+    (going into debt if there is none) and says how long to wait before
+    using it, so concurrent callers are spaced out instead of all retrying.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class Outgoing:
+    __slots__ = ("bot", "method", "kwargs", "futures", "context")
+
+    def __init__(self, bot, method, kwargs, future):
+        self.bot = bot
+        self.method = method
+        self.kwargs = kwargs
+        self.futures = [future]
+        # The caller's context, so the call is traced as part of its update
+        self.context = contextvars.copy_context()
+
+    def absorb(self, other):
+        """
+        Merges `other` (queued right after this one) into this call if
+        Telegram would show the same thing. Returns True if it did.
+        """
+        if other.bot is not self.bot or other.method != self.method:
+            return False
+        if self.method == "send_message":
+            if set(self.kwargs) != MERGEABLE_SEND or set(other.kwargs) != MERGEABLE_SEND:
+                return False
+            text = self.kwargs["text"] + "\n\n" + other.kwargs["text"]
+            if len(text) > MessageLimit.MAX_TEXT_LENGTH:
+                return False
+            self.kwargs = {**self.kwargs, "text": text}
+        elif self.method == "edit_message_text":
+            # Only the latest text of a message matters
+            if other.kwargs.get("message_id") != self.kwargs.get("message_id"):
+                return False
+            self.kwargs = other.kwargs
+        else:
+            return False
+        self.futures.extend(other.futures)
+        return True
+
+
+class ChatQueue:
+    __slots__ = ("items", "bucket", "draining")
+
+    def __init__(self, rate, burst):
+        self.items = deque()
+        self.bucket = Bucket(rate, burst)
+        self.draining = False
+
+
+def _retrieve(future):
+    # Failures are logged by the queue; callers that don't await the result
+    # shouldn't also trigger "exception was never retrieved"
+    if not future.cancelled():
+        future.exception()
+
+
+class SendQueue:
+    """
+    Every outgoing Telegram call goes through here.
+
+        message = await outbound.send(bot, "send_message", chat_id=..., text=...)
+
+    Each chat's calls are made one at a time, in the order they were queued,
+    paced by a per-chat token bucket plus one global bucket shared by all
+    chats (chat actions such as "typing…" only count against the global
+    one). Consecutive plain messages to a chat that are waiting together
+    (including ones queued within `window` of an idle chat's first message)
+    go out as one message; consecutive edits of one message collapse into
+    the last. A 429 is retried after the retry_after Telegram asks for.
+
+    send() returns a future for the call's result; awaiting it is optional.
+    Until the call is made, revise() can change what it will send.
+    """
+
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, global_burst=TELEGRAM_GLOBAL_BURST,
+                 chat_rate=TELEGRAM_CHAT_RATE, chat_burst=TELEGRAM_CHAT_BURST,
+                 window=TELEGRAM_COALESCE_WINDOW, max_retries=TELEGRAM_MAX_RETRIES,
+                 max_chats=TELEGRAM_MAX_CHATS):
+        self.global_bucket = Bucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.window = window
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self.queued = 0
+        self._chats = OrderedDict()
+        self._draining = 0
+        self._idle = None
+
+    def send(self, bot, method, **kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        future.add_done_callback(_retrieve)
+        chat_id = kwargs["chat_id"]
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = ChatQueue(self.chat_rate, self.chat_burst)
+            self._evict()
+        else:
+            self._chats.move_to_end(chat_id)
+        chat.items.append(Outgoing(bot, method, kwargs, future))
+        self.queued += 1
+        if not chat.draining:
+            chat.draining = True
+            self._draining += 1
+            if self._idle is None or self._idle.is_set():
+                self._idle = asyncio.Event()
+            # A fresh context: the drain outlives the update that started it
+            loop.create_task(self._drain(chat), context=contextvars.Context())
+        return future
+
+    def _evict(self):
+        while len(self._chats) > self.max_chats:
+            chat_id, chat = next(iter(self._chats.items()))
+            if chat.draining:
+                break
+            del self._chats[chat_id]
+
+    async def _drain(self, chat):
+        try:
+            if self.window:
+                await asyncio.sleep(self.window)
+            while chat.items:
+                # Left at the head of the queue while it waits, so revise() can still change it
+                item = chat.items[0]
+                wait = self.global_bucket.reserve()
+                if item.method not in UNPACED_METHODS:
+                    wait = max(wait, chat.bucket.reserve())
+                await asyncio.sleep(wait)
+                chat.items.popleft()
+                self.queued -= 1
+                # Whatever piled up behind it while we waited can go along
+                while chat.items and item.absorb(chat.items[0]):
+                    chat.items.popleft()
+                    self.queued -= 1
+                    metrics.telegram_calls.inc("coalesced")
+                # Made in a copy of the caller's context, so its span joins the caller's trace
+                await asyncio.get_running_loop().create_task(self._call(item), context=item.context)
+        finally:
+            chat.draining = False
+            self._draining -= 1
+            if self._draining == 0:
+                self._idle.set()
+
+    def revise(self, chat_id, future, **kwargs):
+        """
+        Changes the arguments of the call behind `future` if it hasn't been
+        made yet (and wasn't merged with another). Returns True if it did.
+        """
+        chat = self._chats.get(chat_id)
+        for item in chat.items if chat is not None else ():
+            if len(item.futures) == 1 and item.futures[0] is future:
+                item.kwargs = {**item.kwargs, **kwargs}
+                return True
+        return False
+
+    async def _call(self, item):
+        # Runs in the context of the update that queued it (see _drain)
+        with span("bot." + item.method, chat_id=item.kwargs["chat_id"], merged=len(item.futures)) as call:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with track("telegram_edit" if item.method == "edit_message_text" else "telegram_send"):
+                        result = await getattr(item.bot, item.method)(**item.kwargs)
+                except RetryAfter as e:
+                    if attempt < self.max_retries:
+                        metrics.telegram_calls.inc("retried")
+                        call.set("retries", attempt + 1)
+                        await asyncio.sleep(float(e.retry_after))
+                        continue
+                    error = e
+                except Exception as e:
+                    error = e
+                else:
+                    metrics.telegram_calls.inc("sent")
+                    for future in item.futures:
+                        if not future.done():
+                            future.set_result(result)
+                    return
+                break
+            call.set("error", repr(error))
+        metrics.telegram_calls.inc("failed")
+        print(f"❌ Telegram {item.method} error:", error)
+        for future in item.futures:
+            if not future.done():
+                future.set_exception(error)
+
+    async def join(self, timeout=None):
+        """
+        Waits until everything queued so far has been sent (or given up).
+        """
+        if self._idle is not None and not self._idle.is_set():
+            await asyncio.wait_for(self._idle.wait(), timeout)
+
+    def stats(self):
+        return {"queued": self.queued, "draining": self._draining, "chats": len(self._chats)}
+
+
+outbound = SendQueue()
+metrics.telegram_queued.set_function(lambda: outbound.queued)
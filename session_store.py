@@ -0,0 +1,380 @@
+import os
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+import db
+
+load_dotenv()
+# "memory" (single process), "sqlite" (one host) or "postgres" (many workers)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "sessions.db")
+# Seconds between write-behind flushes of changed sessions
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", 0.5))
+# Local read-through cache in front of the shared backends
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", 10000))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", 300))
+# Conversation lines kept per chat for the Gemini fallback
+CONTEXT_LINES = int(os.getenv("CONTEXT_LINES", 10))
+# In-memory store: chats idle longer than this are dropped, and at most
+# SESSION_MAX_CHATS are kept (least recently active evicted first)
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", 24 * 3600))
+SESSION_MAX_CHATS = int(os.getenv("SESSION_MAX_CHATS", 1_000_000))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", 60))
+
+
+class Booking:
+    """
+    Details collected during the booking flow.
+    """
+
+    __slots__ = (
+        "doctor_id", "doctor_name", "appointment_day", "appointment_month",
+        "appointment_time", "patient_name", "patient_email",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ContextBuffer:
+    """
+    Fixed-size ring buffer of the last CONTEXT_LINES conversation lines.
+    Appending overwrites the oldest line in place instead of re-slicing.
+    """
+
+    __slots__ = ("_items", "_next")
+
+    def __init__(self, lines=()):
+        self._items = []
+        self._next = 0
+        for line in lines:
+            self.append(line)
+
+    def append(self, line):
+        if len(self._items) < CONTEXT_LINES:
+            self._items.append(line)
+        else:
+            self._items[self._next] = line
+            self._next = (self._next + 1) % CONTEXT_LINES
+
+    def lines(self):
+        """
+        Oldest first.
+        """
+        return self._items[self._next:] + self._items[:self._next]
+
+    def __iter__(self):
+        return iter(self.lines())
+
+    def __len__(self):
+        return len(self._items)
+
+
+class Session:
+    """
+    Per-chat conversation state. The Booking is only allocated once a chat
+    actually starts booking, since most chats never do.
+    """
+
+    __slots__ = ("state", "_booking", "context", "last_seen")
+
+    def __init__(self, state="idle", booking=None, context=()):
+        self.state = state
+        self._booking = booking
+        # Keep track of the last few messages for more context with Gemini
+        self.context = ContextBuffer(context)
+        self.last_seen = 0.0
+
+    @property
+    def booking(self):
+        if self._booking is None:
+            self._booking = Booking()
+        return self._booking
+
+    def reset_booking(self):
+        self.state = "idle"
+        self._booking = None
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "booking_data": self._booking.to_dict() if self._booking else None,
+            "context": self.context.lines(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        booking = Booking(**data["booking_data"]) if data.get("booking_data") else None
+        return cls(data["state"], booking, data["context"])
+
+
+class MemorySessionStore:
+    """
+    Sessions in process memory: fastest, but lost on restart and private to
+    one process. Chats are kept in least-recently-active order (a plain dict,
+    re-inserted on every touch), so evicting idle chats only ever looks at
+    the ones that actually get dropped.
+    """
+
+    def __init__(self, idle_ttl=SESSION_IDLE_TTL, max_chats=SESSION_MAX_CHATS, sweep_interval=SESSION_SWEEP_INTERVAL):
+        self.idle_ttl = idle_ttl
+        self.max_chats = max_chats
+        self.sweep_interval = sweep_interval
+        self._sessions = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.evictions = 0
+
+    def get(self, chat_id):
+        """
+        Returns the session for chat_id, creating a fresh one if needed.
+        """
+        session = self._sessions.get(chat_id)
+        if session is None:
+            session = Session()
+        self._touch(chat_id, session)
+        return session
+
+    async def aget(self, chat_id):
+        return self.get(chat_id)
+
+    def _touch(self, chat_id, session):
+        now = time.monotonic()
+        session.last_seen = now
+        # Re-inserting moves the chat to the most-recently-active end
+        self._sessions.pop(chat_id, None)
+        self._sessions[chat_id] = session
+        if len(self._sessions) > self.max_chats or now >= self._next_sweep:
+            self.sweep(now)
+
+    def sweep(self, now=None):
+        """
+        Drops chats idle for longer than idle_ttl and trims to max_chats.
+        Returns how many sessions were evicted.
+        """
+        now = time.monotonic() if now is None else now
+        self._next_sweep = now + self.sweep_interval
+        evicted = 0
+        while self._sessions:
+            chat_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_chats and now - session.last_seen <= self.idle_ttl:
+                break
+            del self._sessions[chat_id]
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def save(self, chat_id, session=None):
+        if session is not None:
+            self._touch(chat_id, session)
+
+    def delete(self, chat_id):
+        self._sessions.pop(chat_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def start(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SharedSessionStore:
+    """
+    Base for stores shared between processes.
+
+    Reads go through a small local LRU cache, so a chat that keeps talking
+    doesn't hit the backend on every message. save() only serializes the
+    session and marks it dirty; a background thread writes all dirty sessions
+    in one batch every SESSION_FLUSH_INTERVAL seconds.
+
+    Subclasses implement _load(chat_id) -> json text or None, and
+    _write_many([(chat_id, json_text)]) / _delete(chat_id).
+    """
+
+    def __init__(self, cache_size=SESSION_CACHE_SIZE, cache_ttl=SESSION_CACHE_TTL, flush_interval=SESSION_FLUSH_INTERVAL):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self._cache = OrderedDict()
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _cached(self, chat_id):
+        with self._cache_lock:
+            entry = self._cache.get(chat_id)
+            if entry is None or time.monotonic() - entry[1] > self.cache_ttl:
+                return None
+            self._cache.move_to_end(chat_id)
+            return entry[0]
+
+    def _remember(self, chat_id, session):
+        with self._cache_lock:
+            self._cache[chat_id] = (session, time.monotonic())
+            self._cache.move_to_end(chat_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def get(self, chat_id):
+        session = self._cached(chat_id)
+        if session is not None:
+            return session
+        with self._lock:
+            pending = self._dirty.get(chat_id)
+        data = pending if pending is not None else self._load(chat_id)
+        session = Session.from_dict(json.loads(data)) if data else Session()
+        self._remember(chat_id, session)
+        return session
+
+    async def aget(self, chat_id):
+        """
+        Like get(), but a cache miss is read from the backend in a worker
+        thread instead of on the event loop.
+        """
+        session = self._cached(chat_id)
+        if session is not None:
+            return session
+        return await asyncio.to_thread(self.get, chat_id)
+
+    def save(self, chat_id, session=None):
+        if session is None:
+            session = self.get(chat_id)
+        self._remember(chat_id, session)
+        data = json.dumps(session.to_dict())
+        with self._lock:
+            self._dirty[chat_id] = data
+
+    def delete(self, chat_id):
+        with self._cache_lock:
+            self._cache.pop(chat_id, None)
+        with self._lock:
+            self._dirty.pop(chat_id, None)
+        self._delete(chat_id)
+
+    def flush(self):
+        with self._lock:
+            batch, self._dirty = self._dirty, {}
+        if not batch:
+            return 0
+        try:
+            self._write_many(list(batch.items()))
+        except Exception as e:
+            print("❌ Session Flush Error:", e)
+            # Put them back unless a newer version was saved meanwhile
+            with self._lock:
+                for chat_id, data in batch.items():
+                    self._dirty.setdefault(chat_id, data)
+            return 0
+        return len(batch)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+class SqliteSessionStore(SharedSessionStore):
+    """
+    Sessions in a local SQLite file; survives restarts and can be shared by
+    workers on the same host.
+    """
+
+    def __init__(self, path=SESSION_SQLITE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS bot_sessions (
+                chat_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+
+    def _load(self, chat_id):
+        with self._db_lock:
+            row = self._conn.execute("SELECT data FROM bot_sessions WHERE chat_id = ?;", (chat_id,)).fetchone()
+        return row[0] if row else None
+
+    def _write_many(self, items):
+        now = time.time()
+        with self._db_lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO bot_sessions VALUES (?, ?, ?);",
+                [(chat_id, data, now) for chat_id, data in items],
+            )
+            self._conn.commit()
+
+    def _delete(self, chat_id):
+        with self._db_lock:
+            self._conn.execute("DELETE FROM bot_sessions WHERE chat_id = ?;", (chat_id,))
+            self._conn.commit()
+
+
+class PostgresSessionStore(SharedSessionStore):
+    """
+    Sessions in the bot_sessions table (see migrations/), shared by every
+    worker process.
+    """
+
+    def _load(self, chat_id):
+        with db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT data::text FROM bot_sessions WHERE chat_id = %s;", (chat_id,))
+            row = cur.fetchone()
+        return row[0] if row else None
+
+    def _write_many(self, items):
+        with db.connection() as conn:
+            cur = conn.cursor()
+            # One round trip for the whole batch
+            execute_values(cur, """
+                INSERT INTO bot_sessions (chat_id, data, updated_at)
+                VALUES %s
+                ON CONFLICT (chat_id) DO UPDATE
+                SET data = EXCLUDED.data, updated_at = EXCLUDED.updated_at;
+            """, items, template="(%s, %s::jsonb, now())")
+            conn.commit()
+
+    def _delete(self, chat_id):
+        with db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM bot_sessions WHERE chat_id = %s;", (chat_id,))
+            conn.commit()
+
+
+def make_session_store(backend=SESSION_BACKEND):
+    if backend == "sqlite":
+        return SqliteSessionStore()
+    if backend == "postgres":
+        return PostgresSessionStore()
+    return MemorySessionStore()
@@ -1,20 +1,15 @@
-import os
-import psycopg2
-from dotenv import load_dotenv
-
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-with open("functions.sql", "r") as file:
-    sql_code = file.read()
+import sys
+from db import close_pool
+from migrate import run
 
+# The SQL functions and triggers are part of the migrations in migrations/;
+# this runs whatever is pending (same as `python migrate.py`).
 try:
-    conn = psycopg2.connect(DATABASE_URL)
-    cur = conn.cursor()
-    cur.execute(sql_code)
-    conn.commit()
+    run()
     print("✅ Function loaded successfully!")
-    conn.close()
 except Exception as e:
     print("❌ Failed to load function:")
     print(e)
+    sys.exit(1)
+finally:
+    close_pool()
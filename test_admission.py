@@ -0,0 +1,37 @@
+from admission import SHED_OVERLOADED, SHED_RATE_LIMITED, AdmissionController
+
+# Checks the per-chat token bucket and the global pending limit with a fake
+# clock, so it runs instantly and the same way every time.
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+try:
+    clock = Clock()
+    admission = AdmissionController(rate=0.5, burst=3, max_pending=2, clock=clock)
+
+    # A burst of 3, then one every 2 seconds
+    results = [admission.check(1) for _ in range(4)]
+    assert results == [None, None, None, SHED_RATE_LIMITED], results
+    clock.now = 2.0
+    assert admission.check(1) is None
+    assert admission.check(1) == SHED_RATE_LIMITED
+    # Other chats have their own bucket
+    assert admission.check(2) is None
+    print("✅ Per-chat token bucket: burst of 3, then 1 every 2s, chats independent")
+
+    # Once max_pending calls are running, everyone is shed until one finishes
+    with admission.pending(), admission.pending():
+        assert admission.check(3) == SHED_OVERLOADED
+    assert admission.stats()["in_flight"] == 0
+    assert admission.check(3) is None
+    print("✅ Global limit: shed while 2 calls are pending, admitted again after")
+except Exception as e:
+    print("❌ Error testing admission control:")
+    print(e)
@@ -0,0 +1,58 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import db
+
+# Hammers create_appointment_with_conflict_check from many threads at once,
+# all fighting over the same few slots, then checks nothing was double booked.
+DOCTOR_ID = int(os.getenv("STRESS_DOCTOR_ID", 1))
+THREADS = int(os.getenv("STRESS_THREADS", 16))
+ATTEMPTS = int(os.getenv("STRESS_ATTEMPTS", 2000))
+SLOTS = [f"{9 + i // 2:02d}:{30 * (i % 2):02d}:00" for i in range(16)]
+MARKER_EMAIL = "stress-test@example.com"
+
+
+def book(i):
+    with db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT create_appointment_with_conflict_check(
+                %s::TEXT, %s::TEXT, %s::INTEGER, %s::INTEGER, %s::INTEGER, %s::TIME
+            );
+        """, (f"Stress {i}", MARKER_EMAIL, DOCTOR_ID, 31, 12, SLOTS[i % len(SLOTS)]))
+        appointment_id = cur.fetchone()[0]
+        conn.commit()
+        return appointment_id
+
+
+try:
+    db.init_pool(minconn=THREADS, maxconn=THREADS)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        results = list(pool.map(book, range(ATTEMPTS)))
+    elapsed = time.perf_counter() - start
+
+    with db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT appointment_time, COUNT(*) FROM appointmentss
+            WHERE patient_email = %s
+            GROUP BY appointment_time HAVING COUNT(*) > 1;
+        """, (MARKER_EMAIL,))
+        doubles = cur.fetchall()
+        cur.execute("DELETE FROM appointmentss WHERE patient_email = %s;", (MARKER_EMAIL,))
+        conn.commit()
+
+    booked = sum(1 for r in results if r is not None)
+    print(f"📊 {ATTEMPTS} attempts on {len(SLOTS)} slots from {THREADS} threads in {elapsed:.2f}s "
+          f"({ATTEMPTS / elapsed:.0f} bookings/s attempted)")
+    print(f"   booked={booked} conflicts={ATTEMPTS - booked} double_bookings={len(doubles)}")
+    if doubles or booked != len(SLOTS):
+        print("❌ Double booking detected:", doubles)
+    else:
+        print("✅ No double bookings")
+except Exception as e:
+    print("❌ Error stress testing bookings:")
+    print(e)
+finally:
+    db.close_pool()
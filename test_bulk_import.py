@@ -0,0 +1,38 @@
+import os
+import tempfile
+from bulk_import import read_rows, appointment_record
+
+# Reads a JSONL file mixing good rows, broken JSON and non-object values and
+# checks every bad line comes back as a rejection instead of aborting the import.
+try:
+
+    class Doctors:
+        by_name = {"dr. suresh": 1}
+        ids = {1}
+
+    lines = [
+        '{"patient_name": "Asha", "patient_email": "asha@example.com", "doctor_name": "Dr. Suresh", '
+        '"appointment_day": 21, "appointment_month": 4, "appointment_year": 2025, "appointment_time": "12:00"}',
+        '{"patient_name": ',
+        '[]',
+        '"x"',
+        '3',
+    ]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "bookings.jsonl")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        loaded, rejected = [], []
+        for line, row in read_rows(path):
+            try:
+                loaded.append(appointment_record(row, Doctors))
+            except ValueError as e:
+                rejected.append((line, str(e)))
+
+    assert loaded == [("Asha", "asha@example.com", 1, 21, 4, "12:00:00", "2025-04-21 12:00:00")], loaded
+    assert [line for line, _ in rejected] == [2, 3, 4, 5], rejected
+    assert all("JSON" in reason for _, reason in rejected), rejected
+    print("✅ Bulk import rejected", len(rejected), "bad JSONL lines and kept", len(loaded))
+except Exception as e:
+    print("❌ Error testing bulk import:")
+    print(e)
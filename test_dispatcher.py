@@ -0,0 +1,99 @@
+import asyncio
+import random
+import time
+from dispatcher import ChatSerializer
+
+# Schedules updates the way python-telegram-bot does with concurrent_updates
+# (one task per update, in arrival order, behind a semaphore) and checks that
+# every chat still sees its messages one at a time and in order, and that a
+# busy chat doesn't hold up the others.
+CHATS = 50
+UPDATES = 2000
+CONCURRENCY = 16
+BACKLOG = 4096
+
+
+async def run_updates(updates, handler, backlog=BACKLOG):
+    semaphore = asyncio.Semaphore(backlog)
+
+    async def process(chat_id, seq):
+        async with semaphore:
+            await handler(chat_id, seq)
+
+    await asyncio.gather(*(asyncio.create_task(process(c, s)) for c, s in updates))
+
+
+async def check_ordering():
+    serializer = ChatSerializer(CONCURRENCY)
+    seen = {}
+    running = set()
+    overlaps = 0
+
+    async def handler(chat_id, seq):
+        nonlocal overlaps
+        async with serializer.hold(chat_id):
+            if chat_id in running:
+                overlaps += 1
+            running.add(chat_id)
+            await asyncio.sleep(random.uniform(0, 0.003))
+            seen.setdefault(chat_id, []).append(seq)
+            running.discard(chat_id)
+
+    updates = [(random.randrange(CHATS), seq) for seq in range(UPDATES)]
+    await run_updates(updates, handler)
+
+    out_of_order = [chat for chat, seqs in seen.items() if seqs != sorted(seqs)]
+    assert overlaps == 0, f"{overlaps} updates overlapped within a chat"
+    assert not out_of_order, f"chats handled out of order: {out_of_order}"
+    assert serializer.active_chats() == 0, "per-chat locks were not cleaned up"
+    print(f"✅ {UPDATES} updates over {CHATS} chats: in order, never overlapping, locks cleaned up")
+
+
+async def check_busy_chat(latency=0.05, backlog=24):
+    serializer = ChatSerializer(CONCURRENCY)
+    finished = {}
+    start = time.perf_counter()
+
+    async def handler(chat_id, seq):
+        async with serializer.hold(chat_id):
+            await asyncio.sleep(latency)
+        finished[chat_id] = time.perf_counter() - start
+
+    # Chat 0 sends more messages than there are slots, then chat 1 sends one
+    updates = [(0, seq) for seq in range(backlog)] + [(1, backlog)]
+    await run_updates(updates, handler)
+
+    assert finished[1] < 2 * latency, f"chat 1 waited {finished[1]:.2f}s behind chat 0"
+    assert finished[0] >= backlog * latency, "chat 0's messages overlapped"
+    print(f"✅ Chat 1 answered in {finished[1] * 1000:.0f}ms while chat 0 worked through "
+          f"{backlog} messages ({finished[0]:.1f}s)")
+
+
+async def benchmark(concurrency, latency=0.02, updates=200, chats=100):
+    serializer = ChatSerializer(concurrency)
+
+    async def handler(chat_id, seq):
+        async with serializer.hold(chat_id):
+            # Stand-in for a Gemini/SMTP/DB wait
+            await asyncio.sleep(latency)
+
+    batch = [(seq % chats, seq) for seq in range(updates)]
+    start = time.perf_counter()
+    await run_updates(batch, handler)
+    return updates / (time.perf_counter() - start)
+
+
+async def main():
+    await check_ordering()
+    await check_busy_chat()
+    serial = await benchmark(1)
+    concurrent = await benchmark(CONCURRENCY)
+    print(f"📊 20ms handlers: {serial:.0f} updates/s one at a time, "
+          f"{concurrent:.0f} updates/s with concurrency {CONCURRENCY}")
+
+
+try:
+    asyncio.run(main())
+except Exception as e:
+    print("❌ Error testing dispatcher:")
+    print(e)
@@ -0,0 +1,147 @@
+from email_outbox import SmtpSession, confirmation_email
+
+# Sends a few confirmations through one SmtpSession to a local aiosmtpd
+# stand-in and checks they all arrive over a single SMTP connection.
+try:
+    from aiosmtpd.controller import Controller
+
+    class Recorder:
+        def __init__(self):
+            self.messages = []
+            self.sessions = set()
+
+        async def handle_DATA(self, server, session, envelope):
+            self.messages.append(envelope)
+            self.sessions.add(id(session))
+            return "250 OK"
+
+    handler = Recorder()
+    controller = Controller(handler, hostname="127.0.0.1", port=8025)
+    controller.start()
+    try:
+        smtp = SmtpSession(host="127.0.0.1", port=8025, user="bot@example.com", password="", starttls=False)
+        for i in range(3):
+            subject, body = confirmation_email(f"Patient {i}", "Dr. Suresh", 21, 4, "12:00:00")
+            smtp.send(f"patient{i}@example.com", subject, body)
+        smtp.close()
+    finally:
+        controller.stop()
+
+    assert len(handler.messages) == 3, handler.messages
+    assert len(handler.sessions) == 1, "expected one reused SMTP session"
+    print("✅ Outbox SMTP session delivered", len(handler.messages), "emails over one connection")
+except Exception as e:
+    print("❌ Error testing email outbox:")
+    print(e)
+
+# Drains a fake outbox table through OutboxWorker with a flaky SMTP stand-in
+# and checks batching, claim-before-send, retry backoff and giving up.
+try:
+    from contextlib import contextmanager
+    import email_outbox
+    from email_outbox import OutboxWorker, retry_schedule, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BACKOFF
+
+    class FakeOutbox:
+        """
+        In-memory email_outbox that understands the worker's three statements.
+        """
+
+        def __init__(self, count):
+            self.rows = {
+                i: {"recipient": f"patient{i}@example.com", "attempts": 0, "status": "pending", "due": True, "delay": None}
+                for i in range(1, count + 1)
+            }
+            self.open_claims = 0
+
+        @contextmanager
+        def connection(self):
+            yield FakeConn(self)
+
+    class FakeConn:
+        def __init__(self, table):
+            self.table = table
+            self.result = []
+
+        def cursor(self):
+            return self
+
+        def execute(self, sql, params):
+            rows = self.table.rows
+            if "RETURNING" in sql:
+                lease, limit = params
+                claimed = [i for i, r in sorted(rows.items()) if r["status"] == "pending" and r["due"]][:limit]
+                for i in claimed:
+                    rows[i]["attempts"] += 1
+                    rows[i]["due"] = False
+                self.result = [(i, rows[i]["recipient"], "s", "b", rows[i]["attempts"]) for i in claimed]
+                self.table.open_claims += 1
+            elif "status = 'sent'" in sql:
+                rows[params[0]]["status"] = "sent"
+            else:
+                status, error, delay, email_id = params
+                rows[email_id].update(status=status, delay=delay)
+
+        def fetchall(self):
+            return self.result
+
+        def commit(self):
+            self.table.open_claims = 0
+
+    class FlakySmtp:
+        def __init__(self, table, fail_for=()):
+            self.table = table
+            self.fail_for = set(fail_for)
+            self.sent = []
+
+        def send(self, recipient, subject, body):
+            assert self.table.open_claims == 0, "claim transaction still open during SMTP send"
+            if recipient in self.fail_for:
+                raise ConnectionError("421 try again later")
+            self.sent.append(recipient)
+
+        def close(self):
+            pass
+
+    def drain(table, smtp, batch_size):
+        original = email_outbox.db.connection
+        email_outbox.db.connection = table.connection
+        try:
+            return OutboxWorker(session=smtp, batch_size=batch_size).drain_once()
+        finally:
+            email_outbox.db.connection = original
+
+    # Batching: five due emails drain as 2 + 2 + 1
+    table = FakeOutbox(5)
+    smtp = FlakySmtp(table)
+    processed = [drain(table, smtp, 2) for _ in range(4)]
+    assert processed == [2, 2, 1, 0], processed
+    assert all(r["status"] == "sent" for r in table.rows.values())
+
+    # Retry after an SMTP failure: the row goes back to pending with the first backoff
+    table = FakeOutbox(2)
+    smtp = FlakySmtp(table, fail_for={"patient1@example.com"})
+    drain(table, smtp, 10)
+    assert table.rows[1]["status"] == "pending" and table.rows[1]["attempts"] == 1, table.rows[1]
+    assert table.rows[1]["delay"] == OUTBOX_RETRY_BACKOFF, table.rows[1]
+    assert table.rows[2]["status"] == "sent"
+    table.rows[1]["due"] = True
+    smtp.fail_for.clear()
+    drain(table, smtp, 10)
+    assert table.rows[1]["status"] == "sent" and table.rows[1]["attempts"] == 2, table.rows[1]
+
+    # Backoff doubles with each failure
+    delays = [retry_schedule(n)[1] for n in range(1, OUTBOX_MAX_ATTEMPTS)]
+    assert delays == [OUTBOX_RETRY_BACKOFF * 2 ** n for n in range(OUTBOX_MAX_ATTEMPTS - 1)], delays
+
+    # Gives up after OUTBOX_MAX_ATTEMPTS
+    table = FakeOutbox(1)
+    smtp = FlakySmtp(table, fail_for={"patient1@example.com"})
+    for _ in range(OUTBOX_MAX_ATTEMPTS + 2):
+        table.rows[1]["due"] = True
+        drain(table, smtp, 10)
+    assert table.rows[1]["status"] == "failed", table.rows[1]
+    assert table.rows[1]["attempts"] == OUTBOX_MAX_ATTEMPTS, table.rows[1]
+    print("✅ Outbox batches, retries with backoff and gives up after", OUTBOX_MAX_ATTEMPTS, "attempts")
+except Exception as e:
+    print("❌ Error testing outbox retries:")
+    print(e)
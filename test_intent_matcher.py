@@ -0,0 +1,44 @@
+from intent_matcher import IntentMatcher
+
+# Checks what the one-pass matcher finds in typical messages, including
+# inflected forms of keywords and symptoms, and that greetings only match
+# as whole words.
+SYMPTOM_MAP = {
+    "fever": "general practitioner",
+    "flu": "general practitioner",
+    "cough": "general practitioner",
+    "cold": "general practitioner",
+    "heart": "cardiologist",
+    "cardiac": "cardiologist",
+    "chest pain": ("cardiologist", 2),
+}
+
+# message -> (booking, greeting, symptoms, specialty)
+CASES = {
+    "I'd like to book an appointment": (True, False, [], None),
+    "I've been coughing all week": (False, False, ["cough"], "general practitioner"),
+    "Feeling feverish": (False, False, ["fever"], "general practitioner"),
+    "Is scheduling possible for Monday?": (True, False, [], None),
+    "I scheduled one last month": (True, False, [], None),
+    "Can I get booked?": (True, False, [], None),
+    "Two appointments please": (True, False, [], None),
+    "Hello! chest pains and a cough": (False, True, ["chest pain", "cough"], "cardiologist"),
+    "this is his fluid intake": (False, False, [], None),
+    "hi": (False, True, [], None),
+}
+
+
+def main():
+    matcher = IntentMatcher(SYMPTOM_MAP)
+    for text, expected in CASES.items():
+        result = matcher.match(text)
+        got = (result["booking"], result["greeting"], result["symptoms"], result["specialty"])
+        assert got == expected, f"{text!r}: got {got}, expected {expected}"
+    print(f"✅ {len(CASES)} messages matched as expected, inflections included")
+
+
+try:
+    main()
+except Exception as e:
+    print("❌ Error testing intent matcher:")
+    print(e)
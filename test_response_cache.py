@@ -0,0 +1,112 @@
+import asyncio
+from admission import AdmissionController
+from gemini_client import GeminiGateway
+from prompt_builder import PromptBuilder, prompt_history
+from response_cache import ResponseCache
+
+# Checks that cached Gemini replies are only reused for the exact same
+# conversation, never across chats whose histories differ, and that long
+# conversations aren't cached at all.
+QUESTION = "What should I do about it?"
+
+
+def history(context):
+    contents = PromptBuilder().build(context + [f"User: {QUESTION}"], QUESTION)
+    return prompt_history(contents)
+
+
+class Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+class EchoGemini:
+    """
+    Writes each reply from the first line of the conversation, the way a
+    real reply would pick up the patient's details.
+    """
+
+    async def generate_content_async(self, contents):
+        return Reply(f"Reply for: {contents[0]['parts'][0]}")
+
+
+class Message:
+    message_id = 1
+
+
+class QuietBot:
+    async def send_message(self, chat_id, text):
+        return Message()
+
+
+async def shed_across_chats():
+    """
+    Two chats ask the same question after different conversations and each
+    gets its own Gemini reply. Asked again while Gemini is overloaded, each
+    may only get its own reply back, and a third chat only a canned one.
+    """
+    import bot
+    bot.response_cache = ResponseCache(path=None)
+    bot.gemini = GeminiGateway(client=EchoGemini(), backoff=0)
+    bot.GEMINI_STREAMING = False
+    contexts = {
+        1: ["User: I'm Alice, alice@example.com, I have a rash", f"User: {QUESTION}"],
+        2: ["User: I'm Bob and I've got a cough", f"User: {QUESTION}"],
+    }
+    replies = {}
+    bot.admission = AdmissionController()
+    for chat_id, context in contexts.items():
+        replies[chat_id] = await bot.send_gemini_response(chat_id, QUESTION, context, QuietBot())
+    assert replies[1] != replies[2] and "Alice" in replies[1] and "Bob" in replies[2], replies
+    bot.admission = AdmissionController(max_pending=0)
+    for chat_id, context in contexts.items():
+        again = await bot.send_gemini_response(chat_id, QUESTION, context, QuietBot())
+        assert again == replies[chat_id], f"chat {chat_id} got {again!r}"
+    context = ["User: I'm Carol", f"User: {QUESTION}"]
+    shed = await bot.send_gemini_response(3, QUESTION, context, QuietBot())
+    assert shed == bot.OVERLOADED_REPLY, f"a shed chat got {shed!r}"
+    await bot.outbound.join()
+
+
+def main():
+    cache = ResponseCache(path=None, context_turns=2)
+    alice = history(["User: I'm Alice, alice@example.com, I have a rash"])
+    bob = history(["User: I'm Bob and I've got a cough"])
+    cache.put(QUESTION, alice, "Alice, for the rash try ...")
+    assert cache.get(QUESTION, bob) is None, "Bob got a reply written for Alice's conversation"
+    assert cache.get(QUESTION, alice) == "Alice, for the rash try ..."
+
+    # Same last line, different earlier history: still not shared
+    first = history(["User: my name is Carol", "Assistant: Hi Carol!", "User: hi"])
+    second = history(["User: my name is Dan", "Assistant: Hi Dan!", "User: hi"])
+    cache.put(QUESTION, first, "Carol's reply")
+    assert cache.get(QUESTION, second) is None
+    assert cache.get(QUESTION, first) is None, "a history longer than context_turns was cached"
+
+    # First turns are shared, and so are near-duplicates of them when enabled
+    fuzzy = ResponseCache(path=None, similarity=0.6)
+    fuzzy.put("what are your opening hours", [], "9 to 5")
+    fuzzy.put("what are your opening hours", alice, "Alice, 9 to 5")
+    assert fuzzy.get("What are your opening hours?", []) == "9 to 5"
+    assert fuzzy.get("what are the opening hours", []) == "9 to 5"
+    assert fuzzy.get("what are the opening hours", alice) is None, "near-duplicate hit after a conversation"
+    # A shed message only gets a first-turn answer, never one from another chat
+    shed = ResponseCache(path=None)
+    shed.put(QUESTION, alice, "Alice, for the rash try ...")
+    shed.put(QUESTION, bob, "Bob, for the cough try ...")
+    assert shed.get_first_turn(QUESTION) is None, "a shed message got another chat's reply"
+    shed.put(QUESTION, [], "Happy to help, what's wrong?")
+    assert shed.get_first_turn(QUESTION) == "Happy to help, what's wrong?"
+
+    asyncio.run(shed_across_chats())
+
+    stats = cache.stats()
+    print(f"✅ Replies only reused for identical histories, shed chats never get another chat's ({stats['hits']} hits, "
+          f"{stats['misses']} misses, {stats['skipped']} skipped)")
+
+
+try:
+    main()
+except Exception as e:
+    print("❌ Error testing response cache:")
+    print(e)
@@ -0,0 +1,120 @@
+import asyncio
+import time
+from telegram.error import RetryAfter
+import tracing
+from send_queue import SendQueue
+
+# Pushes bursts of messages for many chats through a SendQueue with a fake
+# bot and checks per-chat order, pacing, coalescing and 429 retries.
+CHATS = 20
+MESSAGES = 10  # per chat
+GLOBAL_RATE = 50
+CHAT_RATE = 10
+
+
+class Message:
+    def __init__(self, message_id):
+        self.message_id = message_id
+
+
+class FloodedBot:
+    """
+    Records every call; the first call for chat 0 gets a 429.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.flooded = False
+
+    async def send_message(self, chat_id, text):
+        if chat_id == 0 and not self.flooded:
+            self.flooded = True
+            raise RetryAfter(1)
+        self.calls.append((time.monotonic(), chat_id, text))
+        await asyncio.sleep(0.001)
+        return Message(len(self.calls))
+
+
+async def main():
+    bot = FloodedBot()
+    queue = SendQueue(global_rate=GLOBAL_RATE, global_burst=1, chat_rate=CHAT_RATE, chat_burst=1, window=0)
+    start = time.monotonic()
+    for seq in range(MESSAGES):
+        for chat_id in range(CHATS):
+            queue.send(bot, "send_message", chat_id=chat_id, text=f"{seq}")
+        # Each chat sends faster than its own limit, all together faster than the global one
+        await asyncio.sleep(0.05)
+    await queue.join(timeout=30)
+    elapsed = time.monotonic() - start
+
+    # Everything arrived, each chat in the order it was sent
+    for chat_id in range(CHATS):
+        texts = [text for _, chat, text in bot.calls if chat == chat_id]
+        delivered = "\n\n".join(texts).split("\n\n")
+        assert delivered == [str(seq) for seq in range(MESSAGES)], f"chat {chat_id}: {delivered}"
+    # Messages that backed up were merged, so fewer calls than messages
+    assert len(bot.calls) < CHATS * MESSAGES
+    # No one-second window holds more than GLOBAL_RATE calls
+    times = [t for t, _, _ in bot.calls]
+    busiest = max(sum(1 for t in times if s <= t < s + 1) for s in times)
+    assert busiest <= GLOBAL_RATE + 1, f"{busiest} calls in one second"
+    # Chat 0 waited out its retry_after and still got everything
+    assert bot.flooded and elapsed >= 1
+    print(f"✅ {CHATS * MESSAGES} messages in {len(bot.calls)} calls over {elapsed:.1f}s: "
+          f"in order per chat, ≤{busiest}/s overall, 429 retried after retry_after")
+
+    # Edits of one message collapse into the latest text
+    class EditBot(FloodedBot):
+        async def edit_message_text(self, text, chat_id, message_id):
+            self.calls.append((time.monotonic(), chat_id, text))
+
+    bot = EditBot()
+    queue = SendQueue(chat_rate=1, chat_burst=1, window=0.05)
+    futures = [queue.send(bot, "edit_message_text", chat_id=7, message_id=1, text=f"v{i}") for i in range(5)]
+    await asyncio.gather(*futures)
+    assert [text for _, _, text in bot.calls] == ["v4"], bot.calls
+    print("✅ 5 queued edits of one message sent as 1")
+
+    # "typing…" doesn't use up the chat's message budget
+    class TypingBot(FloodedBot):
+        async def send_chat_action(self, chat_id, action):
+            self.calls.append((time.monotonic(), chat_id, action))
+
+    bot = TypingBot()
+    queue = SendQueue(chat_rate=1, chat_burst=1, window=0)
+    start = time.monotonic()
+    queue.send(bot, "send_chat_action", chat_id=7, action="typing")
+    await queue.send(bot, "send_message", chat_id=7, text="hi")
+    assert time.monotonic() - start < 0.5, "the message waited for the chat action's token"
+    print("✅ Chat actions don't count against the per-chat message rate")
+
+    # A call still waiting for its turn can be changed; one already made can't
+    bot = FloodedBot()
+    queue = SendQueue(chat_rate=5, chat_burst=1, window=0)
+    first = queue.send(bot, "send_message", chat_id=7, text="a")
+    await first
+    second = queue.send(bot, "send_message", chat_id=7, text="b")
+    assert not queue.revise(7, first, text="x") and queue.revise(7, second, text="c")
+    await second
+    assert [text for _, _, text in bot.calls] == ["a", "c"], bot.calls
+    print("✅ A queued message can be revised until it is sent")
+
+    # Calls are traced as children of the update that queued them
+    spans = []
+    tracing.exporter.record = spans.append
+    tracing.TRACING_ENABLED, tracing.TRACE_SAMPLE_RATE = True, 1.0
+    bot = FloodedBot()
+    queue = SendQueue(window=0)
+    with tracing.span("handle_message"):
+        queue.send(bot, "send_message", chat_id=7, text="hi")
+    await queue.join(timeout=5)
+    root, call = (next(s for s in spans if s["name"] == name) for name in ("handle_message", "bot.send_message"))
+    assert call["parentSpanId"] == root["spanId"] and call["traceId"] == root["traceId"], spans
+    print("✅ Queued calls show up in the trace of the update that sent them")
+
+
+try:
+    asyncio.run(main())
+except Exception as e:
+    print("❌ Error testing send queue:")
+    print(e)
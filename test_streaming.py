@@ -0,0 +1,126 @@
+import asyncio
+import time
+from gemini_client import FALLBACK_REPLY, GeminiGateway
+from progressive_reply import ProgressiveReply
+
+# Streams a reply from a fake Gemini client into a fake Telegram bot and
+# checks the user sees text almost at once, edits stay under the rate limit
+# and the final message is the whole reply. No network needed.
+CHUNKS = [f"word{i} " for i in range(40)]
+CHUNK_DELAY = 0.05  # 2s for the whole reply
+EDIT_INTERVAL = 0.5
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StreamingClient:
+    def __init__(self, fail_first=0):
+        self.fail_first = fail_first
+
+    async def generate_content_async(self, prompt, stream=False):
+        if self.fail_first:
+            self.fail_first -= 1
+            raise RuntimeError("503 overloaded")
+        return self._chunks()
+
+    async def _chunks(self):
+        for text in CHUNKS:
+            await asyncio.sleep(CHUNK_DELAY)
+            yield Chunk(text)
+
+
+class Message:
+    def __init__(self, message_id):
+        self.message_id = message_id
+
+
+class RecordingBot:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.events = []
+
+    async def send_chat_action(self, chat_id, action):
+        self.events.append(("action", time.perf_counter() - self.start, action))
+
+    async def send_message(self, chat_id, text):
+        self.events.append(("send", time.perf_counter() - self.start, text))
+        return Message(1)
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        self.events.append(("edit", time.perf_counter() - self.start, text))
+
+
+class SlowBot(RecordingBot):
+    """
+    Every Telegram call takes a second.
+    """
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(1)
+        return await super().send_message(chat_id, text)
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        await asyncio.sleep(1)
+        await super().edit_message_text(text, chat_id, message_id)
+
+
+async def stream(client, bot, timings=None):
+    gateway = GeminiGateway(client=client, backoff=0)
+    reply = ProgressiveReply(bot, 42, interval=EDIT_INTERVAL, min_chars=1)
+    reply.typing()
+    text = ""
+    start = time.perf_counter()
+    async for piece in gateway.stream("hello"):
+        text += piece
+        reply.update(text)
+    streamed = time.perf_counter() - start
+    await reply.finish(text)
+    if timings is not None:
+        timings.extend([streamed, time.perf_counter() - start])
+    return text, gateway
+
+
+async def main():
+    bot = RecordingBot()
+    text, gateway = await stream(StreamingClient(), bot)
+    kinds = [event[0] for event in bot.events]
+    edits = [event for event in bot.events if event[0] == "edit"]
+    first_text = next(event[1] for event in bot.events if event[0] == "send")
+    gaps = [b[1] - a[1] for a, b in zip(edits, edits[1:])]
+
+    assert kinds[0] == "action", "typing indicator should come first"
+    assert kinds.count("send") == 1, "expected one message, edited in place"
+    assert first_text < 0.2, f"first text after {first_text:.2f}s"
+    assert all(gap >= EDIT_INTERVAL * 0.9 for gap in gaps[:-1]), f"edits too close together: {gaps}"
+    assert bot.events[-1][2] == text == "".join(CHUNKS), "final message should be the whole reply"
+    assert gateway.stats()["reply_tokens"] > 0
+    print(f"✅ Streamed {len(CHUNKS)} chunks: first text after {first_text * 1000:.0f}ms, "
+          f"{len(edits)} edits over {bot.events[-1][1]:.1f}s")
+
+    # A slow Telegram doesn't slow the stream (or hold its Gemini slot) down
+    bot, timings = SlowBot(), []
+    text, _ = await stream(StreamingClient(), bot, timings)
+    streamed, total = timings
+    assert streamed < len(CHUNKS) * CHUNK_DELAY + 0.5, f"stream took {streamed:.1f}s with a slow bot"
+    assert bot.events[-1][2] == text, "final message should be the whole reply"
+    print(f"✅ With 1s Telegram calls the stream still took {streamed:.1f}s; "
+          f"reply complete after {total:.1f}s with {sum(e[0] == 'edit' for e in bot.events)} edits")
+
+    # A failure before any text is retried; if every attempt fails the user gets the fallback
+    bot = RecordingBot()
+    text, _ = await stream(StreamingClient(fail_first=1), bot)
+    assert text == "".join(CHUNKS), "a failed first attempt should be retried"
+    bot = RecordingBot()
+    text, gateway = await stream(StreamingClient(fail_first=10), bot)
+    assert text == FALLBACK_REPLY and bot.events[-1][2] == FALLBACK_REPLY
+    print("✅ Failed streams are retried, then fall back to", repr(FALLBACK_REPLY))
+
+
+try:
+    asyncio.run(main())
+except Exception as e:
+    print("❌ Error testing streaming replies:")
+    print(e)
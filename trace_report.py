@@ -0,0 +1,101 @@
+import argparse
+import glob
+import json
+from tracing import TRACE_FILE
+
+# Reads the spans the bot wrote to TRACE_FILE (and its rotated copies) and
+# shows where the time went:
+#   python trace_report.py                  # 10 slowest updates + span breakdown
+#   python trace_report.py --top 25 --name handle_message
+#   python trace_report.py --trace 4bf92f3577b34da6a3ce929d0e0e4736
+
+
+def load_spans(pattern):
+    spans = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                for resource in json.loads(line)["resourceSpans"]:
+                    for scope in resource["scopeSpans"]:
+                        spans.extend(scope["spans"])
+    return spans
+
+
+def duration_ms(span):
+    return (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+
+
+def attributes(span):
+    return {a["key"]: next(iter(a["value"].values())) for a in span["attributes"]}
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def print_tree(trace_spans):
+    children = {}
+    for span in trace_spans:
+        children.setdefault(span["parentSpanId"], []).append(span)
+
+    def walk(parent_id, depth):
+        for span in sorted(children.get(parent_id, []), key=lambda s: int(s["startTimeUnixNano"])):
+            error = "  ❌ " + span["status"].get("message", "") if span["status"]["code"] == 2 else ""
+            print(f"    {'  ' * depth}{span['name']:<{32 - 2 * depth}}{duration_ms(span):>10.1f} ms{error}")
+            walk(span["spanId"], depth + 1)
+
+    walk("", 0)
+
+
+def slowest_traces(spans, top, root_name=None):
+    traces = {}
+    for span in spans:
+        traces.setdefault(span["traceId"], []).append(span)
+    roots = [
+        (span, traces[span["traceId"]]) for span in spans
+        if not span["parentSpanId"] and (root_name is None or span["name"] == root_name)
+    ]
+    roots.sort(key=lambda item: duration_ms(item[0]), reverse=True)
+    print(f"🐢 {min(top, len(roots))} slowest of {len(roots)} traces\n")
+    for root, trace_spans in roots[:top]:
+        attrs = attributes(root)
+        print(f"  {root['traceId']}  {duration_ms(root):.1f} ms  chat {attrs.get('chat_id', '?')}  "
+              f"{attrs.get('state', '?')} -> {attrs.get('next_state', '?')}")
+        print_tree(trace_spans)
+        print()
+
+
+def breakdown(spans):
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span["name"], []).append(duration_ms(span))
+    errors = {}
+    for span in spans:
+        if span["status"]["code"] == 2:
+            errors[span["name"]] = errors.get(span["name"], 0) + 1
+    print(f"{'span':<28}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'total s':>10}")
+    for name, values in sorted(by_name.items(), key=lambda item: sum(item[1]), reverse=True):
+        ordered = sorted(values)
+        print(f"{name:<28}{len(ordered):>8}{errors.get(name, 0):>8}"
+              f"{percentile(ordered, 50):>10.1f}{percentile(ordered, 95):>10.1f}"
+              f"{percentile(ordered, 99):>10.1f}{ordered[-1]:>10.1f}{sum(ordered) / 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", default=TRACE_FILE + "*", help="glob of trace files to read")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--name", help="only consider traces whose root span has this name")
+    parser.add_argument("--trace", help="print a single trace by id")
+    args = parser.parse_args()
+
+    spans = load_spans(args.files)
+    if not spans:
+        print(f"❌ No spans found in {args.files}")
+    elif args.trace:
+        print_tree([span for span in spans if span["traceId"] == args.trace])
+    else:
+        slowest_traces(spans, args.top, args.name)
+        breakdown(spans)
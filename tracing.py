@@ -0,0 +1,213 @@
+import os
+import functools
+import inspect
+import json
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+load_dotenv()
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+# Fraction of updates that get a trace
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 1.0))
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+# The file is rotated to traces.jsonl.1, .2, ... once it reaches this size
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", 50 * 1024 * 1024))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", 5))
+# Finished spans wait in memory (oldest dropped beyond this) until the next flush
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 50000))
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", 2))
+SERVICE_NAME = os.getenv("SERVICE_NAME", "srivathsan-healthcare-bot")
+
+# OTLP status codes
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+# The span the running code is inside. asyncio tasks and asyncio.to_thread
+# (so db.run) carry a copy of it, which is how child spans find their parent.
+_current = ContextVar("current_span", default=None)
+# Marks "inside an update that was not sampled": nested spans do nothing
+_UNSAMPLED = object()
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class span:
+    """
+    with span("create_appointment", doctor_id=3): ...
+
+    Starts a new trace when there is no enclosing span, otherwise a child of
+    the enclosing one. Works across awaits. Finished spans are handed to the
+    exporter, which writes them to TRACE_FILE in the background.
+    """
+
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "start", "_token", "_recording")
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is _UNSAMPLED or (parent is None and not _sampled()):
+            self._recording = False
+            self._token = _current.set(_UNSAMPLED)
+            return self
+        self._recording = True
+        if parent is None:
+            self.trace_id = f"{random.getrandbits(128):032x}"
+            self.parent_id = ""
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self._token = _current.set(self)
+        self.start = time.time_ns()
+        return self
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        if not self._recording:
+            return False
+        end = time.time_ns()
+        status = {"code": STATUS_UNSET}
+        if exc_type is not None:
+            status = {"code": STATUS_ERROR, "message": repr(exc)}
+        exporter.record({
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            # SPAN_KIND_SERVER for the update itself, INTERNAL below it
+            "kind": 1 if self.parent_id else 2,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(end),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": status,
+        })
+        return False
+
+
+def _sampled():
+    return TRACING_ENABLED and (TRACE_SAMPLE_RATE >= 1 or random.random() < TRACE_SAMPLE_RATE)
+
+
+def traced(name):
+    """
+    Decorator that wraps every call of a function (sync or async) in a span.
+    """
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+class SpanExporter:
+    """
+    Buffers finished spans in memory and appends them to a rotating JSONL
+    file from a background thread, so handlers never wait on disk.
+
+    Each line is one OTLP/JSON ExportTraceServiceRequest
+    ({"resourceSpans": [...]}), the layout the OpenTelemetry Collector's file
+    exporter writes and its otlpjsonfile receiver reads.
+    """
+
+    def __init__(self, path=TRACE_FILE, max_bytes=TRACE_FILE_MAX_BYTES, backups=TRACE_FILE_BACKUPS,
+                 buffer_size=TRACE_BUFFER_SIZE, flush_interval=TRACE_FLUSH_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self._buffer = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.exported = 0
+        self.dropped = 0
+
+    def record(self, span_data):
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(span_data)
+
+    def flush(self):
+        with self._lock:
+            spans = list(self._buffer)
+            self._buffer.clear()
+        if not spans:
+            return 0
+        line = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "bot"}, "spans": spans}],
+        }]}) + "\n"
+        try:
+            self._rotate_if_needed(len(line))
+            with open(self.path, "a") as file:
+                file.write(line)
+        except OSError as e:
+            print("❌ Trace Export Error:", e)
+            return 0
+        self.exported += len(spans)
+        return len(spans)
+
+    def _rotate_if_needed(self, incoming):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size + incoming <= self.max_bytes:
+            return
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        if self._thread is None and TRACING_ENABLED:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+exporter = SpanExporter()
@@ -1,30 +1,150 @@
-import os
-import psycopg2
-from dotenv import load_dotenv
+import argparse
+import csv
+import json
+import sys
+from datetime import date, datetime, timedelta
+from db import connection, close_pool
 
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
+# Lists / exports appointments without loading them all into memory: rows come
+# from a server-side cursor ITERSIZE at a time and are written as they arrive.
+#   python view_data.py
+#   python view_data.py --doctor Suresh --from 01/04/2025 --to 30/04/2025 --format csv -o april.csv
+#   python view_data.py --email john@example.com --format json
+#   python view_data.py --limit 500                  # prints the --after token for the next page
+ITERSIZE = 2000
 
-try:
-    conn = psycopg2.connect(DATABASE_URL)
-    cur = conn.cursor()
+COLUMNS = [
+    "appointment_id", "patient_name", "patient_email", "doctor_name", "specialty",
+    "appointment_day", "appointment_month", "appointment_time", "starts_at",
+]
 
-    print("📋 Appointments in the system:\n")
 
-    cur.execute("""
-        SELECT a.appointment_id, a.patient_name, a.patient_email, 
+def parse_date(value):
+    """
+    "18/04/2025", or "18/04" for this year.
+    """
+    parts = [int(part) for part in value.split("/")]
+    if len(parts) == 2:
+        parts.append(date.today().year)
+    try:
+        return date(parts[2], parts[1], parts[0])
+    except (IndexError, ValueError):
+        raise argparse.ArgumentTypeError(f"not a DD/MM[/YYYY] date: {value}")
+
+
+def parse_after(value):
+    """
+    Keyset token printed at the end of a page: "<starts_at ISO>/<appointment_id>".
+    """
+    starts_at, appointment_id = value.rsplit("/", 1)
+    return (datetime.fromisoformat(starts_at), int(appointment_id))
+
+
+def build_query(doctor=None, date_from=None, date_to=None, email=None, after=None, limit=None):
+    conditions, params = [], []
+    if doctor:
+        if doctor.isdigit():
+            conditions.append("a.doctor_id = %s")
+            params.append(int(doctor))
+        else:
+            conditions.append("d.name ILIKE %s")
+            params.append(f"%{doctor}%")
+    # Bounds on starts_at let Postgres skip every monthly partition outside them
+    if date_from:
+        conditions.append("a.starts_at >= %s::DATE::TIMESTAMP AT TIME ZONE 'Europe/London'")
+        params.append(date_from)
+    if date_to:
+        conditions.append("a.starts_at < %s::DATE::TIMESTAMP AT TIME ZONE 'Europe/London'")
+        params.append(date_to + timedelta(days=1))
+    if email:
+        conditions.append("lower(a.patient_email) = lower(%s)")
+        params.append(email)
+    if after:
+        # Keyset pagination: continue right after the last row of the previous
+        # page, using the (starts_at, appointment_id) index instead of OFFSET
+        conditions.append("(a.starts_at, a.appointment_id) > (%s, %s)")
+        params.extend(after)
+    query = """
+        SELECT a.appointment_id, a.patient_name, a.patient_email,
                d.name AS doctor_name, d.specialty,
-               a.appointment_day, a.appointment_month, a.appointment_time
+               a.appointment_day, a.appointment_month, a.appointment_time, a.starts_at
         FROM appointmentss a
         JOIN doctorss d ON a.doctor_id = d.doctor_id
-        ORDER BY a.appointment_day, a.appointment_time;
-    """)
-    
-    rows = cur.fetchall()
+    """
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY a.starts_at, a.appointment_id"
+    if limit:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+
+def stream_appointments(conn, query, params, itersize=ITERSIZE):
+    """
+    Yields rows from a named (server-side) cursor, fetching itersize at a time.
+    """
+    cur = conn.cursor(name="appointments_export")
+    cur.itersize = itersize
+    cur.execute(query, params)
+    try:
+        for row in cur:
+            yield row
+    finally:
+        cur.close()
+
+
+def write_rows(rows, out, fmt):
+    """
+    Writes rows as they come and returns (count, last_row).
+    """
+    count, last = 0, None
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(COLUMNS)
+    elif fmt == "json":
+        out.write("[")
+    elif fmt == "text":
+        print("📋 Appointments in the system:\n", file=out)
     for row in rows:
-        print(row)
+        if fmt == "csv":
+            writer.writerow(row)
+        elif fmt == "json":
+            record = dict(zip(COLUMNS, row))
+            record["appointment_time"] = str(record["appointment_time"])
+            record["starts_at"] = record["starts_at"].isoformat()
+            out.write(("," if count else "") + "\n  " + json.dumps(record))
+        else:
+            print(row, file=out)
+        count, last = count + 1, row
+    if fmt == "json":
+        out.write("\n]\n")
+    return count, last
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List or export appointments")
+    parser.add_argument("--doctor", help="doctor id, or part of the doctor's name")
+    parser.add_argument("--from", dest="date_from", type=parse_date, help="first day, DD/MM[/YYYY]")
+    parser.add_argument("--to", dest="date_to", type=parse_date, help="last day, DD/MM[/YYYY]")
+    parser.add_argument("--email", help="patient email")
+    parser.add_argument("--format", choices=["text", "csv", "json"], default="text")
+    parser.add_argument("-o", "--output", help="file to write to (default: stdout)")
+    parser.add_argument("--limit", type=int, help="page size")
+    parser.add_argument("--after", type=parse_after, help="token from the previous page")
+    args = parser.parse_args()
 
-    conn.close()
-except Exception as e:
-    print("❌ Error reading appointments:")
-    print(e)
+    query, params = build_query(args.doctor, args.date_from, args.date_to, args.email, args.after, args.limit)
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        with connection() as conn:
+            count, last = write_rows(stream_appointments(conn, query, params), out, args.format)
+        if args.limit and count == args.limit:
+            print(f"➡️  Next page: --after {last[8].isoformat()}/{last[0]}", file=sys.stderr)
+    except Exception as e:
+        print("❌ Error reading appointments:")
+        print(e)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        close_pool()
@@ -0,0 +1,187 @@
+import os
+import asyncio
+import hmac
+import json
+import multiprocessing
+import queue
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+load_dotenv()
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+# Public HTTPS URL Telegram should POST updates to, e.g. https://app.example.com
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+# Heroku hands web dynos their port in $PORT
+WEBHOOK_PORT = int(os.getenv("PORT", os.getenv("WEBHOOK_PORT", 8443)))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 4))
+# Updates buffered per worker before we start answering 503 (Telegram retries)
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))
+# Seconds workers get to finish queued updates on shutdown
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", 20))
+
+
+def chat_id_of(payload):
+    """
+    Finds the chat an update belongs to, wherever Telegram put it
+    (message, edited_message, callback_query.message, ...).
+    """
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            chat = node.get("chat")
+            if isinstance(chat, dict) and "id" in chat:
+                return chat["id"]
+            stack.extend(v for v in node.values() if isinstance(v, dict))
+    return payload.get("update_id", 0)
+
+
+def shard_for(payload, workers):
+    return chat_id_of(payload) % workers
+
+
+# -----------------------------------------------------------------------------
+# Worker processes: each owns a slice of the chats and runs the normal bot
+# handlers for them, so one chat's state machine always lives in one process.
+# -----------------------------------------------------------------------------
+async def _serve_updates(index, updates):
+    from telegram import Update
+    import bot
+
+    # One metrics port per worker, so each process can be scraped separately
+    bot.start_services(metrics_port=bot.metrics.METRICS_PORT + index if bot.metrics.METRICS_PORT else 0)
+    app = bot.build_application(polling=False)
+    await app.initialize()
+    await app.start()
+    loop = asyncio.get_running_loop()
+    print(f"🤖 Webhook worker {index} ready")
+    try:
+        while True:
+            payload = await loop.run_in_executor(None, updates.get)
+            if payload is None:
+                # Sentinel from the front end: everything before it is done
+                break
+            try:
+                # The application's own fetcher starts a task per update;
+                # chat_locks keeps each chat in order and caps the work in
+                # flight at UPDATE_CONCURRENCY
+                await app.update_queue.put(Update.de_json(payload, app.bot))
+            except Exception as e:
+                print(f"❌ Webhook worker {index} update error:", e)
+        await app.update_queue.join()
+        await bot.drain_send_queue()
+    finally:
+        await app.stop()
+        await app.shutdown()
+        bot.stop_services()
+        print(f"✅ Webhook worker {index} drained")
+
+
+def worker_main(index, updates):
+    # Shutdown is coordinated by the front end, which sends a sentinel once
+    # it has stopped accepting updates
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(_serve_updates(index, updates))
+
+
+# -----------------------------------------------------------------------------
+# Front end: accepts Telegram's POSTs and routes them to the owning worker
+# -----------------------------------------------------------------------------
+def make_handler(queues, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != path:
+                self.send_response(404)
+                self.end_headers()
+                return
+            token = self.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if secret and not hmac.compare_digest(token, secret):
+                self.send_response(403)
+                self.end_headers()
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length))
+                queues[shard_for(payload, len(queues))].put(payload, timeout=1)
+                status = 200
+            except queue.Full:
+                status = 503
+            except (ValueError, AttributeError):
+                status = 400
+            self.send_response(status)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            # Telegram can send thousands of updates a minute; keep the log quiet
+            pass
+
+    return WebhookHandler
+
+
+class WebhookHTTPServer(ThreadingHTTPServer):
+    # The stdlib default backlog of 5 drops connections under bursty load
+    request_queue_size = 256
+
+
+def register_webhook():
+    from telegram import Bot
+
+    async def register():
+        async with Bot(TELEGRAM_TOKEN) as tg:
+            await tg.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET or None,
+                max_connections=100,
+            )
+
+    asyncio.run(register())
+    print("✅ Webhook registered with Telegram")
+
+
+def run(workers=WEBHOOK_WORKERS, host=WEBHOOK_HOST, port=WEBHOOK_PORT, register=True):
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue(maxsize=WEBHOOK_QUEUE_SIZE) for _ in range(workers)]
+    processes = [ctx.Process(target=worker_main, args=(i, q), daemon=True) for i, q in enumerate(queues)]
+    for process in processes:
+        process.start()
+
+    server = WebhookHTTPServer((host, port), make_handler(queues))
+    # Let server_close() wait for requests that are still being enqueued
+    server.daemon_threads = False
+
+    def drain(signum, frame):
+        # serve_forever() must be stopped from another thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain)
+    signal.signal(signal.SIGINT, drain)
+
+    if register and WEBHOOK_URL:
+        register_webhook()
+    print(f"🤖 Webhook front end listening on {host}:{port}{WEBHOOK_PATH} with {workers} workers")
+    server.serve_forever()
+    server.server_close()
+
+    print("⏳ Draining webhook workers...")
+    for q in queues:
+        q.put(None)
+    for process in processes:
+        process.join(WEBHOOK_DRAIN_TIMEOUT)
+        if process.is_alive():
+            print(f"❌ Worker {process.pid} did not drain in time; terminating")
+            process.terminate()
+
+
+if __name__ == "__main__":
+    if not WEBHOOK_URL:
+        # Nothing would ever be registered with Telegram, so no updates would arrive
+        print("❌ WEBHOOK_URL is not set; set it to receive updates here, or run bot.py to poll instead")
+        sys.exit(1)
+    run()